@@ -0,0 +1,132 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+import async_tools
+from idempotency import get_dedupe, idempotency_key
+from state import ConversationContext
+from handlers import (
+    HandlerResult,
+    format_api_response,
+    check_availability_result,
+    prepare_search_availability,
+    search_availability_result,
+    prepare_create_booking,
+    create_booking_result,
+    get_booking_result,
+    prepare_update_booking,
+    update_booking_result,
+    cancel_booking_result,
+)
+from constants import *
+
+# Overall deadline (seconds) for the API call behind each intent. The HTTP client has
+# its own connect/read timeouts; this bounds the whole call including pool waits.
+HANDLER_TIMEOUTS: Dict[str, float] = {
+    INTENT_CHECK: 15.0,
+    INTENT_CREATE: 35.0,
+    INTENT_GET: 15.0,
+    INTENT_UPDATE: 20.0,
+    INTENT_CANCEL: 20.0,
+    INTENT_SEARCH: 30.0,
+}
+
+async def _call_api(call: Awaitable[dict], timeout: float) -> dict:
+    """
+    Await an async_tools call with a deadline, mapping an expired deadline to the
+    standard error dict. Cancellation of the calling task propagates unchanged.
+    """
+    try:
+        return await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        return {"error": "Timeout: The booking service did not respond in time",
+                "details": f"No response within {timeout}s", "status_code": None}
+
+async def handle_check_availability(ctx: ConversationContext, timeout: Optional[float] = None) -> HandlerResult:
+    """
+    Handle the check availability intent.
+    """
+
+    resp = await _call_api(
+        async_tools.check_availability(ctx.data.as_json("VisitDate"), ctx.data.PartySize),
+        timeout or HANDLER_TIMEOUTS[INTENT_CHECK],
+    )
+    return check_availability_result(resp)
+
+async def handle_search_availability(ctx: ConversationContext, timeout: Optional[float] = None) -> HandlerResult:
+    """
+    Handle the search availability intent (a range of dates and/or party sizes).
+    """
+
+    search, invalid = prepare_search_availability(ctx)
+    if invalid:
+        return invalid
+
+    earliest_only = bool(ctx.data.get("EarliestOnly"))
+    result = await _call_api(
+        async_tools.search_availability_range(search["start_date"], search["end_date"], search["party_sizes"],
+                                              earliest_only=earliest_only),
+        timeout or HANDLER_TIMEOUTS[INTENT_SEARCH],
+    )
+    if "error" in result:
+        return format_api_response(result, lambda d: "", reset_on_error=True)
+    return search_availability_result(result, search["party_sizes"], earliest_only)
+
+async def handle_create_booking(ctx: ConversationContext, timeout: Optional[float] = None) -> HandlerResult:
+    """
+    Handle the create booking intent.
+    """
+
+    payload, invalid = prepare_create_booking(ctx)
+    if invalid:
+        return invalid
+
+    # The create runs as its own task: if the deadline passes it still finishes, and a
+    # retry of the same booking gets its confirmation instead of booking twice
+    key = idempotency_key(ctx.session_id, ctx.restaurant, payload)
+    submitted = await _call_api(get_dedupe().submit_async(key, lambda: async_tools.create_booking(payload)),
+                                timeout or HANDLER_TIMEOUTS[INTENT_CREATE])
+    if isinstance(submitted, dict):  # the deadline passed
+        return create_booking_result(submitted)
+    return create_booking_result(*submitted)
+
+async def handle_get_booking(ctx: ConversationContext, timeout: Optional[float] = None) -> HandlerResult:
+    """
+    Handle the get booking intent.
+    """
+
+    resp = await _call_api(async_tools.get_booking(ctx.data["BookingRef"]), timeout or HANDLER_TIMEOUTS[INTENT_GET])
+    return get_booking_result(resp)
+
+async def handle_update_booking(ctx: ConversationContext, timeout: Optional[float] = None) -> HandlerResult:
+    """
+    Handle the update booking intent.
+    """
+
+    prepared, invalid = prepare_update_booking(ctx)
+    if invalid:
+        return invalid
+
+    booking_ref, updates = prepared
+    resp = await _call_api(async_tools.update_booking(booking_ref, updates), timeout or HANDLER_TIMEOUTS[INTENT_UPDATE])
+    return update_booking_result(resp)
+
+async def handle_cancel_booking(ctx: ConversationContext, timeout: Optional[float] = None) -> HandlerResult:
+    """
+    Handle the cancel booking intent.
+    """
+
+    resp = await _call_api(
+        async_tools.cancel_booking(ctx.data["BookingRef"], ctx.data["CancellationReasonId"]),
+        timeout or HANDLER_TIMEOUTS[INTENT_CANCEL],
+    )
+    return cancel_booking_result(resp)
+
+# Router mapping
+ASYNC_INTENT_ROUTER: Dict[str, Callable[[ConversationContext], Awaitable[HandlerResult]]] = {
+    INTENT_CHECK: handle_check_availability,
+    INTENT_CREATE: handle_create_booking,
+    INTENT_GET: handle_get_booking,
+    INTENT_UPDATE: handle_update_booking,
+    INTENT_CANCEL: handle_cancel_booking,
+    INTENT_SEARCH: handle_search_availability,
+}
@@ -0,0 +1,282 @@
+import asyncio
+import threading
+import weakref
+
+import metrics
+from config import get_config
+from resilience import RateLimiter, ResiliencePolicy, circuit_open_error, is_transient
+from singleflight import AsyncSingleFlight
+from tools import (
+    DEFAULT_TIMEOUTS, BookingCacheMixin, availability_cache_key, handle_response, handle_request_error,
+    plan_range_search, merge_availability_grid,
+)
+from venues import current_venue, get_registry
+
+class AsyncBookingApiClient(BookingCacheMixin):
+    """
+    Asyncio counterpart of tools.BookingApiClient.
+
+    Calls the same endpoints over a pooled httpx.AsyncClient and maps every response
+    through the same handle_response()/handle_request_error() error dicts, so one event
+    loop can keep many booking calls in flight at once.
+    """
+
+    def __init__(self, base_url=None, restaurant=None, token=None, pool_size=None, timeouts=None, transport=None,
+                 cache_availability=None, cache_bookings=None, resilience=None, rate_limit=None):
+        """
+        Args:
+            base_url (str): Root URL of the booking API (defaults to BASE_URL).
+            restaurant (str): Microsite name used in every URL (defaults to RESTAURANT_NAME).
+            token (str): Bearer token (defaults to BEARER_TOKEN).
+            pool_size (int): Maximum number of open connections to the API host.
+            timeouts (dict): Per-endpoint (connect, read) overrides for DEFAULT_TIMEOUTS.
+            transport (httpx.AsyncBaseTransport): Optional transport, mainly for tests.
+            cache_availability (bool): Whether to cache availability searches
+                                       (defaults to AVAILABILITY_CACHE).
+            cache_bookings (bool): Whether to cache bookings by reference
+                                   (defaults to BOOKING_CACHE).
+            resilience (ResiliencePolicy): Retry, hedging and circuit-breaker settings
+                                           (defaults to the API_RETRIES/API_HEDGE_DELAY/API_BREAKER_* config).
+            rate_limit (float): Maximum requests per second to the API, 0 for no limit
+                                (defaults to API_RATE_LIMIT).
+
+        Unset arguments come from config.get_config().
+        """
+        import httpx
+
+        config = get_config()
+        self.base_url = base_url if base_url is not None else config.base_url
+        self.restaurant = restaurant if restaurant is not None else config.restaurant_name
+        self.headers = {
+            "Authorization": f"Bearer {token if token is not None else config.bearer_token}",
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        pool_size = pool_size or config.api_pool_size
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=transport,
+        )
+        self.resilience = resilience or ResiliencePolicy.from_config()
+        rate_limit = config.api_rate_limit if rate_limit is None else rate_limit
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self.availability_flights = AsyncSingleFlight("availability", enabled=config.api_coalesce)
+        self.booking_flights = AsyncSingleFlight("get", enabled=config.api_coalesce)
+        self._init_caches(cache_availability, cache_bookings)
+
+    def _url(self, path):
+        return f"{self.base_url}/api/ConsumerApi/v1/Restaurant/{self.restaurant}/{path}"
+
+    async def _request(self, method, endpoint, path, data=None):
+        """
+        Same retry, hedging and circuit-breaker behaviour as BookingApiClient._request.
+        """
+        policy = self.resilience
+        breaker = policy.breaker(endpoint)
+        attempts = policy.attempts(endpoint)
+        for attempt in range(attempts):
+            if not breaker.allow():
+                metrics.inc("api_circuit_rejected_total", endpoint=endpoint)
+                return circuit_open_error(endpoint)
+            if policy.hedged(endpoint):
+                result = await self._send_hedged(method, endpoint, path, data)
+            else:
+                result = await self._send(method, endpoint, path, data)
+            transient = is_transient(result)
+            breaker.record(not transient)
+            if not transient or attempt == attempts - 1:
+                return result
+            metrics.inc("api_retries_total", endpoint=endpoint)
+            await asyncio.sleep(policy.delay(attempt))
+
+    async def _send_hedged(self, method, endpoint, path, data):
+        # Send a duplicate if the first attempt is slower than hedge_delay; the loser is cancelled
+        first = asyncio.ensure_future(self._send(method, endpoint, path, data))
+        done, _ = await asyncio.wait({first}, timeout=self.resilience.hedge_delay)
+        if done:
+            return first.result()
+        metrics.inc("api_hedges_total", endpoint=endpoint)
+        pending = {first, asyncio.ensure_future(self._send(method, endpoint, path, data))}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if not is_transient(result):
+                        return result
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _send(self, method, endpoint, path, data=None):
+        import httpx
+
+        if self.rate_limiter is not None:
+            delay = self.rate_limiter.reserve()
+            if delay:
+                metrics.inc("api_throttled_total", endpoint=endpoint)
+                await asyncio.sleep(delay)
+        connect, read = self.timeouts[endpoint]
+        with metrics.span("api_request", endpoint=endpoint) as span:
+            try:
+                resp = await self.http.request(
+                    method, self._url(path), headers=self.headers, data=data,
+                    timeout=httpx.Timeout(read, connect=connect),
+                )
+            except httpx.HTTPError as exc:
+                result = handle_request_error(exc, timed_out=isinstance(exc, httpx.TimeoutException))
+            else:
+                result = handle_response(resp)
+            span.tag(status=metrics.api_status(result))
+            return result
+
+    async def check_availability(self, visit_date, party_size, channel_code="ONLINE"):
+        key = availability_cache_key(self.restaurant, visit_date, party_size, channel_code)
+        cached = self.availability_cache.get(key)
+        if cached is not None:
+            return cached
+        indexed = self.indexed_availability(visit_date, party_size, channel_code)
+        if indexed is not None:
+            return indexed
+
+        async def search():
+            generation = self._availability_generation(key)
+            data = {"VisitDate": visit_date, "PartySize": party_size, "ChannelCode": channel_code}
+            resp = await self._request("POST", "availability", "AvailabilitySearch", data)
+            self._after_availability(key, resp, generation)
+            return resp
+        return await self.availability_flights.do(key, search)
+
+    async def create_booking(self, data):
+        resp = await self._request("POST", "create", "BookingWithStripeToken", data)
+        self._after_create(data, resp)
+        return resp
+
+    async def get_booking(self, ref):
+        cached = self._cached_booking(ref)
+        if cached is not None:
+            return cached
+
+        async def lookup():
+            resp = await self._request("GET", "get", f"Booking/{ref}")
+            self._after_get(ref, resp)
+            return resp
+        return await self.booking_flights.do(self._booking_key(ref), lookup)
+
+    async def update_booking(self, ref, updates):
+        resp = await self._request("PATCH", "update", f"Booking/{ref}", updates)
+        self._after_update(ref, updates, resp)
+        return resp
+
+    async def cancel_booking(self, ref, reason_id):
+        data = {
+            "micrositeName": self.restaurant,
+            "bookingReference": ref,
+            "cancellationReasonId": reason_id
+        }
+        resp = await self._request("POST", "cancel", f"Booking/{ref}/Cancel", data)
+        self._after_cancel(ref, resp)
+        return resp
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    @classmethod
+    def for_venue(cls, venue):
+        """
+        Builds a client for a venues.Venue, with its own connection pool and rate limit.
+        """
+        return cls(base_url=venue.base_url, restaurant=venue.name, token=venue.token, pool_size=venue.pool_size,
+                   rate_limit=venue.rate_limit)
+
+# An httpx.AsyncClient's connections belong to the event loop that opened them, so each
+# running loop gets its own clients, dropped along with the loop.
+_client = None
+_loop_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+def get_client():
+    """
+    Returns the shared AsyncBookingApiClient for the current venue (see venues.use_venue)
+    on the running event loop, creating it on first use. A client given to set_client()
+    serves the default venue on every loop.
+    """
+    venue = current_venue()
+    if venue is None or get_registry().is_default(venue):
+        if _client is not None:
+            return _client
+        venue = None
+    loop = asyncio.get_running_loop()
+    client = _loop_clients.get(loop, {}).get(venue)
+    if client is None:
+        with _clients_lock:
+            clients = _loop_clients.setdefault(loop, {})
+            client = clients.get(venue)
+            if client is None:
+                client = clients[venue] = (AsyncBookingApiClient() if venue is None
+                                           else AsyncBookingApiClient.for_venue(get_registry().get(venue)))
+    return client
+
+async def close_clients():
+    """
+    Closes and forgets the clients get_client() made on the running loop, e.g. when a server shuts down.
+    """
+    with _clients_lock:
+        clients = _loop_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+def set_client(client):
+    """
+    Replaces the shared AsyncBookingApiClient (None goes back to one per event loop) and
+    returns the previous client.
+    """
+    global _client
+    previous, _client = _client, client
+    return previous
+
+async def check_availability(visit_date, party_size, channel_code="ONLINE"):
+    """
+    Async version of tools.check_availability().
+    """
+    return await get_client().check_availability(visit_date, party_size, channel_code)
+
+async def create_booking(data):
+    """
+    Async version of tools.create_booking().
+    """
+    return await get_client().create_booking(data)
+
+async def get_booking(ref):
+    """
+    Async version of tools.get_booking().
+    """
+    return await get_client().get_booking(ref)
+
+async def update_booking(ref, updates):
+    """
+    Async version of tools.update_booking().
+    """
+    return await get_client().update_booking(ref, updates)
+
+async def cancel_booking(ref, reason_id):
+    """
+    Async version of tools.cancel_booking().
+    """
+    return await get_client().cancel_booking(ref, reason_id)
+
+async def search_availability_range(start_date, end_date, party_sizes, channel_code="ONLINE", max_concurrency=None,
+                                    earliest_only=False):
+    """
+    Async version of tools.search_availability_range().
+    """
+    dates, jobs, known = plan_range_search(get_client(), start_date, end_date, party_sizes, channel_code, earliest_only)
+    limit = asyncio.Semaphore(max_concurrency or get_config().range_search_concurrency)
+
+    async def run(job):
+        async with limit:
+            return await check_availability(job[0], job[1], channel_code)
+
+    responses = await asyncio.gather(*(run(job) for job in jobs))
+    return merge_availability_grid(dates, jobs, responses, known)
@@ -0,0 +1,261 @@
+"""
+In-process availability index: which slots are open for each (date, party size).
+
+Each AvailabilitySearch answer is kept as a bitmask over that date's slot times (bit i
+set when times[i] is open), so range and earliest queries are a few integer
+operations instead of one API call per date. The index is filled by every successful
+AvailabilitySearch the client makes, kept current by AvailabilitySync (a background
+refresh of a rolling window of dates), and patched after our own writes. A cancel
+frees its slot for that party size and smaller; a create or update drops the affected
+date until the next search or sync, because the API doesn't say how many tables are
+left. Entries older than max_age are treated as missing, so callers fall back to the
+API for them. The index only answers questions - every booking is still
+confirmed by the API.
+"""
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import metrics
+from config import get_config
+
+def _seconds(t: str) -> int:
+    h, m, *s = (int(p) for p in str(t).split(":"))
+    return h * 3600 + m * 60 + (s[0] if s else 0)
+
+def nearest_time(times: Iterable[str], requested: str) -> Optional[str]:
+    """
+    The time in times closest to requested (the earlier one on a tie), or None if times is empty.
+    """
+    target = _seconds(requested)
+    return min(times, key=lambda t: (abs(_seconds(t) - target), _seconds(t)), default=None)
+
+def _open_times(times: Tuple[str, ...], mask: int) -> List[str]:
+    found = []
+    while mask:
+        low = mask & -mask
+        found.append(times[low.bit_length() - 1])
+        mask ^= low
+    return found
+
+class AvailabilityIndex:
+    """
+    Thread-safe map of (date, party size) -> (slot times, open-slot bitmask, time recorded).
+    enabled=False makes record() a no-op and every lookup a miss.
+    """
+
+    def __init__(self, max_age: float = 600.0, enabled: bool = True, clock: Callable[[], float] = time.monotonic):
+        self.max_age = max_age
+        self.enabled = enabled
+        self.clock = clock
+        self._entries: Dict[Tuple[str, int], Tuple[Tuple[str, ...], int, float]] = {}
+        # Every date usually has the same slot times; share one tuple between entries
+        self._axes: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, visit_date: str, party_size: int, resp: dict,
+               is_current: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        Store the AvailabilitySearch response for a date and party size. is_current, if
+        given, is asked under the index lock just before storing; False means the answer
+        went stale in flight and is dropped. Returns whether it was stored.
+        """
+        if not self.enabled:
+            return False
+        slots = sorted((s["time"], bool(s.get("available"))) for s in resp.get("available_slots", []))
+        key = (str(visit_date).strip(), int(party_size))
+        with self._lock:
+            if is_current is not None and not is_current():
+                return False
+            times = tuple(t for t, _ in slots)
+            times = self._axes.setdefault(times, times)
+            mask = sum(1 << i for i, (_, available) in enumerate(slots) if available)
+            self._entries[key] = (times, mask, self.clock())
+        return True
+
+    def _entry(self, visit_date: str, party_size: int) -> Optional[Tuple[Tuple[str, ...], int, float]]:
+        entry = self._entries.get((str(visit_date).strip(), int(party_size))) if self.enabled else None
+        if entry is None or self.clock() - entry[2] > self.max_age:
+            return None
+        return entry
+
+    def open_times(self, visit_date: str, party_size: int) -> Optional[List[str]]:
+        """
+        Open slot times on a date for a party size, or None if the index has no fresh entry.
+        """
+        entry = self._entry(visit_date, party_size)
+        return None if entry is None else _open_times(entry[0], entry[1])
+
+    def lookup(self, visit_date: str, party_size: int) -> Optional[dict]:
+        """
+        A fresh entry in AvailabilitySearch response form (visit_date, party_size and
+        available_slots with time/available), or None.
+        """
+        entry = self._entry(visit_date, party_size)
+        if entry is None:
+            metrics.inc("availability_index_lookups_total", result="miss")
+            return None
+        metrics.inc("availability_index_lookups_total", result="hit")
+        times, mask, _ = entry
+        return {"visit_date": str(visit_date), "party_size": int(party_size),
+                "available_slots": [{"time": t, "available": bool(mask >> i & 1)} for i, t in enumerate(times)]}
+
+    def open_slots(self, start_date: str, end_date: str, party_size: int) -> Tuple[Dict[str, List[str]], List[str]]:
+        """
+        Returns ({date: open times} for the dates in the range the index covers, [dates it doesn't]).
+        """
+        found, missing = {}, []
+        for d in _dates(start_date, end_date):
+            times = self.open_times(d, party_size)
+            if times is None:
+                missing.append(d)
+            else:
+                found[d] = times
+        return found, missing
+
+    def earliest(self, start_date: str, end_date: str, party_size: int) -> Tuple[Optional[Tuple[str, str]], List[str]]:
+        """
+        Returns ((date, time) of the earliest open slot, or None, [uncovered dates before it]).
+        The answer is only final when the list is empty.
+        """
+        missing = []
+        for d in _dates(start_date, end_date):
+            entry = self._entry(d, party_size)
+            if entry is None:
+                missing.append(d)
+            elif entry[1]:
+                times, mask, _ = entry
+                return (d, times[(mask & -mask).bit_length() - 1]), missing
+        return None, missing
+
+    def booked(self, visit_date: str) -> None:
+        """
+        Our own create (or update) took a table on visit_date: drop the date, as the API
+        doesn't say whether that was the slot's last table.
+        """
+        self.invalidate(visit_date)
+
+    def released(self, visit_date: str, visit_time: str, party_size: int) -> None:
+        """
+        Our own cancel (or update) freed a table for party_size at visit_time: mark the slot
+        open for that party size and every smaller one the index knows about.
+        """
+        with self._lock:
+            for (d, p), (times, mask, stamp) in list(self._entries.items()):
+                if d == str(visit_date) and p <= int(party_size) and visit_time in times:
+                    self._entries[(d, p)] = (times, mask | 1 << times.index(visit_time), stamp)
+
+    def invalidate(self, visit_date: Optional[str] = None) -> int:
+        """
+        Drop entries for one date, or every entry when visit_date is None.
+        """
+        with self._lock:
+            stale = [k for k in self._entries if visit_date is None or k[0] == str(visit_date)]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def stale(self, dates: Iterable[str], party_sizes: Iterable[int], older_than: float) -> List[Tuple[str, int]]:
+        """
+        The (date, party size) pairs with no entry, or one recorded more than older_than seconds ago.
+        """
+        now = self.clock()
+        return [(d, p) for d in dates for p in party_sizes
+                if (entry := self._entries.get((d, p))) is None or now - entry[2] > older_than]
+
+_indexes: Dict[str, AvailabilityIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_index(restaurant: Optional[str]) -> AvailabilityIndex:
+    """
+    Returns the restaurant's index, shared by its sync and async clients and created
+    from config (AVAILABILITY_INDEX, AVAILABILITY_INDEX_MAX_AGE) on first use. A client
+    with no RESTAURANT_NAME (None) and the default venue ("") share one index.
+    """
+    key = restaurant or ""
+    index = _indexes.get(key)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(key)
+            if index is None:
+                config = get_config()
+                index = _indexes[key] = AvailabilityIndex(max_age=config.availability_index_max_age,
+                                                          enabled=config.availability_index)
+    return index
+
+def _dates(start_date: str, end_date: str) -> List[str]:
+    start, end = date.fromisoformat(str(start_date)), date.fromisoformat(str(end_date))
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+class AvailabilitySync:
+    """
+    Background thread keeping each venue's index current over a rolling window of dates.
+
+    Every `interval` seconds it re-searches the (date, party size) pairs in the next
+    `days` days that are missing or older than `interval`, one call at a time so the
+    API sees a trickle rather than a burst. `search(venue, visit_date, party_size)`
+    makes a live call that records its answer, `venues()` names the venues to keep
+    current and `index_for(venue)` returns a venue's index.
+    """
+
+    def __init__(self, search: Callable[[Optional[str], str, int], dict],
+                 venues: Callable[[], Iterable[Optional[str]]], index_for: Callable[[Optional[str]], AvailabilityIndex],
+                 days: int = 14, party_sizes: Iterable[int] = range(1, 9), interval: float = 300.0,
+                 today: Callable[[], date] = date.today):
+        self.search = search
+        self.venues = venues
+        self.index_for = index_for
+        self.days = days
+        self.party_sizes = list(party_sizes)
+        self.interval = interval
+        self.today = today
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_config(cls, search, venues, index_for) -> "AvailabilitySync":
+        config = get_config()
+        return cls(search, venues, index_for, days=config.availability_sync_days,
+                   party_sizes=range(1, config.availability_sync_max_party_size + 1),
+                   interval=config.availability_sync_interval)
+
+    def run_once(self) -> int:
+        """
+        One refresh round over every venue. Returns how many searches it made.
+        """
+        start = self.today()
+        dates = [(start + timedelta(days=i)).isoformat() for i in range(self.days)]
+        made = 0
+        for venue in self.venues():
+            for visit_date, party_size in self.index_for(venue).stale(dates, self.party_sizes, self.interval):
+                if self._stop.is_set():
+                    return made
+                self.search(venue, visit_date, party_size)
+                made += 1
+        metrics.inc("availability_sync_searches_total", made)
+        return made
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                # A failed round is retried on the next tick; the index just ages meanwhile
+                metrics.inc("availability_sync_errors_total")
+            self._stop.wait(self.interval)
+
+    def start(self) -> "AvailabilitySync":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="availability-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,165 @@
+"""
+Offline batch replay of conversation transcripts.
+
+Each line of the input JSONL file is one conversation: either a list of user messages,
+or an object {"id": ..., "turns": [...], "nlu": [...], "restaurant": ...} where the
+optional "nlu" list scripts the NLU replies for that conversation (see
+nlu_backends.OfflineBackend) and "restaurant" picks its venue (see venues.py).
+Every conversation is replayed through main.handle_turn - the same parser ->
+INTENT_ROUTER -> transform pipeline as the chat - on a process pool, and one result
+line per turn is written to the output JSONL file as conversations finish.
+"""
+import dataclasses
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from typing import Dict, IO, Iterator, List, Optional
+
+import config
+import parser
+import tools
+from main import handle_turn
+from nlu_backends import OfflineBackend
+from state import ConversationContext
+
+def read_conversations(path: str) -> Iterator[Dict]:
+    """
+    Yields {"id", "turns", "nlu", "restaurant"} for each non-blank line of a transcript file.
+    Conversations without an id are numbered by line.
+    """
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, list):
+                item = {"turns": item}
+            yield {"id": str(item.get("id", lineno)), "turns": item["turns"], "nlu": item.get("nlu"),
+                   "restaurant": item.get("restaurant")}
+
+def replay_conversation(conversation: Dict) -> List[Dict]:
+    """
+    Runs one conversation turn by turn and returns a result record per turn. An
+    exception ends the conversation and is recorded on the turn that raised it.
+    """
+    ctx = ConversationContext(session_id=conversation["id"], restaurant=conversation.get("restaurant"))
+    scripted = conversation.get("nlu") is not None
+    previous = previous_config = None
+    if scripted:
+        # Scripted replies are consumed one per NLU call, so every turn has to make one:
+        # a turn answered by the extractor fast path would shift the script by a turn.
+        previous = parser.set_backend(OfflineBackend(conversation["nlu"]))
+        previous_config = config.set_config(dataclasses.replace(config.get_config(), nlu_fast_path=False))
+    records = []
+    try:
+        for turn, text in enumerate(conversation["turns"], 1):
+            record = {"conversation": conversation["id"], "turn": turn, "user": text}
+            started = time.perf_counter()
+            try:
+                record["replies"] = handle_turn(ctx, text)
+            except Exception as exc:
+                record["error"] = f"{type(exc).__name__}: {exc}"
+            record["seconds"] = round(time.perf_counter() - started, 6)
+            record["intent"] = ctx.data.intent
+            record["status"] = ctx.data.status
+            records.append(record)
+            if "error" in record:
+                break
+    finally:
+        if scripted:
+            parser.set_backend(previous)
+            config.set_config(previous_config)
+        if ctx.prefetch is not None:
+            ctx.prefetch.discard()
+    return records
+
+def _init_worker(overrides: Dict) -> None:
+    # Runs once per worker process, before its first conversation
+    config.set_config(dataclasses.replace(config.get_config(), **overrides))
+
+def _write(out: IO, records: List[Dict]) -> None:
+    for record in records:
+        out.write(json.dumps(record, default=str) + "\n")
+    out.flush()
+
+def run_batch(input_path: str, output_path: str, workers: Optional[int] = None, nlu: Optional[str] = None,
+              api: str = "real") -> Dict:
+    """
+    Replays every conversation in input_path and streams per-turn results to output_path.
+
+    Args:
+        input_path (str): Transcript JSONL file.
+        output_path (str): Results JSONL file ("-" for stdout).
+        workers (int): Worker processes (defaults to the CPU count). 1 replays in this process.
+        nlu (str): NLU backend override ("autogen", "openai" or "offline").
+        api (str): "real" for the configured booking API, "mock" for a local mock_api server.
+
+    Returns:
+        dict: Conversation, turn and error counts, wall time and turns per second.
+
+    The NLU reply memo is disabled so every turn reaches the backend under test.
+    """
+    workers = workers or os.cpu_count() or 1
+    overrides: Dict = {"nlu_cache": False}
+    if nlu:
+        overrides["nlu_backend"] = nlu
+    server = None
+    if api == "mock":
+        from mock_api import start_mock_api
+        server, _ = start_mock_api(token="batch")
+        overrides.update(base_url=f"http://127.0.0.1:{server.server_address[1]}",
+                         restaurant_name="TheHungryUnicorn", bearer_token="batch")
+
+    summary = {"conversations": 0, "turns": 0, "errors": 0}
+    out = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8")
+
+    def collect(records: List[Dict]) -> None:
+        _write(out, records)
+        summary["conversations"] += 1
+        summary["turns"] += len(records)
+        summary["errors"] += sum(1 for r in records if "error" in r)
+
+    started = time.perf_counter()
+    try:
+        if workers == 1:
+            previous = config.set_config(dataclasses.replace(config.get_config(), **overrides))
+            previous_client, previous_backend = tools.set_client(None), parser.set_backend(None)
+            # Rebuilt from the overridden config, like a fresh worker's, so an earlier memo can't answer
+            previous_cache = parser.set_reply_cache(None)
+            try:
+                for conversation in read_conversations(input_path):
+                    collect(replay_conversation(conversation))
+            finally:
+                config.set_config(previous)
+                tools.set_client(previous_client)
+                parser.set_backend(previous_backend)
+                parser.set_reply_cache(previous_cache)
+        else:
+            # Workers are spawned rather than forked: this process may already be running
+            # threads (the mock API, prefetches) that a fork would copy mid-flight.
+            # A bounded window of conversations is kept in flight so huge inputs aren't read up front.
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_worker, initargs=(overrides,)) as pool:
+                pending = set()
+                for conversation in read_conversations(input_path):
+                    if len(pending) >= workers * 4:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future.result())
+                    pending.add(pool.submit(replay_conversation, conversation))
+                for future in as_completed(pending):
+                    collect(future.result())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    wall = time.perf_counter() - started
+    summary["seconds"] = round(wall, 3)
+    summary["turns_per_sec"] = round(summary["turns"] / wall, 1) if wall else 0.0
+    return summary
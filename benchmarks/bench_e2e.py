@@ -0,0 +1,211 @@
+"""
+End-to-end benchmark of handle_turn -> parser -> INTENT_ROUTER -> tools.
+
+Starts the local mock booking API (mock_api.py), swaps in a stub NLU backend with a
+configurable delay, and drives scripted conversations covering every intent from
+concurrent sessions. Reports turns/sec and p50/p95/p99 latency per turn, NLU call and
+handler, and writes the results as JSON so runs can be compared between commits.
+
+Usage:
+    python benchmarks/bench_e2e.py --sessions 200 --concurrency 16 --nlu-latency-ms 50
+    python benchmarks/bench_e2e.py --compare benchmarks/results/e2e-abc1234.json
+"""
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import config
+import main
+import parser
+import tools
+from mock_api import start_mock_api
+from nlu_backends import OfflineBackend
+from state import ConversationContext
+
+from latency import percentile
+
+# Each turn: (user message, state changes the stub NLU returns, next_message).
+# "{date}", "{end}" and "{ref}" are filled in per session.
+CONVERSATIONS = [
+    [("Any tables for 4 on {date}?",
+      {"intent": "check_availability", "VisitDate": "{date}", "PartySize": 4, "status": "ready"}, "Checking.")],
+    [("What's free for 2 to 4 people between {date} and {end}?",
+      {"intent": "search_availability", "VisitDate": "{date}", "VisitDateEnd": "{end}", "PartySize": 2,
+       "PartySizeMax": 4, "status": "ready"}, "Searching.")],
+    [("I'd like to book a table for 2 on {date} at 7pm",
+      {"intent": "create_booking", "VisitDate": "{date}", "VisitTime": "19:00:00", "PartySize": 2,
+       "status": "collecting"}, "What name and email should I use?"),
+     ("Alex Smith, alex@example.com",
+      {"FirstName": "Alex", "Surname": "Smith", "Email": "alex@example.com", "status": "ready"}, "Booking.")],
+    [("Can you show me booking {ref}?", {"intent": "get_booking", "BookingRef": "{ref}", "status": "ready"}, "Looking.")],
+    [("Please change booking {ref} to 4 people",
+      {"intent": "update_booking", "BookingRef": "{ref}", "PartySize": 4, "status": "collecting"},
+      "Would you like to change anything else?"),
+     ("No, that's all", {"status": "ready"}, "Updating.")],
+    [("Cancel {ref}, my plans changed",
+      {"intent": "cancel_booking", "BookingRef": "{ref}", "CancellationReasonId": 1, "status": "ready"}, "Cancelling.")],
+]
+
+_turn = threading.local()
+
+def stub_nlu(delay):
+    """
+    Offline backend that returns the current thread's scripted reply after `delay` seconds.
+    """
+    def reply(request):
+        if delay:
+            time.sleep(delay)
+        changes, next_message = _turn.script
+        return {"updated_state": {**request.state, **changes}, "next_message": next_message}
+    return OfflineBackend(reply)
+
+def fill(value, values):
+    if isinstance(value, str):
+        return value.format(**values)
+    if isinstance(value, dict):
+        return {k: fill(v, values) for k, v in value.items()}
+    return value
+
+def summarize(samples):
+    ms = [s * 1000 for s in samples]
+    if not ms:
+        return {"n": 0}
+    return {"n": len(ms), "mean": round(statistics.mean(ms), 3), "p50": round(percentile(ms, 50), 3),
+            "p95": round(percentile(ms, 95), 3), "p99": round(percentile(ms, 99), 3)}
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, name, seconds, error=False):
+        with self.lock:
+            self.samples.setdefault(name, []).append(seconds)
+            if error:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+def timed(recorder, name, fn, is_error=lambda result: False):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        recorder.add(name, time.perf_counter() - start, is_error(result))
+        return result
+    return wrapper
+
+def run_session(index, recorder, start_date):
+    visit = start_date + timedelta(days=index % 60)
+    values = {"date": visit.isoformat(), "end": (visit + timedelta(days=2)).isoformat()}
+    ctx = ConversationContext(session_id=f"bench-{index}")
+    turns = 0
+    for conversation in CONVERSATIONS:
+        for message, changes, next_message in conversation:
+            values["ref"] = ctx.data.LastBookingRef or ctx.data.BookingRef or ""
+            _turn.script = (fill(changes, values), next_message)
+            start = time.perf_counter()
+            main.handle_turn(ctx, fill(message, values))
+            recorder.add("turn", time.perf_counter() - start)
+            turns += 1
+    return turns
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def compare(current, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} (commit {baseline['meta'].get('commit')}):")
+    old, new = baseline["turns_per_sec"], current["turns_per_sec"]
+    print(f"  turns/sec {old:10.1f} -> {new:10.1f}  ({(new - old) / old * 100:+.1f}%)")
+    for name, stats in current["latency_ms"].items():
+        before = baseline["latency_ms"].get(name)
+        if not before or not before.get("n") or not stats.get("n"):
+            continue
+        print(f"  {name:<20} p50 {before['p50']:8.2f} -> {stats['p50']:8.2f}ms   "
+              f"p95 {before['p95']:8.2f} -> {stats['p95']:8.2f}ms")
+    return (new - old) / old
+
+def main_():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=100)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--nlu-latency-ms", type=float, default=0.0, help="delay of each stub NLU call")
+    ap.add_argument("--api-latency-ms", type=float, default=0.0, help="delay of each mock API response")
+    ap.add_argument("--no-api-cache", action="store_true", help="disable the availability and booking caches")
+    ap.add_argument("--fast-path", action="store_true", help="let the rule-based extractor answer turns it understands")
+    ap.add_argument("--output", help="JSON results file (default benchmarks/results/e2e-<commit>.json)")
+    ap.add_argument("--compare", help="earlier results file to compare against")
+    ap.add_argument("--max-regression", type=float,
+                    help="with --compare, exit 1 if turns/sec dropped by more than this fraction (e.g. 0.1)")
+    args = ap.parse_args()
+
+    server, api = start_mock_api(latency=args.api_latency_ms / 1000, token="bench")
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    config.set_config(dataclasses.replace(
+        config.get_config(), base_url=base_url, restaurant_name="TheHungryUnicorn", bearer_token="bench",
+        nlu_cache=False, nlu_fast_path=args.fast_path,
+    ))
+    tools.set_client(tools.BookingApiClient(
+        pool_size=args.concurrency * 2, cache_availability=not args.no_api_cache, cache_bookings=not args.no_api_cache,
+    ))
+    parser.set_backend(stub_nlu(args.nlu_latency_ms / 1000))
+
+    recorder = Recorder()
+    main.parser.update_state_with_llm = timed(recorder, "nlu", parser.update_state_with_llm)
+    for intent, handler in list(main.INTENT_ROUTER.items()):
+        main.INTENT_ROUTER[intent] = timed(recorder, intent, handler, lambda r: r[0] == "API Error")
+
+    start_date = date.today() + timedelta(days=30)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        turns = sum(pool.map(lambda i: run_session(i, recorder, start_date), range(args.sessions)))
+    wall = time.perf_counter() - started
+    server.shutdown()
+
+    results = {
+        "meta": {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "python": platform.python_version(), "args": vars(args)},
+        "sessions": args.sessions,
+        "turns": turns,
+        "api_requests": api.requests,
+        "wall_seconds": round(wall, 3),
+        "turns_per_sec": round(turns / wall, 1),
+        "errors": recorder.errors,
+        "latency_ms": {name: summarize(samples) for name, samples in sorted(recorder.samples.items())},
+    }
+
+    print(f"{turns} turns in {wall:.2f}s = {results['turns_per_sec']} turns/sec "
+          f"({api.requests} API requests, errors: {recorder.errors or 'none'})")
+    for name, stats in results["latency_ms"].items():
+        print(f"  {name:<20} n={stats['n']:>6}  p50={stats['p50']:8.2f}ms  p95={stats['p95']:8.2f}ms  "
+              f"p99={stats['p99']:8.2f}ms")
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results", f"e2e-{results['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        change = compare(results, args.compare)
+        if args.max_regression is not None and change < -args.max_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,62 @@
+"""
+Measures cold import time of the assistant's entry modules, each in a fresh interpreter.
+
+Usage:
+    python benchmarks/bench_startup.py --runs 10
+    python benchmarks/bench_startup.py --max-ms 250   # exit 1 if any median exceeds 250ms
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["main", "handlers", "parser"]
+
+PROBE = (
+    "import time, sys; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start); "
+    "print(int('autogen' in sys.modules), int('requests' in sys.modules), int('httpx' in sys.modules))"
+)
+
+def import_time(module):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout.split("\n")
+    heavy = dict(zip(("autogen", "requests", "httpx"), (bool(int(x)) for x in out[1].split())))
+    return float(out[0]), heavy
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--max-ms", type=float, help="fail if any module's median import time exceeds this")
+    ap.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = ap.parse_args()
+
+    results = {}
+    for module in MODULES:
+        samples = []
+        for _ in range(args.runs):
+            seconds, heavy = import_time(module)
+            samples.append(seconds * 1000)
+        results[module] = {
+            "median_ms": round(statistics.median(samples), 1),
+            "max_ms": round(max(samples), 1),
+            "eager_imports": [name for name, loaded in heavy.items() if loaded],
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for module, r in results.items():
+            eager = ", ".join(r["eager_imports"]) or "none"
+            print(f"{module:<9} median={r['median_ms']:7.1f}ms  max={r['max_ms']:7.1f}ms  heavy imports: {eager}")
+
+    if args.max_ms is not None and any(r["median_ms"] > args.max_ms for r in results.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measures SessionStore save and load cost per turn.
+
+Usage:
+    python benchmarks/bench_store.py --sessions 20000 --turns 6
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state import ConversationContext
+from store import SessionStore
+
+from latency import percentile
+
+def summarize(name, samples):
+    us = [s * 1e6 for s in samples]
+    print(f"{name:<6} n={len(us):>7}  mean={statistics.mean(us):8.1f}us  "
+          f"p50={percentile(us, 50):8.1f}us  p95={percentile(us, 95):8.1f}us  p99={percentile(us, 99):8.1f}us")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--sessions", type=int, default=20000)
+    ap.add_argument("--turns", type=int, default=6)
+    ap.add_argument("--loads", type=int, default=5000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(os.path.join(tmp, "bench.db"))
+        contexts = [ConversationContext(session_id=f"session-{i}") for i in range(args.sessions)]
+        saves = []
+        for turn in range(args.turns):
+            for ctx in contexts:
+                ctx.history.append({"role": "user", "content": f"turn {turn}: book a table for 4 tomorrow at 7pm"})
+                ctx.history.append({"role": "assistant", "content": "What name should the booking be under?"})
+                ctx.data.update({"intent": "create_booking", "PartySize": 4, "VisitDate": "2025-08-11"})
+                if turn == args.turns // 2:
+                    ctx.soft_reset(preserve_keys=["LastBookingRef"])
+                start = time.perf_counter()
+                store.save_turn(ctx)
+                saves.append(time.perf_counter() - start)
+
+        loads = []
+        for session_id in random.sample([c.session_id for c in contexts], min(args.loads, len(contexts))):
+            start = time.perf_counter()
+            store.load(session_id)
+            loads.append(time.perf_counter() - start)
+
+        print(f"{store.count()} sessions, {args.turns} turns each, db size "
+              f"{os.path.getsize(store.path) / 1e6:.1f} MB (+WAL)")
+        summarize("save", saves)
+        summarize("load", loads)
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+"""
+Latency helpers shared by the benchmark scripts.
+"""
+
+def percentile(samples, pct):
+    """
+    Nearest-rank percentile (pct in 0-100) of a non-empty list of samples.
+    """
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
@@ -0,0 +1,276 @@
+"""
+Bulk create, update and cancel operations from a CSV or JSONL file.
+
+Each row is one operation. Its "op" column is create, update or cancel; the other
+columns are the same fields the chat collects (VisitDate, VisitTime, PartySize,
+FirstName, Surname, Email, Mobile, SpecialRequests, BookingRef, CancellationReasonId).
+Optional "id" (defaults to the line number) and "restaurant" (see venues.py) columns
+name the row and pick its venue. For example, to cancel for a closure:
+
+    op,id,BookingRef,CancellationReasonId
+    cancel,closure-1,ABC1234,2
+
+Every row is validated up front with the chat's own rules (handlers.prepare_create_booking
+and prepare_update_booking) and nothing runs unless they all pass. The operations then go
+through tools on a bounded thread pool behind a client-side rate limit. One result line
+per row is streamed to the output JSONL file as rows finish. The checkpoint file records
+each finished row, so a rerun after a crash skips them. An update or cancel that failed
+transiently, or was still in flight when the process died, is run again. A create never
+is: the API may have made the booking before the timeout or crash, so sending it again
+could book the guest twice. Such a row is finished with "uncertain": true in its result
+for someone to check by hand.
+"""
+import csv
+import dataclasses
+import json
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, IO, Iterator, List, Optional, Set, Tuple
+
+import config
+import tools
+from constants import CANCELLATION_REASONS
+from handlers import prepare_create_booking, prepare_update_booking
+from resilience import RateLimiter, is_transient
+from state import STATE_FIELDS, ConversationContext
+from venues import get_registry, use_venue
+
+OPS = ("create", "update", "cancel")
+
+@dataclasses.dataclass(frozen=True)
+class Operation:
+    """
+    One validated row: the tools call to make (op with args) and the venue to make it at.
+    """
+    id: str
+    op: str
+    args: Tuple
+    restaurant: Optional[str] = None
+
+def read_rows(path: str) -> Iterator[Tuple[int, Dict]]:
+    """
+    Yields (line number, row) for each row of a .csv file (with a header row) or for
+    each non-blank line of a JSONL file. Blank CSV cells are left out of the row.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, {k.strip(): v for k, v in row.items() if k and v not in (None, "")}
+        else:
+            for lineno, line in enumerate(f, 1):
+                if line.strip():
+                    yield lineno, json.loads(line)
+
+def prepare_operation(lineno: int, row: Dict) -> Tuple[Optional[Operation], Optional[str]]:
+    """
+    Validate one row. Returns (operation, None) when valid, otherwise (None, reason).
+    """
+    if not isinstance(row, dict):
+        return None, "Row must be a JSON object"
+    row_id = str(row.get("id", lineno))
+    op = str(row.get("op", "")).strip().lower()
+    if op not in OPS:
+        return None, f"op must be one of {', '.join(OPS)}"
+    unknown = sorted(set(row) - {"op", "id", "restaurant"} - set(STATE_FIELDS))
+    if unknown:
+        return None, f"Unknown columns: {', '.join(unknown)}"
+    restaurant = row.get("restaurant")
+    if restaurant is not None:
+        try:
+            get_registry().get(restaurant)
+        except ValueError as exc:
+            return None, str(exc)
+
+    ctx = ConversationContext()
+    ctx.data.update({k: v for k, v in row.items() if k in STATE_FIELDS})
+    if op == "create":
+        payload, invalid = prepare_create_booking(ctx)
+        args = (payload,)
+    elif op == "update":
+        args, invalid = prepare_update_booking(ctx)
+    else:
+        if not ctx.data.BookingRef:
+            return None, "Missing booking reference"
+        if ctx.data.CancellationReasonId not in CANCELLATION_REASONS:
+            return None, f"CancellationReasonId must be one of {', '.join(map(str, CANCELLATION_REASONS))}"
+        args, invalid = (ctx.data.BookingRef, ctx.data.CancellationReasonId), None
+    if invalid:
+        ack, body, _ = invalid
+        return None, f"{ack}: {body}"
+    return Operation(row_id, op, args, restaurant), None
+
+def run_operation(operation: Operation, limiter: Optional[RateLimiter] = None) -> Tuple[Dict, bool]:
+    """
+    Makes one operation's API call. Returns its result record and whether the row is
+    finished (succeeded, failed in a way a rerun wouldn't fix, or was a create that may
+    have gone through).
+    """
+    if limiter is not None:
+        time.sleep(limiter.reserve())
+    call = {"create": tools.create_booking, "update": tools.update_booking, "cancel": tools.cancel_booking}
+    started = time.perf_counter()
+    with use_venue(operation.restaurant):
+        try:
+            resp = call[operation.op](*operation.args)
+        except Exception as exc:
+            resp = {"error": f"{type(exc).__name__}: {exc}", "status_code": None}
+    record = {"id": operation.id, "op": operation.op, "ok": tools.is_success(resp),
+              "seconds": round(time.perf_counter() - started, 6)}
+    if record["ok"]:
+        record["booking_reference"] = resp.get("booking_reference")
+    else:
+        record.update(error=resp["error"], details=resp.get("details"), status_code=resp.get("status_code"))
+    finished = record["ok"] or not is_transient(resp)
+    if not finished and operation.op == "create":
+        # A timeout doesn't say whether the booking was made; re-sending could make it twice
+        record["uncertain"] = True
+        finished = True
+    return record, finished
+
+def load_checkpoint(path: Optional[str]) -> Tuple[Set[str], Set[str]]:
+    """
+    Returns the ids of rows a previous run finished, and of the creates it sent but
+    never finished, from its checkpoint file.
+    """
+    finished: Set[str] = set()
+    sent: Set[str] = set()
+    if not path:
+        return finished, sent
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    (finished.add if entry["done"] else finished.discard)(entry["id"])
+                    if entry.get("sent"):
+                        sent.add(entry["id"])
+    except FileNotFoundError:
+        pass
+    return finished, sent - finished
+
+def _write(out: IO, record: Dict) -> None:
+    out.write(json.dumps(record, default=str) + "\n")
+    out.flush()
+
+def run_bulk(input_path: str, output_path: str = "-", checkpoint_path: Optional[str] = None,
+             concurrency: int = 8, rate: float = 20.0, api: str = "real", skip_invalid: bool = False,
+             progress: Optional[IO] = None) -> Dict:
+    """
+    Validates every row of input_path, then runs them and streams per-row results to output_path.
+
+    Args:
+        input_path (str): Operations file (.csv, otherwise JSONL).
+        output_path (str): Results JSONL file ("-" for stdout). Appended to when resuming.
+        checkpoint_path (str): File recording finished rows; rows already in it are skipped.
+        concurrency (int): Operations in flight at once.
+        rate (float): Maximum operations started per second, 0 for no limit.
+        api (str): "real" for the configured booking API, "mock" for a local mock_api server.
+        skip_invalid (bool): Run the valid rows even if some rows are invalid.
+        progress (IO): Where to print a progress line about once a second (e.g. sys.stderr).
+
+    Returns:
+        dict: Row counts (total, invalid, skipped, ok, failed, and uncertain: failed creates
+              that may have been made), wall time and rows per second.
+              "aborted" is True when invalid rows stopped the job before it started.
+    """
+    operations: List[Operation] = []
+    invalid: List[Dict] = []
+    seen: Set[str] = set()
+    for lineno, row in read_rows(input_path):
+        operation, reason = prepare_operation(lineno, row)
+        row_id = operation.id if operation else str(row.get("id", lineno) if isinstance(row, dict) else lineno)
+        if operation and row_id in seen:
+            operation, reason = None, "Duplicate id"
+        seen.add(row_id)
+        if operation:
+            operations.append(operation)
+        else:
+            invalid.append({"id": row_id, "line": lineno, "ok": False, "error": f"Invalid row: {reason}"})
+
+    finished, interrupted = load_checkpoint(checkpoint_path)
+    todo = [op for op in operations if op.id not in finished]
+    summary = {"total": len(operations) + len(invalid), "invalid": len(invalid),
+               "skipped": len(operations) - len(todo), "ok": 0, "failed": 0, "uncertain": 0,
+               "aborted": bool(invalid and not skip_invalid)}
+
+    out = sys.stdout if output_path == "-" else open(output_path, "a" if finished or interrupted else "w",
+                                                     encoding="utf-8")
+    checkpoint = open(checkpoint_path, "a", encoding="utf-8") if checkpoint_path else None
+    server = previous = previous_client = None
+    started = last_report = time.perf_counter()
+
+    def report(final: bool = False) -> None:
+        nonlocal last_report
+        now = time.perf_counter()
+        if progress is None or not (final or now - last_report >= 1.0):
+            return
+        last_report = now
+        done = summary["ok"] + summary["failed"]
+        print(f"bulk: {done}/{len(todo)} rows ({summary['failed']} failed, {summary['skipped']} skipped), "
+              f"{done / (now - started) if now > started else 0.0:.1f} rows/s", file=progress, flush=True)
+
+    def mark(row_id: str, done: bool, **extra) -> None:
+        if checkpoint is not None:
+            checkpoint.write(json.dumps({"id": row_id, "done": done, **extra}) + "\n")
+            checkpoint.flush()
+
+    def collect(record: Dict, done: bool) -> None:
+        _write(out, record)
+        mark(record["id"], done)
+        summary["ok" if record["ok"] else "failed"] += 1
+        summary["uncertain"] += bool(record.get("uncertain"))
+        report()
+
+    try:
+        for record in invalid:
+            _write(out, record)
+        if summary["aborted"]:
+            return summary
+
+        if api == "mock":
+            from mock_api import start_mock_api
+            server, _ = start_mock_api(token="bulk")
+            previous = config.set_config(dataclasses.replace(
+                config.get_config(), base_url=f"http://127.0.0.1:{server.server_address[1]}",
+                restaurant_name="TheHungryUnicorn", bearer_token="bulk"))
+            previous_client = tools.set_client(None)
+
+        # No burst allowance: a big job starts at the same steady pace it keeps
+        limiter = RateLimiter(rate, burst=1) if rate else None
+        # A bounded window of rows is kept in flight so results stream out as they finish
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bulk") as pool:
+            pending = set()
+            for operation in todo:
+                if operation.op == "create" and operation.id in interrupted:
+                    # Sent by a run that died before its answer came back: it may have been made
+                    collect({"id": operation.id, "op": "create", "ok": False, "uncertain": True,
+                             "error": "Interrupted: the previous run stopped before this create's answer came back"},
+                            True)
+                    continue
+                if len(pending) >= concurrency * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(*future.result())
+                if operation.op == "create":
+                    mark(operation.id, False, sent=True)
+                pending.add(pool.submit(run_operation, operation, limiter))
+            for future in wait(pending).done:
+                collect(*future.result())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if checkpoint is not None:
+            checkpoint.close()
+        if server is not None:
+            config.set_config(previous)
+            tools.set_client(previous_client)
+            server.shutdown()
+            server.server_close()
+
+    wall = time.perf_counter() - started
+    report(final=True)
+    summary["seconds"] = round(wall, 3)
+    summary["rows_per_sec"] = round((summary["ok"] + summary["failed"]) / wall, 1) if wall else 0.0
+    return summary
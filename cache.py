@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    Thread-safe bounded LRU cache whose entries expire after a fixed time-to-live.
+
+    Set enabled=False to bypass it entirely (every get is a miss that is not counted,
+    and set does nothing), e.g. in tests that must always reach the API.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if not self.enabled:
+            return default
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= self.clock():
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def items(self) -> list:
+        """
+        Snapshot of the unexpired (key, value) pairs, without counting hits or refreshing recency.
+        """
+        with self._lock:
+            now = self.clock()
+            return [(k, entry[1]) for k, entry in self._data.items() if entry[0] > now]
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Drop every entry whose key matches predicate. Returns how many were dropped.
+        """
+        with self._lock:
+            stale = [k for k in self._data if predicate(k)]
+            for k in stale:
+                del self._data[k]
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "size": len(self._data),
+        }
+
+class WriteGenerations:
+    """
+    Thread-safe write counters: one per key plus one for every key.
+
+    A reader takes get(key) before a slow read and keeps the answer only if get(key)
+    is unchanged when it returns, i.e. nothing bumped that key, or every key, meanwhile.
+    """
+
+    def __init__(self):
+        self._all = 0
+        self._keys: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Tuple[int, int]:
+        return self._all, self._keys.get(key, 0)
+
+    def bump(self, key: Optional[Hashable] = None) -> None:
+        """
+        Note a write to key, or to every key when key is None.
+        """
+        with self._lock:
+            if key is None:
+                self._all += 1
+            else:
+                self._keys[key] = self._keys.get(key, 0) + 1
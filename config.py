@@ -0,0 +1,89 @@
+import os
+from dataclasses import dataclass, fields
+from typing import Mapping, Optional
+
+@dataclass(frozen=True)
+class Config:
+    """
+    Runtime settings for the assistant, read once from the environment (and .env).
+    Each field is set by the upper-cased environment variable of the same name,
+    e.g. api_pool_size <- API_POOL_SIZE. Flags are on unless set to "0".
+    """
+    base_url: Optional[str] = None
+    restaurant_name: Optional[str] = None
+    bearer_token: Optional[str] = None
+    venues_path: Optional[str] = None
+    api_pool_size: int = 10
+    api_rate_limit: float = 0.0
+    availability_cache: bool = True
+    availability_cache_ttl: float = 30.0
+    availability_cache_size: int = 512
+    booking_cache: bool = True
+    booking_cache_ttl: float = 300.0
+    booking_cache_size: int = 2048
+    api_coalesce: bool = True
+    availability_index: bool = False
+    availability_index_max_age: float = 600.0
+    availability_sync_days: int = 14
+    availability_sync_max_party_size: int = 8
+    availability_sync_interval: float = 300.0
+    booking_dedupe: bool = True
+    booking_dedupe_ttl: float = 600.0
+    booking_dedupe_size: int = 1024
+    api_retries: int = 2
+    api_retry_backoff: float = 0.1
+    api_retry_max_backoff: float = 2.0
+    api_hedge_delay: float = 0.0
+    api_breaker_threshold: int = 5
+    api_breaker_reset: float = 30.0
+    range_search_concurrency: int = 8
+    prefetch_workers: int = 4
+    nlu_backend: str = "autogen"
+    nlu_model: str = "gpt-4o"
+    nlu_script: Optional[str] = None
+    nlu_fast_path: bool = True
+    nlu_cache: bool = True
+    nlu_cache_size: int = 1024
+    nlu_cache_ttl: float = 86400.0
+    nlu_cache_path: Optional[str] = None
+    nlu_cache_turns: int = 2
+    nlu_max_reasks: int = 1
+    metrics: bool = False
+    metrics_path: Optional[str] = None
+
+    @classmethod
+    def from_env(cls, env: Optional[Mapping[str, str]] = None) -> "Config":
+        env = os.environ if env is None else env
+        values = {}
+        for f in fields(cls):
+            raw = env.get(f.name.upper())
+            if raw is None or raw == "":
+                continue
+            if f.type is bool:
+                values[f.name] = raw != "0"
+            elif f.type in (int, float):
+                values[f.name] = f.type(raw)
+            else:
+                values[f.name] = raw
+        return cls(**values)
+
+_config: Optional[Config] = None
+
+def get_config() -> Config:
+    """
+    Returns the process-wide Config, loading .env and reading the environment on first use.
+    """
+    global _config
+    if _config is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _config = Config.from_env()
+    return _config
+
+def set_config(config: Optional[Config]) -> Optional[Config]:
+    """
+    Replaces the process-wide Config (None re-reads it on next use) and returns the previous one.
+    """
+    global _config
+    previous, _config = _config, config
+    return previous
@@ -5,3 +5,29 @@ INTENT_CREATE = "create_booking"
 INTENT_GET = "get_booking"
 INTENT_UPDATE = "update_booking"
 INTENT_CANCEL = "cancel_booking"
+INTENT_SEARCH = "search_availability"
+
+# Fields that must be collected before each intent is ready to run.
+# update_booking additionally needs at least one of UPDATE_FIELDS.
+REQUIRED_FIELDS = {
+    INTENT_CHECK: ["VisitDate", "PartySize"],
+    INTENT_CREATE: ["VisitDate", "VisitTime", "PartySize", "FirstName", "Surname", "Email"],
+    INTENT_GET: ["BookingRef"],
+    INTENT_UPDATE: ["BookingRef"],
+    INTENT_CANCEL: ["BookingRef", "CancellationReasonId"],
+    INTENT_SEARCH: ["VisitDate", "VisitDateEnd", "PartySize"],
+}
+
+UPDATE_FIELDS = ["VisitDate", "VisitTime", "PartySize", "SpecialRequests"]
+
+CANCELLATION_REASONS = {
+    1: "Customer Request",
+    2: "Restaurant Closure",
+    3: "Weather",
+    4: "Emergency",
+    5: "No Show",
+}
+
+# Limits on how far a search_availability request may fan out.
+MAX_SEARCH_DAYS = 14
+MAX_SEARCH_PARTY_SIZES = 8
@@ -0,0 +1,294 @@
+import re
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from constants import *
+
+# Counters for how often the fast path answers a turn instead of the LLM.
+STATS = {"hits": 0, "misses": 0}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20,
+}
+NUMBER = r"(\d{1,2}|" + "|".join(NUMBER_WORDS) + r")"
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+MONTH = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+REF_WITH_KEYWORD_RE = re.compile(
+    r"\b(?:ref(?:erence)?|booking)(?:\s+(?:number|no\.?|code|id|is))*\s*[:#]?\s*((?=[a-z0-9]*\d)(?=[a-z0-9]*[a-z])[a-z0-9]{6,10})\b"
+)
+REF_BARE_RE = re.compile(r"\b(?=[A-Z0-9]*\d)(?=[A-Z0-9]*[A-Z])[A-Z0-9]{6,10}\b")
+NAME_RE = re.compile(r"\b(?i:my name is|name is|name's|i am|i'm|under(?: the name)?)\s+([A-Z][a-z'-]+)\s+([A-Z][a-z'-]+)\b")
+
+ISO_DATE_RE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+DAY_MONTH_RE = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?(?:\s+of)?\s+" + MONTH + r"(?:,?\s+(\d{4}))?\b")
+MONTH_DAY_RE = re.compile(r"\b" + MONTH + r"\s+(\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(\d{4}))?\b")
+DAY_AFTER_TOMORROW_RE = re.compile(r"\bday after tomorrow\b")
+TODAY_RE = re.compile(r"\b(today|tonight|this evening)\b")
+TOMORROW_RE = re.compile(r"\btomorrow\b")
+IN_DAYS_RE = re.compile(r"\bin\s+" + NUMBER + r"\s+days?\b")
+WEEKDAY_RE = re.compile(r"\b(?:(this|next|on)\s+)?(" + "|".join(WEEKDAYS) + r")\b")
+
+TIME_12H_RE = re.compile(r"\b(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm|a\.m\.|p\.m\.)")
+TIME_24H_RE = re.compile(r"\b([01]\d|2[0-3]):([0-5]\d)(?::([0-5]\d))?\b")
+NOON_RE = re.compile(r"\b(noon|midday)\b")
+
+PARTY_RE = re.compile(r"\b(?:for|party of|table for|group of)\s+" + NUMBER + r"(?:\s+(?:people|persons|person|guests|guest|pax|of us|adults))?\b")
+PARTY_SUFFIX_RE = re.compile(r"\b" + NUMBER + r"\s+(?:people|persons|person|guests|guest|pax|adults)\b")
+BARE_NUMBER_RE = re.compile(r"^\s*" + NUMBER + r"\s*[.!]?\s*$")
+
+REASON_PATTERNS = [
+    (2, re.compile(r"\b(restaurant (?:is )?clos(?:ed|ing|ure)|closure)\b")),
+    (3, re.compile(r"\b(weather|snow(?:ing)?|storm|flood(?:ing)?|heavy rain)\b")),
+    (4, re.compile(r"\b(emergency|ill|sick|hospital)\b")),
+    (5, re.compile(r"\b(no[- ]show)\b")),
+    (1, re.compile(r"\b(changed my mind|change of plans?|plans changed|can(?:'|no)?t make it|no longer|personal reasons?|customer request)\b")),
+]
+
+INTENT_PATTERNS = [
+    (INTENT_CANCEL, re.compile(r"\bcancel(?:l?ing|l?ed)?\b")),
+    (INTENT_UPDATE, re.compile(r"\b(change|modify|update|move|reschedule|amend)\b")),
+    (INTENT_GET, re.compile(r"\b(what'?s my booking|look ?up|show (?:me )?my booking|(?:my )?booking details|check my booking|find my booking)\b")),
+    (INTENT_CHECK, re.compile(r"\b(availability|available|free tables?|any tables?)\b")),
+    (INTENT_CREATE, re.compile(r"\b(book|reserve|(?:make )?an? (?:new )?(?:booking|reservation))\b")),
+]
+
+UPDATE_DONE_RE = re.compile(
+    r"^\s*(?:(?:no|nope|no thanks?(?: you)?)[,.!]*\s*)?(?:that'?s all|that is all|that'?s it|nothing else|all good)?\s*[.!]*\s*$"
+)
+
+# Words that carry no slot information; anything else left over sends the turn to the LLM.
+FILLER = set("""
+a an the for of at on in to and or with by from please pls thanks thank you i i'd id we we'd would like love want
+need can could book booking reserve reservation table tables people persons person guests guest pax party my our
+is it it's its be make me us check availability available any there do have has email e-mail address ref reference
+number no. code id time date around about ok okay sure hi hello hey just also name cancel cancelling canceling
+cancelled because due change modify update move reschedule amend what what's whats show details look up lookup find
+so then actually instead that this these evening night lunch dinner o'clock oclock reason is: my: are was
+""".split())
+
+QUESTIONS = {
+    "VisitDate": "What date would you like?",
+    "VisitDateEnd": "Up to which date should I look?",
+    "VisitTime": "What time would you like?",
+    "PartySize": "How many people will be in your party?",
+    "FirstName": "What first name and surname should the booking be under?",
+    "Surname": "What first name and surname should the booking be under?",
+    "Email": "What email address should we use for the booking?",
+    "BookingRef": "What is your booking reference?",
+    "CancellationReasonId": "May I ask why you're cancelling?",
+}
+
+ACTIONS = {
+    INTENT_CHECK: "check availability",
+    INTENT_CREATE: "make your booking",
+    INTENT_GET: "look up your booking",
+    INTENT_UPDATE: "update your booking",
+    INTENT_CANCEL: "cancel your booking",
+    INTENT_SEARCH: "search availability",
+}
+
+def _number(token: str) -> int:
+    return NUMBER_WORDS.get(token) or int(token)
+
+def _month_day(month: str, day: str, year: Optional[str], today: date) -> date:
+    if year:
+        return date(int(year), MONTHS[month[:3]], int(day))
+    candidate = date(today.year, MONTHS[month[:3]], int(day))
+    if candidate < today:
+        candidate = date(today.year + 1, MONTHS[month[:3]], int(day))
+    return candidate
+
+class _Scanner:
+    """
+    Runs patterns over the message, blanking out every match so later patterns
+    and the final leftover check only see text that nothing has claimed yet.
+    """
+
+    def __init__(self, text: str):
+        self.original = text
+        self.work = text.lower()
+
+    def take(self, pattern: re.Pattern, use_original: bool = False) -> Optional[re.Match]:
+        source = self.original if use_original else self.work
+        for m in pattern.finditer(source):
+            if self.work[m.start():m.end()].strip():
+                self.work = self.work[:m.start()] + " " * (m.end() - m.start()) + self.work[m.end():]
+                return m
+        return None
+
+    def leftover(self) -> List[str]:
+        words = re.findall(r"[a-z0-9'@.:\-]+", self.work)
+        return [w for w in (w.strip(".,!?:") for w in words) if w and w not in FILLER]
+
+# _extract_date and _extract_time raise ValueError for text that looks like a date or
+# time but isn't a real one ("2026-13-40", "31 feb", "13pm").
+
+def _extract_date(scan: _Scanner, today: date) -> Optional[date]:
+    m = scan.take(ISO_DATE_RE)
+    if m:
+        return date(int(m.group(1)), int(m.group(2)), int(m.group(3)))
+    m = scan.take(DAY_MONTH_RE)
+    if m:
+        return _month_day(m.group(2), m.group(1), m.group(3), today)
+    m = scan.take(MONTH_DAY_RE)
+    if m:
+        return _month_day(m.group(1), m.group(2), m.group(3), today)
+    if scan.take(DAY_AFTER_TOMORROW_RE):
+        return today + timedelta(days=2)
+    if scan.take(TODAY_RE):
+        return today
+    if scan.take(TOMORROW_RE):
+        return today + timedelta(days=1)
+    m = scan.take(IN_DAYS_RE)
+    if m:
+        return today + timedelta(days=_number(m.group(1)))
+    m = scan.take(WEEKDAY_RE)
+    if m:
+        # "friday"/"this friday"/"on friday" is the soonest one (today included);
+        # "next friday" is the soonest one after today.
+        ahead = (WEEKDAYS.index(m.group(2)) - today.weekday()) % 7
+        if ahead == 0 and m.group(1) == "next":
+            ahead = 7
+        return today + timedelta(days=ahead)
+    return None
+
+def _extract_time(scan: _Scanner) -> Optional[str]:
+    m = scan.take(TIME_12H_RE)
+    if m:
+        hour, minute = int(m.group(1)), int(m.group(2) or 0)
+        if not 1 <= hour <= 12 or minute > 59:
+            raise ValueError(f"not a 12-hour time: {m.group(0)!r}")
+        if m.group(3).startswith("p") and hour != 12:
+            hour += 12
+        elif m.group(3).startswith("a") and hour == 12:
+            hour = 0
+        return f"{hour:02d}:{minute:02d}:00"
+    m = scan.take(TIME_24H_RE)
+    if m:
+        return f"{m.group(1)}:{m.group(2)}:{m.group(3) or '00'}"
+    if scan.take(NOON_RE):
+        return "12:00:00"
+    return None
+
+def _missing_fields(state: Dict) -> List[str]:
+    return [k for k in REQUIRED_FIELDS.get(state.get("intent"), []) if state.get(k) in (None, "")]
+
+def extract(message: str, current_state: Dict, today: Optional[date] = None) -> Optional[Dict]:
+    """
+    Deterministically merges an unambiguous user message into the booking state.
+
+    Args:
+        message (str): The latest user message.
+        current_state (dict): The current known booking details and status.
+        today (date): Reference date for relative dates (defaults to date.today()).
+
+    Returns:
+        dict | None: The same shape as parser.update_state_with_llm() ("updated_state" and
+                     "next_message"), or None when the message is not fully understood and
+                     the LLM should handle it.
+    """
+    today = today or date.today()
+    state = dict(current_state)
+    scan = _Scanner(message)
+    found = {}
+
+    m = scan.take(EMAIL_RE, use_original=True)
+    if m:
+        found["Email"] = m.group(0)
+    m = scan.take(REF_WITH_KEYWORD_RE) or scan.take(REF_BARE_RE, use_original=True)
+    if m:
+        found["BookingRef"] = (m.group(1) if m.re is REF_WITH_KEYWORD_RE else m.group(0)).upper()
+    m = scan.take(NAME_RE, use_original=True)
+    if m:
+        found["FirstName"], found["Surname"] = m.group(1).capitalize(), m.group(2).capitalize()
+
+    try:
+        visit_date = _extract_date(scan, today)
+        visit_time = _extract_time(scan)
+    except ValueError:
+        # A date or time we can't read would be lost here; the LLM can ask about it instead
+        return None
+    if visit_date:
+        found["VisitDate"] = visit_date.isoformat()
+    if visit_time:
+        found["VisitTime"] = visit_time
+
+    m = scan.take(PARTY_RE) or scan.take(PARTY_SUFFIX_RE)
+    if not m and _missing_fields(state)[:1] == ["PartySize"]:
+        m = scan.take(BARE_NUMBER_RE)
+    if m:
+        size = _number(m.group(1))
+        if size <= 0:
+            return None
+        found["PartySize"] = size
+
+    for reason_id, pattern in REASON_PATTERNS:
+        if scan.take(pattern):
+            found["CancellationReasonId"] = reason_id
+            break
+
+    intents = {intent for intent, pattern in INTENT_PATTERNS if scan.take(pattern)}
+    if len(intents) > 1:
+        return None
+    intent = next(iter(intents)) if intents else state.get("intent")
+    if intent not in REQUIRED_FIELDS:
+        return None
+
+    update_done = bool(state.get("intent") == INTENT_UPDATE and scan.work.strip() and scan.take(UPDATE_DONE_RE))
+
+    if scan.leftover() or not (found or intents or update_done):
+        return None
+    if "CancellationReasonId" in found and intent != INTENT_CANCEL:
+        return None
+    if intent in (INTENT_GET, INTENT_UPDATE, INTENT_CANCEL) and not (found.get("BookingRef") or state.get("BookingRef")) \
+            and state.get("LastBookingRef"):
+        # Whether "my booking" means the one just made is a judgement call for the LLM.
+        return None
+
+    state.update(found)
+    state["intent"] = intent
+    missing = _missing_fields(state)
+
+    if intent == INTENT_UPDATE:
+        has_change = any(state.get(k) not in (None, "") for k in UPDATE_FIELDS)
+        if missing:
+            return _reply(state, "collecting", QUESTIONS[missing[0]])
+        if update_done and has_change:
+            return _reply(state, "ready", f"I have everything I need to {ACTIONS[intent]}. I will proceed.")
+        if has_change:
+            return _reply(state, "collecting", "Would you like to change anything else?")
+        return _reply(state, "collecting", "What would you like to change (date, time, party size, or special requests)?")
+
+    if missing:
+        return _reply(state, "collecting", QUESTIONS[missing[0]])
+    return _reply(state, "ready", f"I have everything I need to {ACTIONS[intent]}. I will proceed.")
+
+def _reply(state: Dict, status: str, next_message: str) -> Dict:
+    state["status"] = status
+    return {"updated_state": state, "next_message": next_message}
+
+def fast_path(conversation_history: List[Dict], current_state: Dict, today: Optional[date] = None) -> Optional[Dict]:
+    """
+    Tries the deterministic extractor on the latest user message and records a hit or miss.
+    Returns None when the turn should go to the LLM.
+    """
+    message = next((m["content"] for m in reversed(conversation_history) if m.get("role") == "user"), None)
+    result = extract(message, current_state, today) if message else None
+    STATS["hits" if result is not None else "misses"] += 1
+    return result
+
+def hit_rate() -> float:
+    """
+    Fraction of turns answered by the fast path (0.0 when nothing has been seen yet).
+    """
+    total = STATS["hits"] + STATS["misses"]
+    return STATS["hits"] / total if total else 0.0
@@ -1,7 +1,11 @@
-from typing import Callable, Dict, Tuple
+from typing import Callable, Dict, Optional, Tuple
+from datetime import date, time
 import re
 import tools
 
+from availability_index import nearest_time
+from idempotency import get_dedupe, idempotency_key
+from prefetch import prefetched_availability
 from state import ConversationContext
 from formatters import fmt_booking_header, fmt_updates
 from constants import *
@@ -24,13 +28,11 @@ def format_api_response(resp: dict, success_formatter: Callable[[dict], str], re
         return ("API Error", msg, transform)
     return ("", success_formatter(resp), lambda c: None)
 
-def handle_check_availability(ctx: ConversationContext) -> HandlerResult:
+def check_availability_result(resp: dict) -> HandlerResult:
     """
-    Handle the check availability intent.
+    Build the check availability reply from an AvailabilitySearch response.
     """
 
-    resp = tools.check_availability(ctx.data["VisitDate"], ctx.data["PartySize"])
-
     def success_formatter(data: dict) -> str:
         available = [s["time"] for s in data.get("available_slots", []) if s.get("available")]
         unavailable = [s["time"] for s in data.get("available_slots", []) if not s.get("available")]
@@ -50,55 +52,180 @@ def handle_check_availability(ctx: ConversationContext) -> HandlerResult:
 
     return format_api_response(resp, success_formatter, reset_on_error=True)
 
-def handle_create_booking(ctx: ConversationContext) -> HandlerResult:
+def handle_check_availability(ctx: ConversationContext) -> HandlerResult:
     """
-    Handle the create booking intent.
+    Handle the check availability intent.
+    """
+
+    visit_date, party_size = ctx.data.as_json("VisitDate"), ctx.data.PartySize
+    resp = prefetched_availability(ctx, visit_date, party_size)
+    if resp is None:
+        resp = tools.check_availability(visit_date, party_size)
+    return check_availability_result(resp)
+
+def prepare_search_availability(ctx: ConversationContext) -> Tuple[Optional[dict], Optional[HandlerResult]]:
+    """
+    Validate a date-range / party-size-range search.
+    Returns (search arguments, None) when valid, otherwise (None, result to show the user).
+    """
+
+    start = ctx.data.VisitDate
+    end = ctx.data.VisitDateEnd or start
+    if not (isinstance(start, date) and isinstance(end, date)):
+        # Unparsed values are kept as strings; tell a bad format apart from an impossible date
+        if all(re.match(r"^\d{4}-\d{2}-\d{2}$", str(v or "")) for v in (start, end)):
+            return None, ("Invalid date", "VisitDate and VisitDateEnd must be real calendar dates.", lambda c: None)
+        return None, ("Invalid date", "VisitDate and VisitDateEnd must be in YYYY-MM-DD format.", lambda c: None)
+    days = (end - start).days + 1
+    if days < 1:
+        return None, ("Invalid date range", "The last date must be on or after the first date.", lambda c: None)
+    if days > MAX_SEARCH_DAYS:
+        return None, ("Date range too long",
+                      f"I can search up to {MAX_SEARCH_DAYS} days at a time. Please pick a shorter range.",
+                      lambda c: None)
+
+    smallest = ctx.data.PartySize
+    largest = ctx.data.PartySizeMax if ctx.data.PartySizeMax is not None else smallest
+    if not (isinstance(smallest, int) and isinstance(largest, int)) or smallest <= 0 or largest < smallest:
+        return None, ("Invalid party size", "Party sizes must be positive integers (e.g., 4 to 6).", lambda c: None)
+    if largest - smallest + 1 > MAX_SEARCH_PARTY_SIZES:
+        return None, ("Party size range too wide",
+                      f"I can search up to {MAX_SEARCH_PARTY_SIZES} party sizes at a time.",
+                      lambda c: None)
+
+    return {"start_date": start.isoformat(), "end_date": end.isoformat(), "party_sizes": list(range(smallest, largest + 1))}, None
+
+def search_availability_result(result: dict, party_sizes: list, earliest_only: bool = False) -> HandlerResult:
+    """
+    Build the search availability reply from a tools.search_availability_range() grid.
+    """
+
+    slots, errors = result["slots"], result["errors"]
+    if errors and len(errors) == len(slots) * len(party_sizes):
+        # Nothing came back at all: report it like any other API error
+        return format_api_response(next(iter(errors.values())), lambda d: "", reset_on_error=True)
+
+    def fmt_sizes(sizes: list) -> str:
+        if len(sizes) == 1:
+            return str(sizes[0])
+        if sizes == list(range(sizes[0], sizes[-1] + 1)):
+            return f"{sizes[0]}-{sizes[-1]}"
+        return ", ".join(map(str, sizes))
+
+    parts = []
+    if earliest_only:
+        first = tools.earliest_slot(slots)
+        if first:
+            d, t, sizes = first
+            parts.append(f"The earliest available table is on {d} at {t} (party of {fmt_sizes(sizes)}).")
+        else:
+            parts.append("Sorry, there are no available tables in that range.")
+    elif not any(slots.values()):
+        parts.append("Sorry, there are no available tables in that range.")
+    else:
+        parts.append("Available tables (party sizes in brackets):")
+        for d, times in slots.items():
+            if times:
+                parts.append(f"{d}: " + ", ".join(f"{t} ({fmt_sizes(sizes)})" for t, sizes in times.items()))
+            else:
+                parts.append(f"{d}: fully booked")
+
+    if errors:
+        missed = sorted({d for d, _ in errors})
+        parts.append(f"I couldn't check some options on: {', '.join(missed)}.")
+    return ("", "\n".join(parts), lambda c: None)
+
+def handle_search_availability(ctx: ConversationContext) -> HandlerResult:
+    """
+    Handle the search availability intent (a range of dates and/or party sizes).
+    """
+
+    search, invalid = prepare_search_availability(ctx)
+    if invalid:
+        return invalid
+
+    earliest_only = bool(ctx.data.get("EarliestOnly"))
+    result = tools.search_availability_range(search["start_date"], search["end_date"], search["party_sizes"],
+                                             earliest_only=earliest_only)
+    return search_availability_result(result, search["party_sizes"], earliest_only)
+
+def prepare_create_booking(ctx: ConversationContext) -> Tuple[Optional[dict], Optional[HandlerResult]]:
+    """
+    Validate the collected fields and build the create booking payload.
+    Returns (payload, None) when valid, otherwise (None, result to show the user).
     """
 
     required = ["VisitDate", "VisitTime", "PartySize", "FirstName", "Surname", "Email"]
-    missing = [k for k in required if not ctx.data.get(k)]
+    missing = [k for k in required if ctx.data[k] is None]
     if missing:
         msg = "Missing required fields: " + ", ".join(missing) + ". Please provide those to proceed."
-        return ("Missing fields", msg, lambda c: None)
-
-    try:
-        party_size = int(str(ctx.data["PartySize"]).strip())
-        if party_size <= 0:
-            raise ValueError
-    except Exception:
-        return ("Invalid party size", "Party size must be a positive integer (e.g., 2).", lambda c: None)
-
-    visit_date = str(ctx.data["VisitDate"]).strip()
-    if not re.match(r"^\d{4}-\d{2}-\d{2}$", visit_date):
-        return ("Invalid date", "VisitDate must be in YYYY-MM-DD format.", lambda c: None)
-
-    visit_time = str(ctx.data["VisitTime"]).strip()
-    if re.match(r"^\d{2}:\d{2}$", visit_time):
-        visit_time += ":00"
-    if not re.match(r"^\d{2}:\d{2}:\d{2}$", visit_time):
-        return ("Invalid time", "VisitTime must be HH:MM or HH:MM:SS (24-hour).", lambda c: None)
-
-    email = str(ctx.data["Email"]).strip()
+        return None, ("Missing fields", msg, lambda c: None)
+
+    # BookingState has already parsed valid values; anything left as a string didn't parse.
+    party_size = ctx.data.PartySize
+    if not isinstance(party_size, int) or party_size <= 0:
+        return None, ("Invalid party size", "Party size must be a positive integer (e.g., 2).", lambda c: None)
+
+    if not isinstance(ctx.data.VisitDate, date):
+        return None, ("Invalid date", "VisitDate must be in YYYY-MM-DD format.", lambda c: None)
+
+    if not isinstance(ctx.data.VisitTime, time):
+        return None, ("Invalid time", "VisitTime must be HH:MM or HH:MM:SS (24-hour).", lambda c: None)
+
+    email = ctx.data.Email
     if "@" not in email or "." not in email.split("@")[-1]:
-        return ("Invalid email", "Please provide a valid email address (e.g., name@example.com).", lambda c: None)
+        return None, ("Invalid email", "Please provide a valid email address (e.g., name@example.com).", lambda c: None)
 
     payload = {
-        "VisitDate": visit_date,
-        "VisitTime": visit_time,
+        "VisitDate": ctx.data.as_json("VisitDate"),
+        "VisitTime": ctx.data.as_json("VisitTime"),
         "PartySize": party_size,
         "ChannelCode": "ONLINE",
-        "Customer[FirstName]": str(ctx.data["FirstName"]).strip(),
-        "Customer[Surname]": str(ctx.data["Surname"]).strip(),
+        "Customer[FirstName]": ctx.data.FirstName,
+        "Customer[Surname]": ctx.data.Surname,
         "Customer[Email]": email,
     }
 
-    if ctx.data.get("SpecialRequests"):
-        payload["SpecialRequests"] = str(ctx.data["SpecialRequests"]).strip()
+    if ctx.data.SpecialRequests:
+        payload["SpecialRequests"] = ctx.data.SpecialRequests
+
+    if ctx.data.Mobile:
+        payload["Mobile"] = ctx.data.Mobile
+
+    return payload, None
+
+def slot_unavailable_result(availability: Optional[dict], visit_time: str) -> Optional[HandlerResult]:
+    """
+    Explains a refused create from an already-fetched availability response.
+    Returns a result asking for another time if the requested time is shown as
+    fully booked, otherwise None (including when no availability is at hand).
+    """
+    if not availability or "error" in availability:
+        return None
+    slots = {s.get("time"): s.get("available") for s in availability.get("available_slots", [])}
+    if slots.get(visit_time) is not False:
+        return None
+
+    open_times = [t for t, available in slots.items() if available]
+    msg = f"Sorry, {visit_time} on {availability.get('visit_date')} is fully booked for {availability.get('party_size')}."
+    if open_times:
+        msg += f"\nAvailable times: {', '.join(open_times)}."
+        if len(open_times) > 1:
+            msg += f" The closest to {visit_time} is {nearest_time(open_times, visit_time)}."
+        msg += " Which would you like?"
+
+    def transform(c: ConversationContext) -> None:
+        # Keep everything else and ask for a new time on the next turn
+        c.data["VisitTime"] = None
+        c.data["status"] = "collecting"
 
-    if ctx.data.get("Mobile"):
-        payload["Mobile"] = str(ctx.data["Mobile"]).strip()
+    return ("That time is fully booked.", msg, transform)
 
-    resp = tools.create_booking(payload)
+def create_booking_result(resp: dict, duplicate: bool = False) -> HandlerResult:
+    """
+    Build the create booking reply and state transform from a BookingWithStripeToken response.
+    duplicate marks a confirmation handed back for a repeat submission of the same booking.
+    """
 
     def success_formatter(data: dict) -> str:
         return "\n".join(
@@ -116,16 +243,41 @@ def handle_create_booking(ctx: ConversationContext) -> HandlerResult:
             c.reset()
             c.data["LastBookingRef"] = last_ref
 
+    if not ack and duplicate:
+        ack = "You already have this booking, so I haven't made another."
     return (ack or "I've created your booking.", body, transform)
 
-    return (ack or "I've created your booking.", body, transform)
-
-def handle_get_booking(ctx: ConversationContext) -> HandlerResult:
+def handle_create_booking(ctx: ConversationContext) -> HandlerResult:
     """
-    Handle the get booking intent.
+    Handle the create booking intent.
     """
 
-    resp = tools.get_booking(ctx.data["BookingRef"])
+    payload, invalid = prepare_create_booking(ctx)
+    if invalid:
+        return invalid
+
+    # A repeat of a booking we just made gets its confirmation back, even though the
+    # slot may now look full because of it
+    dedupe = get_dedupe()
+    key = idempotency_key(ctx.session_id, ctx.restaurant, payload)
+    confirmed = dedupe.replay(key)
+    if confirmed is not None:
+        return create_booking_result(confirmed, duplicate=True)
+
+    # The API decides whether the slot is free; a prefetched search only explains a refusal
+    resp, duplicate = dedupe.submit(key, lambda: tools.create_booking(payload))
+    if not tools.is_success(resp) and resp.get("status_code") == 400:
+        unavailable = slot_unavailable_result(
+            prefetched_availability(ctx, payload["VisitDate"], payload["PartySize"]), payload["VisitTime"]
+        )
+        if unavailable:
+            return unavailable
+    return create_booking_result(resp, duplicate)
+
+def get_booking_result(resp: dict) -> HandlerResult:
+    """
+    Build the get booking reply from a Booking lookup response.
+    """
 
     def success_formatter(data: dict) -> str:
         body_parts = ["Here are your booking details:"]
@@ -137,64 +289,63 @@ def handle_get_booking(ctx: ConversationContext) -> HandlerResult:
 
     return format_api_response(resp, success_formatter, reset_on_error=True)
 
-def handle_update_booking(ctx: ConversationContext) -> HandlerResult:
+def handle_get_booking(ctx: ConversationContext) -> HandlerResult:
     """
-    Handle the update booking intent.
+    Handle the get booking intent.
+    """
+
+    resp = tools.get_booking(ctx.data["BookingRef"])
+    return get_booking_result(resp)
+
+def prepare_update_booking(ctx: ConversationContext) -> Tuple[Optional[Tuple[str, Dict[str, str]]], Optional[HandlerResult]]:
+    """
+    Validate the requested changes and build the update payload.
+    Returns ((booking_ref, updates), None) when valid, otherwise (None, result to show the user).
     """
 
-    booking_ref = (ctx.data.get("BookingRef") or "").strip()
+    booking_ref = ctx.data.BookingRef
     if not booking_ref:
-        return ("Missing booking reference",
-                "Please provide your booking reference to update your reservation.",
-                lambda c: None)
-
-    candidate = {
-        "VisitDate": ctx.data.get("VisitDate"),
-        "VisitTime": ctx.data.get("VisitTime"),
-        "PartySize": ctx.data.get("PartySize"),
-        "SpecialRequests": ctx.data.get("SpecialRequests"),
-    }
+        return None, ("Missing booking reference",
+                      "Please provide your booking reference to update your reservation.",
+                      lambda c: None)
 
     updates: Dict[str, str] = {}
 
-    if candidate["VisitDate"]:
-        visit_date = str(candidate["VisitDate"]).strip()
-        if not re.match(r"^\d{4}-\d{2}-\d{2}$", visit_date):
-            return ("Invalid date", "VisitDate must be in YYYY-MM-DD format.", lambda c: None)
-        updates["VisitDate"] = visit_date
-
-    if candidate["VisitTime"]:
-        visit_time = str(candidate["VisitTime"]).strip()
-        if re.match(r"^\d{2}:\d{2}$", visit_time):
-            visit_time += ":00"
-        if not re.match(r"^\d{2}:\d{2}:\d{2}$", visit_time):
-            return ("Invalid time", "VisitTime must be HH:MM or HH:MM:SS (24-hour).", lambda c: None)
-        updates["VisitTime"] = visit_time
-
-    if candidate["PartySize"] not in (None, ""):
-        try:
-            party_size = int(str(candidate["PartySize"]).strip())
-            if party_size <= 0:
-                raise ValueError
-        except Exception:
-            return ("Invalid party size", "Party size must be a positive integer (e.g., 2).", lambda c: None)
+    if ctx.data.VisitDate is not None:
+        if not isinstance(ctx.data.VisitDate, date):
+            return None, ("Invalid date", "VisitDate must be in YYYY-MM-DD format.", lambda c: None)
+        updates["VisitDate"] = ctx.data.as_json("VisitDate")
+
+    if ctx.data.VisitTime is not None:
+        if not isinstance(ctx.data.VisitTime, time):
+            return None, ("Invalid time", "VisitTime must be HH:MM or HH:MM:SS (24-hour).", lambda c: None)
+        updates["VisitTime"] = ctx.data.as_json("VisitTime")
+
+    party_size = ctx.data.PartySize
+    if party_size is not None:
+        if not isinstance(party_size, int) or party_size <= 0:
+            return None, ("Invalid party size", "Party size must be a positive integer (e.g., 2).", lambda c: None)
         updates["PartySize"] = str(party_size)
 
-    if candidate["SpecialRequests"] not in (None, ""):
-        sr = str(candidate["SpecialRequests"]).strip()
-        if len(sr) > 500:
-            return ("Special requests too long",
-                    "Please keep special requests under 500 characters.",
-                    lambda c: None)
-        if sr:
-            updates["SpecialRequests"] = sr
+    special_requests = ctx.data.SpecialRequests
+    if special_requests is not None:
+        if len(special_requests) > 500:
+            return None, ("Special requests too long",
+                          "Please keep special requests under 500 characters.",
+                          lambda c: None)
+        updates["SpecialRequests"] = special_requests
 
     if not updates:
-        return ("No changes detected",
-                "Tell me what you'd like to change (date, time, party size, or special requests).",
-                lambda c: None)
+        return None, ("No changes detected",
+                      "Tell me what you'd like to change (date, time, party size, or special requests).",
+                      lambda c: None)
 
-    resp = tools.update_booking(booking_ref, updates)
+    return (booking_ref, updates), None
+
+def update_booking_result(resp: dict) -> HandlerResult:
+    """
+    Build the update booking reply and state transform from a Booking PATCH response.
+    """
 
     def success_formatter(data: dict) -> str:
         parts = [f"Your booking {data.get('booking_reference')} at {data.get('restaurant')} has been updated."]
@@ -217,12 +368,23 @@ def handle_update_booking(ctx: ConversationContext) -> HandlerResult:
 
     return (ack or "I've updated your booking.", body, transform)
 
-def handle_cancel_booking(ctx: ConversationContext) -> HandlerResult:
+def handle_update_booking(ctx: ConversationContext) -> HandlerResult:
     """
-    Handle the cancel booking intent.
+    Handle the update booking intent.
     """
 
-    resp = tools.cancel_booking(ctx.data["BookingRef"], ctx.data["CancellationReasonId"])
+    prepared, invalid = prepare_update_booking(ctx)
+    if invalid:
+        return invalid
+
+    booking_ref, updates = prepared
+    resp = tools.update_booking(booking_ref, updates)
+    return update_booking_result(resp)
+
+def cancel_booking_result(resp: dict) -> HandlerResult:
+    """
+    Build the cancel booking reply from a Booking Cancel response.
+    """
 
     def success_formatter(data: dict) -> str:
         return (
@@ -232,6 +394,14 @@ def handle_cancel_booking(ctx: ConversationContext) -> HandlerResult:
 
     return format_api_response(resp, success_formatter, reset_on_error=True)
 
+def handle_cancel_booking(ctx: ConversationContext) -> HandlerResult:
+    """
+    Handle the cancel booking intent.
+    """
+
+    resp = tools.cancel_booking(ctx.data["BookingRef"], ctx.data["CancellationReasonId"])
+    return cancel_booking_result(resp)
+
 # Router mapping
 INTENT_ROUTER: Dict[str, Callable[[ConversationContext], HandlerResult]] = {
     INTENT_CHECK: handle_check_availability,
@@ -239,4 +409,5 @@ INTENT_ROUTER: Dict[str, Callable[[ConversationContext], HandlerResult]] = {
     INTENT_GET: handle_get_booking,
     INTENT_UPDATE: handle_update_booking,
     INTENT_CANCEL: handle_cancel_booking,
+    INTENT_SEARCH: handle_search_availability,
 }
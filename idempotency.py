@@ -0,0 +1,145 @@
+"""
+Duplicate suppression for create_booking.
+
+Each create is given an idempotency key derived from the session, the venue and the
+normalized booking payload. A successful confirmation is remembered under its key for
+BOOKING_DEDUPE_TTL seconds, and a repeat submission within that window gets the
+original confirmation back instead of booking the guest twice. Concurrent duplicates
+(a double-clicked submit, a client retrying a slow request) are collapsed into the one
+create already in flight. Errors are not remembered, so a failed create can be retried.
+A confirmation is forgotten once its booking is cancelled or updated, so booking the same
+details again makes a new booking instead of handing back the old reference.
+"""
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import metrics
+from cache import TTLCache
+from config import get_config
+from singleflight import AsyncSingleFlight, SingleFlight
+
+def _normalize(key: str, value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    value = " ".join(value.split())
+    return value.lower() if key == "Customer[Email]" else value
+
+def idempotency_key(session_id: Optional[str], restaurant: Optional[str], payload: Dict[str, Any]) -> str:
+    """
+    Stable key for one create: the same guest, slot and details from the same session
+    at the same venue always give the same key, whatever the field order or spacing.
+    """
+    normalized = {k: _normalize(k, v) for k, v in payload.items() if v is not None}
+    raw = json.dumps([session_id or "", restaurant or "", normalized], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _is_success(resp: Any) -> bool:
+    return isinstance(resp, dict) and "error" not in resp
+
+class BookingDedupe:
+    """
+    Table of recent create confirmations by idempotency key, plus the creates in flight.
+    enabled=False runs every create.
+    """
+
+    def __init__(self, ttl: float = 600.0, maxsize: int = 1024, enabled: bool = True):
+        self.enabled = enabled
+        self.confirmations = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.confirmations.enabled = enabled
+        self._flights = SingleFlight("create", enabled=enabled)
+        self._async_flights = AsyncSingleFlight("create", enabled=enabled)
+        self.replayed = 0
+
+    @classmethod
+    def from_config(cls) -> "BookingDedupe":
+        config = get_config()
+        return cls(ttl=config.booking_dedupe_ttl, maxsize=config.booking_dedupe_size, enabled=config.booking_dedupe)
+
+    def replay(self, key: str) -> Optional[dict]:
+        """
+        Returns the recorded confirmation for key, or None if there isn't one.
+        """
+        resp = self.confirmations.get(key)
+        if resp is not None:
+            self.replayed += 1
+            metrics.inc("booking_duplicates_suppressed_total", reason="replay")
+        return resp
+
+    def forget(self, ref: str) -> int:
+        """
+        Drop the recorded confirmations for booking reference ref. Returns how many were dropped.
+        """
+        ref = str(ref).strip()
+        stale = {k for k, resp in self.confirmations.items() if str(resp.get("booking_reference", "")).strip() == ref}
+        return self.confirmations.invalidate(stale.__contains__) if stale else 0
+
+    def _record(self, key: str, resp: dict) -> dict:
+        if _is_success(resp):
+            self.confirmations.set(key, resp)
+        return resp
+
+    def submit(self, key: str, create: Callable[[], dict]) -> Tuple[dict, bool]:
+        """
+        Runs create() unless key was confirmed recently or is being created right now.
+        Returns (response, duplicate) where duplicate says the response is an earlier one.
+        """
+        resp = self.replay(key)
+        if resp is not None:
+            return resp, True
+        ran = []
+
+        def call():
+            ran.append(True)
+            return self._record(key, create())
+        resp = self._flights.do(key, call)
+        return resp, self._joined(ran)
+
+    async def submit_async(self, key: str, create: Callable[[], Awaitable[dict]]) -> Tuple[dict, bool]:
+        """
+        Async version of submit(). The create runs as its own task, so a caller that
+        times out leaves it to finish, and its confirmation is still recorded for a retry.
+        """
+        resp = self.replay(key)
+        if resp is not None:
+            return resp, True
+        ran = []
+
+        async def call():
+            ran.append(True)
+            return self._record(key, await create())
+        resp = await self._async_flights.do(key, call)
+        return resp, self._joined(ran)
+
+    def _joined(self, ran: list) -> bool:
+        # Only a caller whose own create() never ran was handed someone else's
+        if ran or not self.enabled:
+            return False
+        metrics.inc("booking_duplicates_suppressed_total", reason="in_flight")
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "replayed": self.replayed,
+            "in_flight_joined": self._flights.coalesced + self._async_flights.coalesced,
+            "size": len(self.confirmations),
+        }
+
+_dedupe: Optional[BookingDedupe] = None
+
+def get_dedupe() -> BookingDedupe:
+    """
+    Returns the process-wide BookingDedupe, creating it from config on first use.
+    """
+    global _dedupe
+    if _dedupe is None:
+        _dedupe = BookingDedupe.from_config()
+    return _dedupe
+
+def set_dedupe(dedupe: Optional[BookingDedupe]) -> Optional[BookingDedupe]:
+    """
+    Replaces the process-wide BookingDedupe (None rebuilds it on next use) and returns the previous one.
+    """
+    global _dedupe
+    previous, _dedupe = _dedupe, dedupe
+    return previous
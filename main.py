@@ -1,7 +1,15 @@
-from typing import Dict
+import argparse
+from typing import Callable, Dict, List, Optional
+import metrics
 import parser
-from state import ConversationContext
-from handlers import INTENT_ROUTER
+import tools
+from config import get_config
+from prefetch import prefetch_availability
+from state import BookingState, ConversationContext
+from handlers import INTENT_ROUTER, HandlerResult
+from venues import get_registry, use_venue
+
+UNKNOWN_ACTION_MESSAGE = "Sorry, I didn't understand that action."
 
 def print_welcome() -> None:
     print("Welcome to The Hungry Unicorn Booking Assistant")
@@ -9,14 +17,103 @@ def print_welcome() -> None:
     print("  1. Check availability")
     print("  2. Create a booking")
     print("  3. Cancel a booking")
-    print("  4. Modify a booking\n")
+    print("  4. Modify a booking")
+    print("  5. Search a range of dates or party sizes\n")
     print("Type 'exit' to quit.\n")
 
-def run_chat() -> None:
+def apply_nlu_reply(ctx: ConversationContext, llm_json: Dict) -> Optional[str]:
+    """
+    Merge the parser output into the context and return the message to show, if any.
+    """
+    if llm_json.get("updated_state") is not None:
+        ctx.data = BookingState.from_dict(llm_json["updated_state"])
+
+    next_message = (llm_json.get("next_message") or "").strip()
+    if next_message and ctx.data.get("status") != "ready":
+        # Only show LLM message when we're still collecting info
+        return next_message
+    return None
+
+def apply_handler_result(ctx: ConversationContext, result: HandlerResult) -> str:
+    """
+    Apply a handler's state transform and history entry, returning the body to show.
+    """
+    ack_for_history, body, transform = result
+    transform(ctx)
+    if ack_for_history:
+        ctx.history.append({"role": "assistant", "content": ack_for_history})
+    return body
+
+def handler_outcome(result: HandlerResult) -> str:
+    """
+    Outcome label for a handler's metrics span: "api_error" when the booking API call failed.
+    """
+    return "api_error" if result[0] == "API Error" else "ok"
+
+def handle_turn(ctx: ConversationContext, user_input: str,
+                on_text: Optional[Callable[[str], None]] = None) -> List[str]:
     """
-    Main chat loop for the booking assistant.
+    Run one user message through the parser -> INTENT_ROUTER -> transform pipeline.
+    Returns the agent messages to show, in order.
+
+    With on_text, the parser's next_message is streamed to it as it is generated and
+    is left out of the returned replies (unless the final message differs from it).
+    API calls go to the conversation's venue (ctx.restaurant).
     """
-    ctx = ConversationContext()
+    with use_venue(ctx.restaurant):
+        return _handle_turn(ctx, user_input, on_text)
+
+def _handle_turn(ctx: ConversationContext, user_input: str, on_text: Optional[Callable[[str], None]]) -> List[str]:
+    ctx.history.append({"role": "user", "content": user_input})
+
+    streamed: List[str] = []
+    if on_text is None:
+        llm_json: Dict = parser.update_state_with_llm(ctx.history, ctx.data.to_dict()) or {}
+    else:
+        def _on_text(text: str) -> None:
+            streamed.append(text)
+            on_text(text)
+        llm_json = parser.update_state_with_llm(ctx.history, ctx.data.to_dict(), on_text=_on_text) or {}
+    replies = []
+    next_message = apply_nlu_reply(ctx, llm_json)
+    if next_message and next_message != "".join(streamed).strip():
+        replies.append(next_message)
+
+    # Start the AvailabilitySearch a check or create will need while we keep collecting
+    prefetch_availability(ctx)
+
+    if ctx.data.get("status") == "ready":
+        handler = INTENT_ROUTER.get(ctx.data.get("intent"))
+        if not handler:
+            ctx.reset()
+            replies.append(UNKNOWN_ACTION_MESSAGE)
+            return replies
+
+        with metrics.span("handler", intent=ctx.data.get("intent")) as span:
+            result = handler(ctx)
+            span.tag(outcome=handler_outcome(result))
+        replies.append(apply_handler_result(ctx, result))
+
+    return replies
+
+def run_chat(session_id: Optional[str] = None, store_path: Optional[str] = None, stream: bool = False,
+             restaurant: Optional[str] = None) -> None:
+    """
+    Main chat loop for the booking assistant. With a session id, the conversation is
+    saved to a SessionStore after every turn and resumed from it on the next start.
+    With stream=True, the parser's question is printed as the model generates it.
+    With restaurant, bookings are made with that venue instead of the default one.
+    """
+    store = None
+    if session_id:
+        from store import SessionStore
+        store = SessionStore(store_path or "sessions.db")
+        ctx = store.load_or_create(session_id)
+    else:
+        ctx = ConversationContext()
+    if restaurant:
+        ctx.restaurant = get_registry().get(restaurant).name
+    sync = tools.start_availability_sync()
     print_welcome()
 
     while True:
@@ -25,36 +122,81 @@ def run_chat() -> None:
             print("Agent: Goodbye!")
             break
 
-        ctx.history.append({"role": "user", "content": user_input})
-
-        llm_json: Dict = parser.update_state_with_llm(ctx.history, ctx.data) or {}
-        ctx.data = llm_json.get("updated_state", ctx.data)
-
-        next_message = (llm_json.get("next_message") or "").strip()
-        if next_message and ctx.data.get("status") != "ready":
-            # Only show LLM message when we're still collecting info
-            print(f"Agent: {next_message}")
+        streamed: List[str] = []
 
-        if ctx.data.get("status") == "ready":
-            intent = ctx.data.get("intent")
-            handler = INTENT_ROUTER.get(intent)
+        def print_chunk(text: str) -> None:
+            if not streamed:
+                print("Agent: ", end="")
+            streamed.append(text)
+            print(text.replace("\n", "\n       "), end="", flush=True)
 
-            
-            if not handler:
-                print("Agent: Sorry, I didn't understand that action.")
-                ctx.reset()
-                continue
+        replies = handle_turn(ctx, user_input, on_text=print_chunk if stream else None)
+        if streamed:
+            print()
+        for reply in replies:
+            formatted_reply = reply.replace("\n", "\n       ")
+            print(f"Agent: {formatted_reply}")
+        if store:
+            store.save_turn(ctx)
 
-            ack_for_history, body, transform = handler(ctx)
-            formatted_body = body.replace("\n", "\n       ")
-            print(f"Agent: {formatted_body}")
+    if sync is not None:
+        sync.stop()
+    metrics_path = get_config().metrics_path
+    if metrics_path:
+        metrics.get_metrics().write_jsonl(metrics_path)
 
-            transform(ctx)
-            if ack_for_history:
-                ctx.history.append({"role": "assistant", "content": ack_for_history})
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="The Hungry Unicorn Booking Assistant")
+    ap.add_argument("--serve", action="store_true", help="serve many conversations over HTTP instead of the terminal chat")
+    ap.add_argument("--host", default="127.0.0.1", help="host to bind in --serve mode")
+    ap.add_argument("--port", type=int, default=8080, help="port to bind in --serve mode")
+    ap.add_argument("--session", help="persist this conversation under a session id and resume it on restart")
+    ap.add_argument("--store", help="SQLite file for persisted sessions (--session defaults to sessions.db; "
+                                    "--serve only persists when it is given)")
+    ap.add_argument("--stream", action="store_true", help="print the assistant's questions as they are generated")
+    ap.add_argument("--restaurant", help="venue to book with (one of the default restaurant or VENUES_PATH entries)")
+    ap.add_argument("--nlu", choices=["autogen", "openai", "offline"],
+                    help="NLU backend to use (defaults to NLU_BACKEND, else autogen)")
+    ap.add_argument("--batch", metavar="TRANSCRIPTS", help="replay conversations from a JSONL file instead of chatting")
+    ap.add_argument("--output", default="-", help="JSONL file for --batch/--bulk results (default stdout)")
+    ap.add_argument("--workers", type=int, help="worker processes for --batch (default: CPU count)")
+    ap.add_argument("--api", choices=["real", "mock"], default="real",
+                    help="in --batch/--bulk mode, use the configured booking API or a local mock")
+    ap.add_argument("--bulk", metavar="OPERATIONS", help="run create/update/cancel rows from a CSV or JSONL file")
+    ap.add_argument("--checkpoint", help="file recording finished --bulk rows, so a rerun resumes where it stopped")
+    ap.add_argument("--concurrency", type=int, default=8, help="--bulk operations in flight at once")
+    ap.add_argument("--rate", type=float, default=20.0, help="maximum --bulk operations per second (0: no limit)")
+    ap.add_argument("--skip-invalid", action="store_true", help="run the valid --bulk rows even if some are invalid")
+    return ap.parse_args(argv)
 
 if __name__ == "__main__":
-    try:
-        run_chat()
-    except KeyboardInterrupt:
-        print("\nAgent: Goodbye!")
+    args = parse_args()
+    if args.nlu:
+        import dataclasses
+        import config
+        config.set_config(dataclasses.replace(config.get_config(), nlu_backend=args.nlu))
+    if args.batch:
+        import json
+        import sys
+        from batch import run_batch
+        summary = run_batch(args.batch, args.output, workers=args.workers, nlu=args.nlu, api=args.api)
+        print(json.dumps(summary), file=sys.stderr)
+    elif args.bulk:
+        import json
+        import sys
+        from bulk import run_bulk
+        summary = run_bulk(args.bulk, args.output, checkpoint_path=args.checkpoint, concurrency=args.concurrency,
+                           rate=args.rate, api=args.api, skip_invalid=args.skip_invalid, progress=sys.stderr)
+        print(json.dumps(summary), file=sys.stderr)
+        sys.exit(1 if summary["aborted"] or summary["failed"] else 0)
+    elif args.serve:
+        from server import run_server
+        try:
+            run_server(args.host, args.port, store_path=args.store)
+        except KeyboardInterrupt:
+            pass
+    else:
+        try:
+            run_chat(args.session, args.store, stream=args.stream, restaurant=args.restaurant)
+        except KeyboardInterrupt:
+            print("\nAgent: Goodbye!")
@@ -0,0 +1,273 @@
+"""
+In-process latency histograms, outcome counters and state gauges.
+
+Spans time a block and record it in the histogram "<name>_seconds" with the span's
+labels; labels can be added while the span is open (e.g. the status code once a
+response is in). Everything is exported as Prometheus text or JSON lines.
+
+Metrics are off unless METRICS=1: the registry is then disabled, span() hands back a
+shared no-op span and inc()/set_gauge()/observe() return immediately.
+"""
+import bisect
+import json
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config import get_config
+
+NAMESPACE = "booking_agent"
+
+# Upper bounds (seconds) of the latency buckets, from cache hits to slow model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+class Histogram:
+    """
+    Cumulative-bucket histogram for one (name, labels) series.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total, out = 0, []
+        for bound, n in zip(list(self.buckets) + ["+Inf"], self.counts):
+            total += n
+            out.append((str(bound), total))
+        return out
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the q-th observation (None when empty,
+        inf when it is past the last bucket).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, (_, total) in zip(list(self.buckets) + [float("inf")], self.cumulative()):
+            if total >= rank:
+                return bound
+        return float("inf")
+
+class Span:
+    """
+    Times a with-block and records it on exit. An exception leaving the block is
+    recorded as error=<exception class>.
+    """
+
+    __slots__ = ("metrics", "name", "labels", "started")
+
+    def __init__(self, metrics: "Metrics", name: str, labels: Dict):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.started = 0.0
+
+    def tag(self, **labels) -> "Span":
+        self.labels.update(labels)
+        return self
+
+    def __enter__(self) -> "Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is not None:
+            self.labels["error"] = exc_type.__name__
+        self.metrics.observe(f"{self.name}_seconds", time.perf_counter() - self.started, **self.labels)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def tag(self, **labels) -> "_NullSpan":
+        return self
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+NULL_SPAN = _NullSpan()
+
+class Metrics:
+    """
+    Thread-safe registry of counters and histograms keyed by name and labels.
+    """
+
+    def __init__(self, enabled: bool = True, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str, **labels):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, labels)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self.gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(self.buckets)
+            hist.observe(value)
+
+    def counter_value(self, name: str, **labels) -> float:
+        return self.counters.get(name, {}).get(_label_key(labels), 0)
+
+    def gauge_value(self, name: str, **labels) -> Optional[float]:
+        return self.gauges.get(name, {}).get(_label_key(labels))
+
+    def histogram(self, name: str, **labels) -> Optional[Histogram]:
+        return self.histograms.get(name, {}).get(_label_key(labels))
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> Iterator[Dict]:
+        """
+        Yields one dict per series: counters and gauges with their value, histograms with count,
+        sum, cumulative buckets and approximate p50/p95/p99.
+        """
+        with self._lock:
+            counters = {n: dict(s) for n, s in self.counters.items()}
+            gauges = {n: dict(s) for n, s in self.gauges.items()}
+            histograms = {n: {k: (h.count, h.sum, h.cumulative(), [_bound(h.quantile(q)) for q in (0.5, 0.95, 0.99)])
+                              for k, h in s.items()} for n, s in self.histograms.items()}
+        for name in sorted(counters):
+            for key, value in sorted(counters[name].items()):
+                yield {"type": "counter", "name": name, "labels": dict(key), "value": value}
+        for name in sorted(gauges):
+            for key, value in sorted(gauges[name].items()):
+                yield {"type": "gauge", "name": name, "labels": dict(key), "value": value}
+        for name in sorted(histograms):
+            for key, (count, total, buckets, (p50, p95, p99)) in sorted(histograms[name].items()):
+                yield {"type": "histogram", "name": name, "labels": dict(key), "count": count, "sum": total,
+                       "buckets": dict(buckets), "p50": p50, "p95": p95, "p99": p99}
+
+    def to_prometheus(self) -> str:
+        """
+        Renders every series in the Prometheus text exposition format.
+        """
+        lines, typed = [], set()
+        for s in self.snapshot():
+            name = f"{NAMESPACE}_{s['name']}"
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {s['type']}")
+            if s["type"] in ("counter", "gauge"):
+                lines.append(f"{name}{_prom_labels(s['labels'])} {s['value']}")
+                continue
+            for bound, total in s["buckets"].items():
+                lines.append(f"{name}_bucket{_prom_labels({**s['labels'], 'le': bound})} {total}")
+            lines.append(f"{name}_sum{_prom_labels(s['labels'])} {s['sum']}")
+            lines.append(f"{name}_count{_prom_labels(s['labels'])} {s['count']}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def to_jsonl(self, timestamp: Optional[float] = None) -> str:
+        """
+        Renders every series as one JSON object per line, stamped with the export time.
+        """
+        ts = time.time() if timestamp is None else timestamp
+        return "".join(json.dumps({"ts": ts, **s}) + "\n" for s in self.snapshot())
+
+    def write_jsonl(self, path: str) -> None:
+        """
+        Appends a JSON-lines snapshot to path.
+        """
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.to_jsonl())
+
+def _bound(value: Optional[float]):
+    return "+Inf" if value == float("inf") else value
+
+def _prom_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+_metrics: Optional[Metrics] = None
+
+def get_metrics() -> Metrics:
+    """
+    Returns the process-wide registry, enabled according to config.metrics.
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics(enabled=get_config().metrics)
+    return _metrics
+
+def set_metrics(metrics: Optional[Metrics]) -> Optional[Metrics]:
+    """
+    Replaces the process-wide registry (None rebuilds it from config on next use) and
+    returns the previous one.
+    """
+    global _metrics
+    previous, _metrics = _metrics, metrics
+    return previous
+
+def span(name: str, **labels):
+    return get_metrics().span(name, **labels)
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    get_metrics().inc(name, value, **labels)
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    get_metrics().set_gauge(name, value, **labels)
+
+def api_status(resp) -> str:
+    """
+    Status label for an API call result, from the dicts handle_response() and
+    handle_request_error() produce: the HTTP status code, "timeout", "circuit_open" or
+    "connection_error".
+    """
+    if not isinstance(resp, dict) or "error" not in resp:
+        return "200"
+    if resp.get("status_code") is not None:
+        return str(resp["status_code"])
+    error = str(resp["error"])
+    if error.startswith("Timeout"):
+        return "timeout"
+    return "circuit_open" if error.startswith("Service Unavailable") else "connection_error"
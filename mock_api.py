@@ -0,0 +1,189 @@
+"""
+Local stand-in for the restaurant booking API (/api/ConsumerApi/v1/Restaurant/{name}/...).
+
+Implements the five endpoints the assistant calls with in-memory bookings, form-encoded
+request bodies and the same response shapes as the real service. Used by the benchmarks
+and for offline runs; not meant for production.
+
+Usage:
+    python mock_api.py --port 8547 --latency-ms 20
+"""
+import argparse
+import json
+import random
+import re
+import string
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from constants import CANCELLATION_REASONS
+
+SLOT_TIMES = [f"{h:02d}:{m:02d}:00" for h in range(12, 22) for m in (0, 30)]
+TABLES_PER_SLOT = 4
+ROUTE_RE = re.compile(r"^/api/ConsumerApi/v1/Restaurant/(?P<restaurant>[^/]+)/(?P<rest>.+)$")
+
+class MockBookingApi:
+    """
+    In-memory booking book shared by all request threads.
+    """
+
+    def __init__(self, latency: float = 0.0, token: Optional[str] = None):
+        self.latency = latency
+        self.token = token
+        self.bookings: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def _taken(self, restaurant: str, visit_date: str, visit_time: str) -> int:
+        return sum(
+            1 for b in self.bookings.values()
+            if b["restaurant"] == restaurant and b["visit_date"] == visit_date
+            and b["visit_time"] == visit_time and b["status"] != "cancelled"
+        )
+
+    def availability(self, restaurant: str, form: Dict[str, str]) -> Tuple[int, Dict]:
+        visit_date, party_size = form.get("VisitDate"), form.get("PartySize")
+        if not visit_date or not str(party_size or "").isdigit():
+            return 422, {"detail": "VisitDate and PartySize are required"}
+        with self.lock:
+            slots = [
+                {"time": t, "available": self._taken(restaurant, visit_date, t) < TABLES_PER_SLOT,
+                 "max_party_size": 8, "current_bookings": self._taken(restaurant, visit_date, t)}
+                for t in SLOT_TIMES
+            ]
+        return 200, {"restaurant": restaurant, "restaurant_id": 1, "visit_date": visit_date,
+                     "party_size": int(party_size), "channel_code": form.get("ChannelCode", "ONLINE"),
+                     "available_slots": slots, "total_slots": len(slots)}
+
+    def create(self, restaurant: str, form: Dict[str, str]) -> Tuple[int, Dict]:
+        missing = [k for k in ("VisitDate", "VisitTime", "PartySize") if not form.get(k)]
+        if missing:
+            return 422, {"detail": f"Missing: {', '.join(missing)}"}
+        with self.lock:
+            if self._taken(restaurant, form["VisitDate"], form["VisitTime"]) >= TABLES_PER_SLOT:
+                return 400, {"detail": "No availability for the requested time"}
+            ref = "".join(random.choices(string.ascii_uppercase + string.digits, k=7))
+            booking = {
+                "booking_reference": ref, "booking_id": len(self.bookings) + 1, "restaurant": restaurant,
+                "visit_date": form["VisitDate"], "visit_time": form["VisitTime"],
+                "party_size": int(form["PartySize"]), "special_requests": form.get("SpecialRequests"),
+                "status": "confirmed",
+                "customer": {"first_name": form.get("Customer[FirstName]"), "surname": form.get("Customer[Surname]"),
+                             "email": form.get("Customer[Email]"), "mobile": form.get("Mobile")},
+                "created_at": datetime.now().isoformat(),
+            }
+            self.bookings[ref] = booking
+        return 200, dict(booking)
+
+    def get(self, restaurant: str, ref: str) -> Tuple[int, Dict]:
+        with self.lock:
+            booking = self.bookings.get(ref)
+        if booking is None or booking["restaurant"] != restaurant:
+            return 404, {"detail": "Booking not found"}
+        return 200, dict(booking)
+
+    def update(self, restaurant: str, ref: str, form: Dict[str, str]) -> Tuple[int, Dict]:
+        fields = {"VisitDate": "visit_date", "VisitTime": "visit_time", "PartySize": "party_size",
+                  "SpecialRequests": "special_requests"}
+        with self.lock:
+            booking = self.bookings.get(ref)
+            if booking is None or booking["restaurant"] != restaurant:
+                return 404, {"detail": "Booking not found"}
+            updates = {fields[k]: (int(v) if k == "PartySize" else v) for k, v in form.items() if k in fields}
+            booking.update(updates)
+        return 200, {"booking_reference": ref, "booking_id": booking["booking_id"], "restaurant": restaurant,
+                     "updates": updates, "status": "updated", "updated_at": datetime.now().isoformat(),
+                     "message": f"Booking {ref} has been successfully updated"}
+
+    def cancel(self, restaurant: str, ref: str, form: Dict[str, str]) -> Tuple[int, Dict]:
+        reason_id = int(form.get("cancellationReasonId") or 0)
+        if reason_id not in CANCELLATION_REASONS:
+            return 422, {"detail": "Invalid cancellation reason"}
+        with self.lock:
+            booking = self.bookings.get(ref)
+            if booking is None or booking["restaurant"] != restaurant:
+                return 404, {"detail": "Booking not found"}
+            booking["status"] = "cancelled"
+        return 200, {"booking_reference": ref, "booking_id": booking["booking_id"], "restaurant": restaurant,
+                     "cancellation_reason_id": reason_id, "cancellation_reason": CANCELLATION_REASONS[reason_id],
+                     "status": "cancelled", "cancelled_at": datetime.now().isoformat(),
+                     "message": f"Booking {ref} has been successfully cancelled"}
+
+    def dispatch(self, method: str, path: str, form: Dict[str, str], auth: str) -> Tuple[int, Dict]:
+        with self.lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.token is not None and auth != f"Bearer {self.token}":
+            return 401, {"detail": "Invalid token"}
+        m = ROUTE_RE.match(path.split("?", 1)[0])
+        if not m:
+            return 404, {"detail": "Not found"}
+        restaurant, parts = m.group("restaurant"), m.group("rest").split("/")
+        if method == "POST" and parts == ["AvailabilitySearch"]:
+            return self.availability(restaurant, form)
+        if method == "POST" and parts == ["BookingWithStripeToken"]:
+            return self.create(restaurant, form)
+        if len(parts) == 2 and parts[0] == "Booking" and method == "GET":
+            return self.get(restaurant, parts[1])
+        if len(parts) == 2 and parts[0] == "Booking" and method == "PATCH":
+            return self.update(restaurant, parts[1], form)
+        if len(parts) == 3 and parts[0] == "Booking" and parts[2] == "Cancel" and method == "POST":
+            return self.cancel(restaurant, parts[1], form)
+        return 404, {"detail": "Not found"}
+
+def _handler_for(api: MockBookingApi):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _serve(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode("utf-8") if length else ""
+            form = {k: v[0] for k, v in parse_qs(body).items()}
+            status, payload = api.dispatch(self.command, self.path, form, self.headers.get("Authorization", ""))
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PATCH = _serve
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def start_mock_api(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                   token: Optional[str] = None) -> Tuple[ThreadingHTTPServer, MockBookingApi]:
+    """
+    Starts the mock API on a background thread. Port 0 picks a free port; the bound
+    address is server.server_address. Call server.shutdown() to stop it.
+    """
+    api = MockBookingApi(latency=latency, token=token)
+    server = ThreadingHTTPServer((host, port), _handler_for(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-api", daemon=True).start()
+    return server, api
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8547)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every response")
+    ap.add_argument("--token", help="require this bearer token")
+    args = ap.parse_args()
+    server, _ = start_mock_api(args.host, args.port, args.latency_ms / 1000, args.token)
+    print(f"Mock booking API on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
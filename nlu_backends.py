@@ -0,0 +1,173 @@
+import json
+from dataclasses import dataclass, replace
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Protocol, Union
+
+import extractor
+from constants import REQUIRED_FIELDS
+
+@dataclass
+class NluRequest:
+    """
+    One state-update call. messages is the conversation for the model (the per-turn
+    prompt, plus any re-ask exchange); history, state and today are the structured
+    inputs it was built from, for backends that don't read prompts.
+    """
+    messages: List[Dict[str, str]]
+    history: List[Dict]
+    state: Dict
+    today: date
+
+class NluBackend(Protocol):
+    """
+    Anything that can answer a state-update request with the raw reply text.
+    The system prompt is the backend's responsibility (see parser.SYSTEM_PROMPT).
+    """
+    name: str
+
+    def complete(self, request: NluRequest) -> str: ...
+
+    def stream(self, request: NluRequest) -> Iterator[str]: ...
+
+class AutogenBackend:
+    """
+    The original backend: an autogen AssistantAgent with SYSTEM_PROMPT as its system message.
+    autogen is imported and the agent built on first use.
+    """
+    name = "autogen"
+
+    def __init__(self, model: str, system_prompt: str):
+        self.model = model
+        self.system_prompt = system_prompt
+        self._agent = None
+
+    @property
+    def agent(self):
+        if self._agent is None:
+            from autogen import AssistantAgent
+            self._agent = AssistantAgent(
+                name="state_manager",
+                llm_config={"model": self.model},
+                system_message=self.system_prompt
+            )
+        return self._agent
+
+    def complete(self, request: NluRequest) -> str:
+        return self.agent.generate_reply(messages=request.messages)
+
+    def stream(self, request: NluRequest) -> Iterator[str]:
+        # generate_reply has no incremental output; hand over the whole reply at once
+        yield self.complete(request)
+
+class OpenAIBackend:
+    """
+    Calls the chat completions API directly, without autogen. Supports true streaming.
+    """
+    name = "openai"
+
+    def __init__(self, model: str, system_prompt: str, client=None):
+        self.model = model
+        self.system_prompt = system_prompt
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI()
+        return self._client
+
+    def _messages(self, request: NluRequest) -> List[Dict[str, str]]:
+        return [{"role": "system", "content": self.system_prompt}] + list(request.messages)
+
+    def complete(self, request: NluRequest) -> str:
+        resp = self.client.chat.completions.create(model=self.model, messages=self._messages(request))
+        return resp.choices[0].message.content or ""
+
+    def stream(self, request: NluRequest) -> Iterator[str]:
+        events = self.client.chat.completions.create(model=self.model, messages=self._messages(request), stream=True)
+        for event in events:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+Scripted = Union[str, Dict[str, Any]]
+
+class OfflineBackend:
+    """
+    Deterministic backend that never touches the network.
+
+    With responses (an iterable of raw reply strings or reply dicts, or a callable
+    taking the NluRequest), replies are scripted and returned in order. Otherwise, and
+    once a script runs out, replies are rule-based. The extractor merges what it
+    understands; for anything else the state is kept and the guest is asked for the
+    next missing field or to rephrase.
+    """
+    name = "offline"
+
+    def __init__(self, responses: Optional[Union[Iterable[Scripted], Callable[[NluRequest], Scripted]]] = None,
+                 chunk_size: int = 16):
+        self._script = responses if callable(responses) else iter(responses or ())
+        self.chunk_size = chunk_size
+        self.calls: List[NluRequest] = []
+
+    @classmethod
+    def from_file(cls, path: str) -> "OfflineBackend":
+        """
+        Builds a scripted backend from a file with one JSON reply per line.
+        """
+        with open(path, encoding="utf-8") as f:
+            return cls([line.strip() for line in f if line.strip()])
+
+    def complete(self, request: NluRequest) -> str:
+        self.calls.append(replace(request))
+        if callable(self._script):
+            reply = self._script(request)
+        else:
+            reply = next(self._script, None)
+            if reply is None:
+                reply = self.rule_based(request)
+        return reply if isinstance(reply, str) else json.dumps(reply)
+
+    def stream(self, request: NluRequest) -> Iterator[str]:
+        raw = self.complete(request)
+        for i in range(0, len(raw), self.chunk_size):
+            yield raw[i:i + self.chunk_size]
+
+    @staticmethod
+    def rule_based(request: NluRequest) -> Dict:
+        message = next((m["content"] for m in reversed(request.history) if m.get("role") == "user"), "")
+        reply = extractor.extract(message, request.state, request.today) if message else None
+        if reply is not None:
+            return reply
+        state = dict(request.state, status="collecting")
+        missing = [k for k in REQUIRED_FIELDS.get(state.get("intent"), []) if state.get(k) in (None, "")]
+        if missing:
+            next_message = extractor.QUESTIONS[missing[0]]
+        else:
+            next_message = "Sorry, I can only handle simple requests right now. Could you rephrase that?"
+        return {"updated_state": state, "next_message": next_message}
+
+BACKENDS = {
+    AutogenBackend.name: AutogenBackend,
+    OpenAIBackend.name: OpenAIBackend,
+    OfflineBackend.name: OfflineBackend,
+}
+
+def create_backend(name: str, model: str, system_prompt: str, script_path: Optional[str] = None) -> NluBackend:
+    """
+    Builds the backend registered under name ("autogen", "openai" or "offline").
+
+    Args:
+        name (str): Backend name.
+        model (str): Model for the autogen and openai backends.
+        system_prompt (str): System message for the model-backed backends.
+        script_path (str): For "offline", an optional file of scripted replies (one JSON per line).
+
+    Returns:
+        NluBackend: The backend instance.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown NLU backend {name!r}; choose one of {', '.join(BACKENDS)}")
+    if name == OfflineBackend.name:
+        return OfflineBackend.from_file(script_path) if script_path else OfflineBackend()
+    return BACKENDS[name](model, system_prompt)
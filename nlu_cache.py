@@ -0,0 +1,125 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from cache import TTLCache
+
+def _normalize_text(text: str) -> str:
+    # "Yes." / "yes" / "  YES " are the same turn as far as the state update goes
+    return re.sub(r"\s+", " ", str(text or "")).strip().lower().rstrip(".!")
+
+def reply_key(history: List[Dict], state: Dict, today: str, prompt_version: str, turns: int) -> str:
+    """
+    Normalized hash of everything a memoized state update depends on: the state, the
+    last `turns` messages, today's date and the prompt version.
+    """
+    material = {
+        "v": prompt_version,
+        "today": today,
+        "state": state,
+        "turns": [[m.get("role"), _normalize_text(m.get("content"))] for m in history[-turns:]] if turns else [],
+    }
+    raw = json.dumps(material, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class NluReplyCache:
+    """
+    Two-tier memo of validated parser replies: a bounded in-memory LRU, optionally
+    backed by a SQLite file so warm entries survive restarts.
+
+    Replies are stored as JSON text and decoded on every hit, so callers always get a
+    fresh object. Each entry remembers how long the model call took; hits add that to
+    latency_saved.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 86400.0, path: Optional[str] = None):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.path = path
+        self.disk_hits = 0
+        self.stores = 0
+        self.latency_saved = 0.0
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS nlu_replies ("
+                "key TEXT PRIMARY KEY, reply TEXT NOT NULL, latency REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory.enabled
+
+    @enabled.setter
+    def enabled(self, value: bool) -> None:
+        self.memory.enabled = value
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        entry = self.memory.get(key)
+        if entry is None and self._conn is not None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT reply, latency FROM nlu_replies WHERE key = ? AND created_at > ?",
+                    (key, time.time() - self.ttl),
+                ).fetchone()
+            if row is not None:
+                entry = (row[0], row[1])
+                self.disk_hits += 1
+                self.memory.set(key, entry)
+        if entry is None:
+            return None
+        with self._lock:
+            self.latency_saved += entry[1]
+        return json.loads(entry[0])
+
+    def set(self, key: str, reply: Dict, latency: float) -> None:
+        if not self.enabled:
+            return
+        entry = (json.dumps(reply, separators=(",", ":"), ensure_ascii=False), latency)
+        self.memory.set(key, entry)
+        with self._lock:
+            self.stores += 1
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO nlu_replies (key, reply, latency, created_at) VALUES (?, ?, ?, ?)",
+                    (key, entry[0], latency, time.time()),
+                )
+
+    def clear(self) -> None:
+        self.memory.clear()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM nlu_replies")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Memory-tier hit/miss counts plus disk hits, stores and total model latency saved.
+        A disk hit counts as a memory miss, so hit_ratio here covers both tiers.
+        """
+        stats = self.memory.stats()
+        total = stats["hits"] + stats["misses"]
+        hits = stats["hits"] + self.disk_hits
+        stats.update({
+            "hits": hits,
+            "misses": total - hits,
+            "hit_ratio": hits / total if total else 0.0,
+            "disk_hits": self.disk_hits,
+            "stores": self.stores,
+            "latency_saved": self.latency_saved,
+        })
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,209 @@
+import ast
+import json
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from constants import *
+from state import STATE_FIELDS, DATE_FIELDS, INT_FIELDS
+
+ALLOWED_INTENTS = (INTENT_CHECK, INTENT_CREATE, INTENT_GET, INTENT_UPDATE, INTENT_CANCEL, INTENT_SEARCH,
+                   "greeting", "unknown")
+ALLOWED_STATUSES = ("collecting", "ready")
+
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+TIME_RE = re.compile(r"^\d{2}:\d{2}:\d{2}$")
+
+# How replies have fared since start-up (see repair_stats()).
+STATS = {"replies": 0, "parse_failures": 0, "invalid": 0, "repaired": 0, "reasks": 0, "reask_fixed": 0,
+         "unrecovered": 0}
+
+def validate_reply(reply: Any) -> List[str]:
+    """
+    Checks a decoded reply against the state manager's schema.
+
+    Args:
+        reply: The decoded model reply.
+
+    Returns:
+        list: Human-readable problems; empty when the reply is valid.
+    """
+    if not isinstance(reply, dict):
+        return ["reply must be a JSON object"]
+    errors = []
+    if not isinstance(reply.get("next_message"), str):
+        errors.append("next_message must be a string")
+    state = reply.get("updated_state")
+    if not isinstance(state, dict):
+        return errors + ["updated_state must be an object"]
+
+    for key in state:
+        if key not in STATE_FIELDS:
+            errors.append(f"unknown field {key}")
+    for key in STATE_FIELDS:
+        if key not in state:
+            errors.append(f"missing field {key}")
+
+    intent = state.get("intent")
+    if intent is not None and intent not in ALLOWED_INTENTS:
+        errors.append(f"intent must be one of {', '.join(ALLOWED_INTENTS)}")
+    if state.get("status") not in ALLOWED_STATUSES:
+        errors.append("status must be 'collecting' or 'ready'")
+
+    for key in DATE_FIELDS:
+        value = state.get(key)
+        if value is None:
+            continue
+        try:
+            if not (isinstance(value, str) and DATE_RE.match(value)):
+                raise ValueError
+            date.fromisoformat(value)
+        except ValueError:
+            errors.append(f"{key} must be a real date in YYYY-MM-DD format")
+
+    visit_time = state.get("VisitTime")
+    if visit_time is not None and not (isinstance(visit_time, str) and TIME_RE.match(visit_time)):
+        errors.append("VisitTime must be HH:MM:SS (24-hour)")
+
+    for key in INT_FIELDS:
+        value = state.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value <= 0):
+            errors.append(f"{key} must be a positive integer")
+    reason = state.get("CancellationReasonId")
+    if isinstance(reason, int) and reason > 0 and reason not in CANCELLATION_REASONS:
+        errors.append(f"CancellationReasonId must be one of {', '.join(map(str, CANCELLATION_REASONS))}")
+
+    earliest = state.get("EarliestOnly")
+    if earliest is not None and not isinstance(earliest, bool):
+        errors.append("EarliestOnly must be true, false or null")
+
+    for key in STATE_FIELDS:
+        if key in DATE_FIELDS or key in INT_FIELDS or key in ("VisitTime", "EarliestOnly", "intent", "status"):
+            continue
+        if state.get(key) is not None and not isinstance(state[key], str):
+            errors.append(f"{key} must be a string or null")
+    return errors
+
+def _balanced_object(text: str) -> Optional[str]:
+    """
+    The first complete {...} span in text, ignoring braces inside strings.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    depth, quote, escape = 0, None, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if quote:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == quote:
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+def repair_text(raw: str) -> Optional[Dict]:
+    """
+    Recovers a JSON object from common formatting mistakes: markdown code fences, text
+    before or after the object, trailing commas, and Python-style single quotes.
+
+    Returns:
+        dict: The decoded object, or None if nothing could be recovered.
+    """
+    text = re.sub(r"```(?:json)?", "", str(raw or ""))
+    candidate = _balanced_object(text)
+    if candidate is None:
+        return None
+    candidate = re.sub(r",\s*([}\]])", r"\1", candidate)
+    try:
+        obj = json.loads(candidate)
+    except json.JSONDecodeError:
+        python_literal = re.sub(r"\btrue\b", "True", candidate)
+        python_literal = re.sub(r"\bfalse\b", "False", python_literal)
+        python_literal = re.sub(r"\bnull\b", "None", python_literal)
+        try:
+            obj = ast.literal_eval(python_literal)
+        except (ValueError, SyntaxError):
+            return None
+    return obj if isinstance(obj, dict) else None
+
+def repair_reply(reply: Dict, current_state: Dict) -> Dict:
+    """
+    Fixes common value mistakes in a decoded reply: stringified numbers and booleans,
+    HH:MM times, empty strings, unknown keys and fields left out (kept from current_state).
+    The reply is not modified; a repaired copy is returned.
+    """
+    state = dict(reply.get("updated_state") or {})
+    repaired = {}
+    for key in STATE_FIELDS:
+        value = state.get(key, current_state.get(key) if current_state else None)
+        if isinstance(value, str):
+            value = value.strip() or None
+        if key in INT_FIELDS and isinstance(value, str) and value.isdigit():
+            value = int(value)
+        elif key == "EarliestOnly" and isinstance(value, str) and value.lower() in ("true", "false"):
+            value = value.lower() == "true"
+        elif key == "VisitTime" and isinstance(value, str) and re.match(r"^\d{2}:\d{2}$", value):
+            value += ":00"
+        elif key not in INT_FIELDS and key != "EarliestOnly" and isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        repaired[key] = value
+    if repaired["status"] is None:
+        repaired["status"] = "collecting"
+    message = reply.get("next_message")
+    return {"updated_state": repaired, "next_message": "" if message is None else str(message)}
+
+def check_reply(raw: str, current_state: Dict) -> Tuple[Optional[Dict], List[str]]:
+    """
+    Decodes, validates and (if needed) locally repairs one raw model reply.
+
+    Args:
+        raw (str): The model's reply text.
+        current_state (dict): The state sent with the prompt; fills fields the reply left out.
+
+    Returns:
+        tuple: (valid reply, []) on success, otherwise (None, problems to report back to the model).
+    """
+    STATS["replies"] += 1
+    try:
+        reply = json.loads(raw)
+        parsed = True
+    except (json.JSONDecodeError, TypeError):
+        STATS["parse_failures"] += 1
+        reply = repair_text(raw)
+        parsed = False
+        if reply is None:
+            return None, ["reply was not a JSON object"]
+
+    errors = validate_reply(reply)
+    if not errors and parsed:
+        return reply, []
+    if parsed:
+        STATS["invalid"] += 1
+    if isinstance(reply, dict) and isinstance(reply.get("updated_state"), dict):
+        reply = repair_reply(reply, current_state)
+        errors = validate_reply(reply)
+    if errors:
+        return None, errors
+    STATS["repaired"] += 1
+    return reply, []
+
+def repair_stats() -> Dict[str, Any]:
+    """
+    Returns reply counts plus the parse-failure rate and the share of bad replies that
+    the local repair pass fixed (re-asks are counted separately in reasks/reask_fixed).
+    """
+    bad = STATS["parse_failures"] + STATS["invalid"]
+    stats = dict(STATS)
+    stats["parse_failure_rate"] = STATS["parse_failures"] / STATS["replies"] if STATS["replies"] else 0.0
+    stats["repair_rate"] = STATS["repaired"] / bad if bad else 0.0
+    return stats
@@ -1,101 +1,292 @@
 import json
-from autogen import AssistantAgent
+import time
+from functools import lru_cache
 from datetime import date
 
-nlu_agent = AssistantAgent(
-    name="state_manager",
-    llm_config={"model": "gpt-4o"},
-    system_message="You are a restaurant booking assistant's state manager."
-)
+import extractor
+import metrics
+import nlu_schema
+from config import get_config
+from constants import CANCELLATION_REASONS
+from nlu_backends import NluRequest, create_backend
+from nlu_cache import NluReplyCache, reply_key
+from streaming import ReplyStreamParser
 
-def update_state_with_llm(conversation_history, current_state):
+# Bump whenever SYSTEM_PROMPT changes so anything keyed on the prompt can tell versions apart.
+PROMPT_VERSION = "3"
+
+# Only the most recent turns are sent; the state already carries everything merged earlier.
+RECENT_TURNS = 8
+
+# Fixed instructions sent as the system message. It must stay byte-identical across turns
+# (no dates, state or history in here) so the provider's prompt-prefix cache can match it.
+SYSTEM_PROMPT = """You are a restaurant booking assistant's state manager.
+You manage restaurant bookings and maintain a JSON state across turns.
+
+STRICT RULES:
+- ALWAYS preserve previously-known fields unless the user explicitly changes them.
+- If the user provides a relative date (e.g., "tomorrow", "next Friday"), convert it to an absolute YYYY-MM-DD using today's date.
+- If the user provides time in 12-hour format (e.g., "2pm"), convert it to 24-hour HH:MM:SS.
+- Convert party size words or phrases ("four", "for 4") to an integer (4).
+- Use search_availability (not check_availability) when the user asks about a range of dates (e.g., "any evening next week") or a range of party sizes (e.g., "for 4-6 people"). A single party size leaves PartySizeMax null.
+- Only ask for fields that are still missing. Do NOT re-ask for fields already present.
+- If all required fields for the current intent are present, set "status": "ready" and write a short confirmation in "next_message".
+- If something is missing, set "status": "collecting" and ask ONE concise, helpful question in "next_message".
+- For Cancellation flows: when the user provides a cancellation reason, it must be mapped to the appropriate CancellationReasonId. Only inquiries about the reason for cancelling not for CancellationReasonId specifically.
+- For UPDATE flows: when the user requests a change (e.g., "move to the next day", "change time to 8pm", "make it 6 people"), OVERWRITE the corresponding existing field with the normalized value.
+- For UPDATE flows: do not prompt for information unless the user requests a change. After a change, confirm if they want to update anything else (e.g., "Would you like to change anything else?"). If the user says "no" or "that's all" or similar after a change, mark status as 'ready' and proceed with the update, even if no new fields are provided.
+
+IMPORTANT CLARIFICATION:
+- Do NOT prompt for optional fields.
+- Do NOT confirm or imply that an action (like checking availability or making a booking) has been completed.
+- Your job is ONLY to collect and normalize information, update the state, and ask for missing details.
+- If all required fields are present, set "status": "ready" and in "next_message" simply confirm the details you have collected and state that you are ready to proceed, but do NOT say the action is done or checked.
+- Do NOT mention results or outcomes (e.g., "I have checked availability", "Booking is confirmed", "No slots available"). Leave that to downstream systems.
+- Your confirmation should be neutral, e.g., "I have all the details for your request to check availability for 4 people on 2026-08-20 at 12:00. I will proceed with checking availability." or "Ready to proceed with your booking request for 4 people on 2026-08-20 at 12:00."
+
+Intents and required fields:
+  check_availability -> VisitDate, PartySize
+  search_availability -> VisitDate (first date), VisitDateEnd (last date), PartySize (smallest party), [Optional: PartySizeMax (largest party), EarliestOnly (true if the user only wants the earliest slot)]
+  create_booking    -> VisitDate, VisitTime, PartySize, FirstName, Surname, Email, [Optional: SpecialRequests, Mobile]
+  get_booking       -> BookingRef
+  update_booking    -> BookingRef and at least one of: VisitDate, VisitTime, PartySize, SpecialRequests
+  cancel_booking    -> BookingRef, CancellationReasonId
+  greeting, unknown
+
+CancellationReasonId:
+""" + "".join(f"  {rid}: {name}\n" for rid, name in CANCELLATION_REASONS.items()) + """
+Each user message gives today's date, the current state (JSON) and the most recent turns of the conversation.
+
+Your task:
+1) Infer or confirm the intent (if missing).
+2) Merge new information from the latest user message into the state.
+3) Normalize dates/times/party size as per rules.
+4) Decide whether status is 'collecting' or 'ready'.
+5) Produce the assistant's next message (either a follow-up question or a neutral confirmation that you are ready to proceed, but NOT that the action is done).
+
+NEVER RESPOND IN A MARKDOWN CODE BLOCK, I.E. ```json ```
+Respond ONLY in valid JSON:
+
+{
+  "updated_state": { ...merged and updated state... },
+  "next_message": "what the assistant should say next"
+}"""
+
+_backend = None
+_reply_cache = None
+
+def get_backend():
+    """
+    Returns the NLU backend selected by config (NLU_BACKEND: autogen, openai or offline),
+    creating it on first use.
+    """
+    global _backend
+    if _backend is None:
+        config = get_config()
+        _backend = create_backend(config.nlu_backend, config.nlu_model, SYSTEM_PROMPT, config.nlu_script)
+    return _backend
+
+def set_backend(backend):
+    """
+    Replaces the NLU backend (None re-creates it from config on next use) and returns the previous one.
+    """
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
+
+def get_reply_cache():
+    """
+    Returns the memo of validated replies (see nlu_cache.py), creating it from config on
+    first use. NLU_CACHE_PATH adds an on-disk tier; NLU_CACHE_TURNS sets how many of the
+    latest turns key it, so "yes" / "that's all" after the same question and state reuse
+    an earlier reply.
+    """
+    global _reply_cache
+    if _reply_cache is None:
+        config = get_config()
+        _reply_cache = NluReplyCache(maxsize=config.nlu_cache_size, ttl=config.nlu_cache_ttl,
+                                     path=config.nlu_cache_path)
+        _reply_cache.enabled = config.nlu_cache
+    return _reply_cache
+
+def set_reply_cache(cache):
+    """
+    Replaces the reply memo (None re-creates it from config on next use) and returns the previous one.
+    """
+    global _reply_cache
+    previous, _reply_cache = _reply_cache, cache
+    return previous
+
+# Token counts for the most recent model call (see prompt_token_report()).
+LAST_PROMPT_STATS = {}
+
+def _compact(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+def build_turn_prompt(conversation_history, current_state, today=None):
+    """
+    Builds the small per-turn message that follows SYSTEM_PROMPT.
+
+    Args:
+        conversation_history (list): The full sequence of role/content messages exchanged so far.
+        current_state (dict): The current known booking details and status.
+        today (date): Today's date (defaults to date.today()).
+
+    Returns:
+        str: The per-turn prompt with today's date, the compact state and the recent turns.
+    """
+    today = today or date.today()
+    return (
+        f"Today's date: {today.isoformat()} ({today.strftime('%A')})\n"
+        f"Current state: {_compact(current_state)}\n"
+        f"Recent turns: {_compact(conversation_history[-RECENT_TURNS:])}"
+    )
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model("gpt-4o")
+    except Exception:
+        return None
+
+@lru_cache(maxsize=8)
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with tiktoken when available, otherwise estimates ~4 characters per token.
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+def prompt_token_report():
+    """
+    Returns token counts for the most recent model call: the cacheable system prefix,
+    the per-turn suffix, and the share of the prompt that the prefix cache can serve.
+    """
+    return dict(LAST_PROMPT_STATS)
+
+def reply_cache_stats():
+    """
+    Returns hit ratio, size and model latency saved (seconds) for the reply memo.
+    """
+    return get_reply_cache().stats()
+
+def repair_stats():
+    """
+    Returns how often model replies failed to parse or validate, and how often the local
+    repair pass or a re-ask recovered them.
+    """
+    return nlu_schema.repair_stats()
+
+def reask_prompt(errors):
+    """
+    Builds the follow-up message sent when a reply fails validation.
+
+    Args:
+        errors (list): Problems found by nlu_schema.check_reply.
+
+    Returns:
+        str: An instruction to resend the whole reply as valid JSON.
+    """
+    return (
+        "Your previous reply was not valid: " + "; ".join(errors[:8]) + ".\n"
+        "Respond again with ONLY the JSON object containing every state field, no code fences or other text."
+    )
+
+def update_state_with_llm(conversation_history, current_state, on_text=None):
     """
     Updates the structured booking state by merging new details from the latest
-    user message using a language model.
+    user message using the configured NLU backend (see nlu_backends.py).
 
     Args:
         conversation_history (list): The full sequence of role/content messages exchanged so far.
         current_state (dict): The current known booking details and status.
+        on_text (callable): If given, the reply is streamed and next_message text is passed
+                            to on_text as it arrives (never when the new status is "ready").
 
     Returns:
         dict: A JSON object with:
               - "updated_state": the merged booking state after interpreting the latest input
               - "next_message": what the assistant should say next (question or confirmation)
+
+    Unambiguous turns are answered by the deterministic extractor without calling the model,
+    and repeats of an earlier (state, recent turns, date) input are served from reply_cache.
     """
+    with metrics.span("nlu") as span:
+        reply = _update_state(conversation_history, current_state, on_text, span)
+        span.tag(intent=(reply.get("updated_state") or {}).get("intent") or "none")
+        return reply
 
-    today = date.today().isoformat()
-
-    prompt = f"""
-    You manage restaurant bookings and maintain a JSON state across turns.
-
-    Today's date: {today}
-    Day of the week: {date.today().strftime('%A')}
-
-    STRICT RULES:
-    - ALWAYS preserve previously-known fields unless the user explicitly changes them.
-    - If the user provides a relative date (e.g., "tomorrow", "next Friday"), convert it to an absolute YYYY-MM-DD using today's date.
-    - If the user provides time in 12-hour format (e.g., "2pm"), convert it to 24-hour HH:MM:SS.
-    - Convert party size words or phrases ("four", "for 4") to an integer (4).
-    - Only ask for fields that are still missing. Do NOT re-ask for fields already present.
-    - If all required fields for the current intent are present, set "status": "ready" and write a short confirmation in "next_message".
-    - If something is missing, set "status": "collecting" and ask ONE concise, helpful question in "next_message".
-    - For Cancellation flows: when the user provides a cancellation reason, it must be mapped to the appropriate CancellationReasonId. Only inquiries about the reason for cancelling not for CancellationReasonId specifically.
-    - For UPDATE flows: when the user requests a change (e.g., "move to the next day", "change time to 8pm", "make it 6 people"), OVERWRITE the corresponding existing fieldwith the normalized value.
-    - For UPDATE flows: do not prompt for information unless the user requests a change. After a change, confirm if they want to update anything else (e.g., "Would you like to change anything else?"). If the user says "no" or "that's all" or similar after a change, mark status as 'ready' and proceed with the update, even if no new fields are provided.
-
-    IMPORTANT CLARIFICATION:
-    - Do NOT prompt for optional fields.
-    - Do NOT confirm or imply that an action (like checking availability or making a booking) has been completed.
-    - Your job is ONLY to collect and normalize information, update the state, and ask for missing details.
-    - If all required fields are present, set "status": "ready" and in "next_message" simply confirm the details you have collected and state that you are ready to proceed, but do NOT say the action is done or checked.
-    - Do NOT mention results or outcomes (e.g., "I have checked availability", "Booking is confirmed", "No slots available"). Leave that to downstream systems.
-    - Your confirmation should be neutral, e.g., "I have all the details for your request to check availability for 4 people on 2026-08-20 at 12:00. I will proceed with checking availability." or "Ready to proceed with your booking request for 4 people on 2026-08-20 at 12:00."
-
-
-    Intents and required fields:
-      check_availability -> VisitDate, PartySize
-      create_booking    -> VisitDate, VisitTime, PartySize, FirstName, Surname, Email, [Optional: SpecialRequests, Mobile]
-      get_booking       -> BookingRef
-      update_booking    -> BookingRef and at least one of: VisitDate, VisitTime, PartySize, SpecialRequests
-      cancel_booking    -> BookingRef, CancellationReasonId
-      greeting, unknown
-
-    CancellationReasonId:
-      1: Customer Request
-      2: Restaurant Closure
-      3: Weather
-      4: Emergency
-      5: No Show
-
-    Conversation so far (array of {{role, content}}):
-    {json.dumps(conversation_history, indent=2)}
-
-    Current state (JSON):
-    {json.dumps(current_state, indent=2)}
-
-    Your task:
-    1) Infer or confirm the intent (if missing).
-    2) Merge new information from the latest user message into the state.
-    3) Normalize dates/times/party size as per rules.
-    4) Decide whether status is 'collecting' or 'ready'.
-    5) Produce the assistant's next message (either a follow-up question or a neutral confirmation that you are ready to proceed, but NOT that the action is done).
-
-    NEVER RESPOND IN A MARKDOWN CODE BLOCK, I.E. ```json ```
-    Respond ONLY in valid JSON:
-
-    {{
-      "updated_state": {{ ...merged and updated state... }},
-      "next_message": "what the assistant should say next"
-    }}
-    """
-
-    raw = nlu_agent.generate_reply(messages=[{"role": "user", "content": prompt}])
-    try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
+def _update_state(conversation_history, current_state, on_text, span):
+    # Body of update_state_with_llm; tags span with where the reply came from
+    config = get_config()
+    if config.nlu_fast_path:
+        fast = extractor.fast_path(conversation_history, current_state)
+        if fast is not None:
+            span.tag(source="fast_path")
+            return fast
+
+    today = date.today()
+    backend = get_backend()
+    span.tag(backend=backend.name)
+    reply_cache = get_reply_cache()
+    key = reply_key(conversation_history, current_state, today.isoformat(), f"{PROMPT_VERSION}:{backend.name}",
+                    config.nlu_cache_turns)
+    cached = reply_cache.get(key)
+    if cached is not None:
+        span.tag(source="cache")
+        return cached
+
+    prompt = build_turn_prompt(conversation_history, current_state, today=today)
+
+    prefix_tokens = count_tokens(SYSTEM_PROMPT)
+    suffix_tokens = count_tokens(prompt)
+    LAST_PROMPT_STATS.update({
+        "prompt_version": PROMPT_VERSION,
+        "prefix_tokens": prefix_tokens,
+        "suffix_tokens": suffix_tokens,
+        "total_tokens": prefix_tokens + suffix_tokens,
+        "cacheable_ratio": prefix_tokens / (prefix_tokens + suffix_tokens),
+    })
+
+    request = NluRequest(messages=[{"role": "user", "content": prompt}], history=conversation_history,
+                         state=current_state, today=today)
+    started = time.perf_counter()
+    if on_text is None:
+        raw = backend.complete(request)
+    else:
+        stream = ReplyStreamParser(on_text)
+        for chunk in backend.stream(request):
+            stream.feed(chunk)
+        raw = stream.text()
+    latency = time.perf_counter() - started
+    reply, errors = nlu_schema.check_reply(raw, current_state)
+    for _ in range(config.nlu_max_reasks):
+        if reply is not None:
+            break
+        # Last resort: show the model its reply and what was wrong with it
+        nlu_schema.STATS["reasks"] += 1
+        request.messages = request.messages + [
+            {"role": "assistant", "content": str(raw)}, {"role": "user", "content": reask_prompt(errors)}
+        ]
+        started = time.perf_counter()
+        raw = backend.complete(request)
+        latency += time.perf_counter() - started
+        reply, errors = nlu_schema.check_reply(raw, current_state)
+        if reply is not None:
+            nlu_schema.STATS["reask_fixed"] += 1
+
+    if reply is None:
+        span.tag(source="fallback")
+        nlu_schema.STATS["unrecovered"] += 1
         print(raw)
         return {
             "updated_state": current_state,
             "next_message": "Sorry, I couldn’t parse that. Could you rephrase?"
-            
         }
+
+    span.tag(source="model")
+    reply_cache.set(key, reply, latency)
+    return reply
@@ -0,0 +1,111 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+import tools
+from config import get_config
+from constants import INTENT_CHECK, INTENT_CREATE
+from venues import current_venue
+
+# Intents whose handler will need an AvailabilitySearch for VisitDate/PartySize.
+PREFETCH_INTENTS = (INTENT_CHECK, INTENT_CREATE)
+
+# One pool per venue, so prefetches stuck on a slow venue's API don't queue everyone else's
+_executors: Dict[Optional[str], ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    venue = current_venue()
+    executor = _executors.get(venue)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(venue)
+            if executor is None:
+                executor = _executors[venue] = ThreadPoolExecutor(
+                    max_workers=get_config().prefetch_workers, thread_name_prefix="prefetch"
+                )
+    return executor
+
+def _key(visit_date, party_size) -> Tuple[str, str]:
+    return (str(visit_date).strip(), str(party_size).strip())
+
+def _timed(call, *args) -> Tuple[dict, float]:
+    return call(*args), time.monotonic()
+
+class AvailabilityPrefetch:
+    """
+    Speculative AvailabilitySearch for the (VisitDate, PartySize) currently in a session's state.
+
+    The call starts in the background as soon as both fields are known, so the handler
+    that later needs it can use the in-flight or completed result instead of waiting
+    for a fresh call. A change to either field discards the old call, a handler using
+    the result discards it too, and a result older than AVAILABILITY_CACHE_TTL is ignored.
+    """
+
+    def __init__(self) -> None:
+        self.key: Optional[Tuple[str, str]] = None
+        self.future: Optional[Future] = None
+
+    def update(self, state: Dict) -> None:
+        """
+        Start, keep or discard the prefetch to match the given state.
+        """
+        visit_date, party_size = state.get("VisitDate"), state.get("PartySize")
+        if state.get("intent") not in PREFETCH_INTENTS or not visit_date or not party_size:
+            self.discard()
+            return
+
+        key = _key(visit_date, party_size)
+        if key == self.key:
+            return
+        self.discard()
+        self.key = key
+        # Run in a copy of this context so the call goes to the conversation's venue
+        self.future = _get_executor().submit(contextvars.copy_context().run, _timed, tools.check_availability,
+                                             visit_date, party_size)
+
+    def discard(self) -> None:
+        if self.future is not None:
+            # Not-yet-started calls are dropped; a running one finishes but its result is ignored.
+            self.future.cancel()
+        self.key = None
+        self.future = None
+
+    def result_for(self, visit_date, party_size, timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        Returns the prefetched response for this date and party size, waiting for it if
+        still in flight, and discards it so it is used at most once. Returns None if
+        nothing matching was prefetched, the call failed or its answer is older than
+        AVAILABILITY_CACHE_TTL.
+        """
+        if self.future is None or self.key != _key(visit_date, party_size):
+            return None
+        future = self.future
+        self.key = None
+        self.future = None
+        try:
+            resp, completed = future.result(timeout=timeout)
+        except Exception:
+            return None
+        if time.monotonic() - completed > get_config().availability_cache_ttl:
+            return None
+        # A failed prefetch is retried live by the caller rather than shown to the guest
+        return resp if tools.is_success(resp) else None
+
+def prefetch_availability(ctx) -> None:
+    """
+    Start or refresh the speculative availability search for a conversation.
+    """
+    if ctx.prefetch is None:
+        ctx.prefetch = AvailabilityPrefetch()
+    ctx.prefetch.update(ctx.data.to_dict())
+
+def prefetched_availability(ctx, visit_date, party_size) -> Optional[dict]:
+    """
+    Returns the conversation's prefetched availability for this date and party size, if any.
+    """
+    if ctx.prefetch is None:
+        return None
+    return ctx.prefetch.result_for(visit_date, party_size, timeout=sum(tools.DEFAULT_TIMEOUTS["availability"]))
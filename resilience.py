@@ -0,0 +1,174 @@
+"""
+Retry, hedging, circuit-breaker and rate-limit policy for the booking API clients.
+
+Only idempotent reads (availability searches and booking lookups) are retried or
+hedged; writes are sent once. Every endpoint has its own breaker, which opens after
+consecutive transient failures so calls fail fast instead of queueing behind a dead API.
+"""
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+import metrics
+from config import get_config
+
+# Endpoints (keys of tools.DEFAULT_TIMEOUTS) that are safe to send more than once
+IDEMPOTENT_ENDPOINTS = frozenset({"availability", "get"})
+
+# Values of the api_circuit_state gauge
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+def is_transient(resp) -> bool:
+    """
+    True for failures worth retrying: timeouts, connection errors and 5xx responses.
+    4xx errors are the API's answer and are returned as they are.
+    """
+    if not isinstance(resp, dict) or "error" not in resp:
+        return False
+    status = resp.get("status_code")
+    return status is None or status >= 500
+
+def backoff_delay(attempt: int, base: float, cap: float, rand: Callable[[], float] = random.random) -> float:
+    """
+    "Full jitter" exponential backoff: a uniform delay up to min(cap, base * 2**attempt).
+    """
+    return rand() * min(cap, base * (2 ** attempt))
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one endpoint.
+
+    Closed: calls go through. After failure_threshold transient failures in a row it
+    opens and rejects calls for reset_timeout seconds, then lets a single probe through
+    (half-open): success closes it, failure opens it again. A threshold of 0 disables it.
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = "closed"
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._state == "open" and self.clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        Whether a call may go out now. In the half-open state only the first caller gets through.
+        """
+        if not self.failure_threshold:
+            return True
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                self._set_state("half_open")
+                return True
+            return False
+
+    def record(self, success: bool) -> None:
+        if not self.failure_threshold:
+            return
+        with self._lock:
+            self._probing = False
+            if success:
+                self.failures = 0
+                if self._state != "closed":
+                    self._set_state("closed")
+                return
+            self.failures += 1
+            if self._state == "half_open" or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                if self._state != "open":
+                    metrics.inc("api_circuit_opened_total", endpoint=self.endpoint)
+                self._set_state("open")
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        metrics.set_gauge("api_circuit_state", CIRCUIT_STATES[state], endpoint=self.endpoint)
+
+@dataclass
+class ResiliencePolicy:
+    """
+    Per-client retry/hedge settings and the client's breakers (one per endpoint, created on use).
+    """
+    retries: int = 2
+    retry_backoff: float = 0.1
+    retry_max_backoff: float = 2.0
+    hedge_delay: float = 0.0
+    breaker_threshold: int = 5
+    breaker_reset: float = 30.0
+    breakers: Dict[str, CircuitBreaker] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_config(cls) -> "ResiliencePolicy":
+        config = get_config()
+        return cls(retries=config.api_retries, retry_backoff=config.api_retry_backoff,
+                   retry_max_backoff=config.api_retry_max_backoff, hedge_delay=config.api_hedge_delay,
+                   breaker_threshold=config.api_breaker_threshold, breaker_reset=config.api_breaker_reset)
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers.setdefault(
+                endpoint, CircuitBreaker(endpoint, self.breaker_threshold, self.breaker_reset)
+            )
+        return breaker
+
+    def attempts(self, endpoint: str) -> int:
+        return 1 + self.retries if endpoint in IDEMPOTENT_ENDPOINTS else 1
+
+    def hedged(self, endpoint: str) -> bool:
+        return self.hedge_delay > 0 and endpoint in IDEMPOTENT_ENDPOINTS
+
+    def delay(self, attempt: int) -> float:
+        return backoff_delay(attempt, self.retry_backoff, self.retry_max_backoff)
+
+    def breaker_states(self) -> Dict[str, str]:
+        """
+        Current breaker state per endpoint used so far, e.g. {"availability": "closed"}.
+        """
+        return {endpoint: b.state for endpoint, b in self.breakers.items()}
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate` calls per second on average and bursts of up to `burst`.
+    reserve() takes a token and returns how long the caller must wait before using it,
+    so blocking and asyncio callers share the same limiter.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+def circuit_open_error(endpoint: str) -> Dict:
+    """
+    Error dict (same shape as tools.handle_request_error) for a call rejected by an open breaker.
+    """
+    return {"error": "Service Unavailable: The booking service is failing, please try again shortly",
+            "details": f"Circuit open for {endpoint} requests", "status_code": None}
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import metrics
+import async_tools
+import parser
+import tools
+from state import ConversationContext
+from store import SessionStore
+from async_handlers import ASYNC_INTENT_ROUTER
+from venues import get_registry, use_venue
+from main import UNKNOWN_ACTION_MESSAGE, apply_nlu_reply, apply_handler_result, handler_outcome
+
+MAX_BODY_BYTES = 64 * 1024
+READ_TIMEOUT = 60.0
+
+HTTP_REASONS = {
+    200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+    405: "Method Not Allowed", 413: "Payload Too Large", 429: "Too Many Requests", 503: "Service Unavailable",
+}
+
+class ServerBusy(Exception):
+    """
+    Raised when a message is rejected for backpressure. Carries the HTTP status to return.
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class Session:
+    """
+    One guest conversation: its context, a lock that keeps its messages in order,
+    and bookkeeping for backpressure and idle eviction.
+    """
+
+    __slots__ = ("ctx", "lock", "last_seen", "pending")
+
+    def __init__(self, ctx: Optional[ConversationContext] = None) -> None:
+        self.ctx = ctx or ConversationContext()
+        self.lock = asyncio.Lock()
+        self.last_seen = time.monotonic()
+        self.pending = 0
+
+class SessionManager:
+    """
+    Table of session id -> Session with a size cap and idle-session eviction.
+    With a SessionStore, sessions not in memory (new, or evicted earlier) are loaded from it.
+    """
+
+    def __init__(self, max_sessions: int = 10000, idle_timeout: float = 1800.0, store: Optional[SessionStore] = None):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.store = store
+        self.sessions: Dict[str, Session] = {}
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def get(self, session_id: str) -> Optional[Session]:
+        return self.sessions.get(session_id)
+
+    def get_or_create(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            if len(self.sessions) >= self.max_sessions and not self.evict_idle():
+                raise ServerBusy(503, "Too many active sessions")
+            ctx = self.store.load_or_create(session_id) if self.store else ConversationContext(session_id=session_id)
+            session = self.sessions[session_id] = Session(ctx)
+        return session
+
+    def drop(self, session_id: str) -> bool:
+        dropped = self.sessions.pop(session_id, None) is not None
+        deleted_from_store = self.store.delete(session_id) if self.store else False
+        return dropped or deleted_from_store
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """
+        Remove sessions with no pending messages that have been idle longer than idle_timeout.
+        Returns how many were evicted.
+        """
+        now = time.monotonic() if now is None else now
+        idle = [
+            sid for sid, s in self.sessions.items()
+            if s.pending == 0 and now - s.last_seen > self.idle_timeout
+        ]
+        for sid in idle:
+            del self.sessions[sid]
+        return len(idle)
+
+class ConversationServer:
+    """
+    Serves many concurrent conversations from one asyncio event loop.
+
+    Each message runs through the same parser -> ASYNC_INTENT_ROUTER -> transform pipeline
+    as main.run_chat. Messages within a session are processed in arrival order; different
+    sessions run concurrently. Blocking parser calls run on a bounded thread pool.
+    """
+
+    def __init__(self, sessions: Optional[SessionManager] = None, max_pending: int = 1000,
+                 max_pending_per_session: int = 8, nlu_workers: int = 32, eviction_interval: float = 60.0):
+        self.sessions = sessions or SessionManager()
+        self.max_pending = max_pending
+        self.max_pending_per_session = max_pending_per_session
+        self.eviction_interval = eviction_interval
+        self.pending = 0
+        self._nlu_pool = ThreadPoolExecutor(max_workers=nlu_workers, thread_name_prefix="nlu")
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._evictor: Optional[asyncio.Task] = None
+
+    async def handle_message(self, session_id: str, text: str) -> List[str]:
+        """
+        Process one user message for a session and return the agent replies.
+        Raises ServerBusy when the server or the session has too much queued work.
+        """
+        if self.pending >= self.max_pending:
+            raise ServerBusy(503, "Server is busy, please retry")
+        session = self.sessions.get_or_create(session_id)
+        if session.pending >= self.max_pending_per_session:
+            raise ServerBusy(429, "Too many messages queued for this session")
+
+        self.pending += 1
+        session.pending += 1
+        try:
+            async with session.lock:
+                with use_venue(session.ctx.restaurant):
+                    replies = await self._run_turn(session.ctx, text)
+                if self.sessions.store:
+                    await asyncio.get_running_loop().run_in_executor(
+                        self._nlu_pool, self.sessions.store.save_turn, session.ctx
+                    )
+                return replies
+        finally:
+            self.pending -= 1
+            session.pending -= 1
+            session.last_seen = time.monotonic()
+
+    async def _run_turn(self, ctx: ConversationContext, user_input: str) -> List[str]:
+        ctx.history.append({"role": "user", "content": user_input})
+
+        loop = asyncio.get_running_loop()
+        llm_json: Dict = await loop.run_in_executor(
+            self._nlu_pool, parser.update_state_with_llm, ctx.history, ctx.data.to_dict()
+        ) or {}
+        replies = []
+        next_message = apply_nlu_reply(ctx, llm_json)
+        if next_message:
+            replies.append(next_message)
+
+        if ctx.data.get("status") == "ready":
+            handler = ASYNC_INTENT_ROUTER.get(ctx.data.get("intent"))
+            if not handler:
+                ctx.reset()
+                replies.append(UNKNOWN_ACTION_MESSAGE)
+                return replies
+
+            with metrics.span("handler", intent=ctx.data.get("intent")) as span:
+                result = await handler(ctx)
+                span.tag(outcome=handler_outcome(result))
+            replies.append(apply_handler_result(ctx, result))
+
+        return replies
+
+    async def _evict_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.eviction_interval)
+            self.sessions.evict_idle()
+
+    async def _route(self, method: str, path: str, body: bytes):
+        parts = [p for p in path.split("?", 1)[0].split("/") if p]
+
+        if parts == ["health"] and method == "GET":
+            return 200, {"sessions": len(self.sessions), "pending": self.pending}
+
+        if parts == ["metrics"] and method == "GET":
+            registry = metrics.get_metrics()
+            if "format=jsonl" in path:
+                return 200, registry.to_jsonl()
+            return 200, registry.to_prometheus()
+
+        if parts == ["sessions"] and method == "POST":
+            try:
+                restaurant = json.loads(body or b"{}").get("restaurant")
+            except (ValueError, AttributeError):
+                return 400, {"error": "Body must be JSON with an optional 'restaurant' string"}
+            try:
+                venue = get_registry().get(restaurant)
+            except ValueError as exc:
+                return 400, {"error": str(exc)}
+            session_id = uuid.uuid4().hex
+            session = self.sessions.get_or_create(session_id)
+            session.ctx.restaurant = None if restaurant is None else venue.name
+            return 201, {"session_id": session_id, "restaurant": venue.name}
+
+        if len(parts) == 2 and parts[0] == "sessions" and method == "DELETE":
+            if not self.sessions.drop(parts[1]):
+                return 404, {"error": "Unknown session"}
+            return 204, None
+
+        if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "messages":
+            if method != "POST":
+                return 405, {"error": "Use POST"}
+            try:
+                message = json.loads(body or b"{}").get("message")
+            except (ValueError, AttributeError):
+                message = None
+            if not isinstance(message, str) or not message.strip():
+                return 400, {"error": "Body must be JSON with a non-empty 'message' string"}
+            replies = await self.handle_message(parts[1], message)
+            return 200, {"session_id": parts[1], "replies": replies}
+
+        return 404, {"error": "Not found"}
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Malformed request line"}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "Request body too large"}, keep_alive=False)
+                    break
+                body = await asyncio.wait_for(reader.readexactly(length), READ_TIMEOUT) if length else b""
+
+                try:
+                    status, payload = await self._route(method.upper(), path, body)
+                except ServerBusy as exc:
+                    status, payload = exc.status, {"error": str(exc)}
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._respond(writer, status, payload, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool = True) -> None:
+        # Text payloads (the /metrics exports) go out as-is, everything else as JSON
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = b"" if payload is None else json.dumps(payload).encode("utf-8"), "application/json"
+        head = [
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if body:
+            head.append(f"Content-Type: {content_type}")
+        if status in (429, 503):
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.AbstractServer:
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        self._evictor = asyncio.create_task(self._evict_forever())
+        return self._server
+
+    async def close(self) -> None:
+        if self._evictor:
+            self._evictor.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        self._nlu_pool.shutdown(wait=False)
+
+def run_server(host: str = "127.0.0.1", port: int = 8080, store_path: Optional[str] = None) -> None:
+    """
+    Run the conversation server until interrupted, persisting sessions to store_path if given.
+    """
+
+    async def _main() -> None:
+        store = SessionStore(store_path) if store_path else None
+        server = ConversationServer(sessions=SessionManager(store=store))
+        listener = await server.start(host, port)
+        sync = tools.start_availability_sync()
+        print(f"Booking assistant server listening on http://{host}:{port}")
+        try:
+            await listener.serve_forever()
+        finally:
+            if sync is not None:
+                sync.stop()
+            await server.close()
+            await async_tools.close_clients()
+
+    asyncio.run(_main())
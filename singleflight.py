@@ -0,0 +1,122 @@
+"""
+Request coalescing ("single flight") for identical concurrent reads.
+
+The first caller for a key runs the call; callers arriving while it is in flight wait
+for it and receive the same result, or the same exception. Nothing is kept once the
+call finishes - caching finished results is TTLCache's job.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+import metrics
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class _Stats:
+    def _init_stats(self, name: str, enabled: bool) -> None:
+        self.name = name
+        self.enabled = enabled
+        self.calls = 0
+        self.coalesced = 0
+
+    def _joined(self) -> None:
+        self.coalesced += 1
+        metrics.inc("api_coalesced_total", endpoint=self.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls),
+            "coalesced_ratio": self.coalesced / self.calls if self.calls else 0.0,
+        }
+
+    def forget(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        Stop handing the in-flight calls whose key matches predicate to new callers (e.g.
+        after a write made their answer stale). Callers already waiting still get it.
+        """
+        stale = [k for k in list(self._calls) if predicate(k)]
+        for key in stale:
+            self._calls.pop(key, None)
+        return len(stale)
+
+class SingleFlight(_Stats):
+    """
+    Thread-safe single flight for blocking callers. enabled=False runs every call.
+    """
+
+    def __init__(self, name: str = "", enabled: bool = True):
+        self._init_stats(name, enabled)
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return fn()
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._joined()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def forget(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            return super().forget(predicate)
+
+class AsyncSingleFlight(_Stats):
+    """
+    Single flight for coroutines on one event loop. The call runs as its own task, so a
+    caller that is cancelled (e.g. by a handler timeout) only stops waiting; the call
+    still finishes for everyone else.
+    """
+
+    def __init__(self, name: str = "", enabled: bool = True):
+        self._init_stats(name, enabled)
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await fn()
+        self.calls += 1
+        task = self._calls.get(key)
+        if task is not None:
+            self._joined()
+        else:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieve it so a call every caller gave up on doesn't log "exception never retrieved"
+            task.exception()
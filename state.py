@@ -1,36 +1,215 @@
+import re
 from dataclasses import dataclass, field
-from typing import Dict, Optional
+from datetime import date, time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# Every slot the conversation tracks, in the order the parser sees them.
+STATE_FIELDS: Tuple[str, ...] = (
+    "intent",
+    "VisitDate",
+    "VisitDateEnd",
+    "VisitTime",
+    "PartySize",
+    "PartySizeMax",
+    "EarliestOnly",
+    "FirstName",
+    "Surname",
+    "Email",
+    "Mobile",
+    "BookingRef",
+    "LastBookingRef",
+    "CancellationReasonId",
+    "SpecialRequests",
+    "status",
+)
+
+DATE_FIELDS = ("VisitDate", "VisitDateEnd")
+INT_FIELDS = ("PartySize", "PartySizeMax", "CancellationReasonId")
+
+def _normalize(key: str, value: Any) -> Any:
+    """
+    Coerce a raw value (usually from the parser's JSON) into the field's native type.
+    Values that don't parse are kept as stripped strings so handlers can report them.
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if value == "":
+            return None
+    if value is None:
+        return None
+
+    if key in DATE_FIELDS:
+        if isinstance(value, date):
+            return value
+        if re.match(r"^\d{4}-\d{2}-\d{2}$", str(value)):
+            try:
+                return date.fromisoformat(value)
+            except ValueError:
+                pass
+        return str(value)
+
+    if key == "VisitTime":
+        if isinstance(value, time):
+            return value
+        if re.match(r"^\d{2}:\d{2}(:\d{2})?$", str(value)):
+            try:
+                return time.fromisoformat(value)
+            except ValueError:
+                pass
+        return str(value)
+
+    if key in INT_FIELDS:
+        if isinstance(value, bool):
+            return str(value)
+        if isinstance(value, int):
+            return value
+        try:
+            return int(str(value))
+        except ValueError:
+            return str(value)
+
+    if key == "EarliestOnly":
+        if isinstance(value, str):
+            return value.lower() in ("true", "yes", "1")
+        return bool(value)
+
+    return value if isinstance(value, str) else str(value)
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, time):
+        return value.strftime("%H:%M:%S")
+    return value
+
+class BookingState:
+    """
+    Typed, slotted booking state for one conversation.
+
+    Dates are stored as date objects, times as time objects, and party sizes and the
+    cancellation reason as ints, so handlers don't re-parse them on every call. It
+    still supports the dict-style access (state["VisitDate"], .get, .update, .items)
+    the rest of the code uses. to_dict()/from_dict() convert to and from the JSON shape
+    exchanged with the parser.
+    """
+
+    __slots__ = STATE_FIELDS
+
+    def __init__(self, **values: Any) -> None:
+        for key in STATE_FIELDS:
+            object.__setattr__(self, key, None)
+        self.status = "collecting"
+        self.update(values)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        object.__setattr__(self, key, _normalize(key, value))
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in STATE_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in STATE_FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key: object) -> bool:
+        return key in STATE_FIELDS
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(STATE_FIELDS)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, BookingState):
+            return all(getattr(self, k) == getattr(other, k) for k in STATE_FIELDS)
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"BookingState({self.to_dict()!r})"
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in STATE_FIELDS:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def keys(self) -> Tuple[str, ...]:
+        return STATE_FIELDS
+
+    def items(self):
+        return [(k, getattr(self, k)) for k in STATE_FIELDS]
+
+    def update(self, values: Optional[Dict[str, Any]] = None, **kwargs: Any) -> None:
+        for source in (values or {}, kwargs):
+            for key, value in source.items():
+                self[key] = value
+
+    def copy(self) -> "BookingState":
+        clone = BookingState()
+        for key in STATE_FIELDS:
+            object.__setattr__(clone, key, getattr(self, key))
+        return clone
+
+    def as_json(self, key: str) -> Any:
+        """
+        The JSON/API form of one field (dates as YYYY-MM-DD, times as HH:MM:SS).
+        """
+        return _to_json(self[key])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: _to_json(getattr(self, k)) for k in STATE_FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "BookingState":
+        """
+        Build a state from the parser's JSON shape. Unknown keys are ignored.
+        """
+        if isinstance(data, BookingState):
+            return data.copy()
+        state = cls()
+        for key, value in (data or {}).items():
+            if key in STATE_FIELDS:
+                state[key] = value
+        if state.status is None:
+            state.status = "collecting"
+        return state
 
 def initial_state() -> Dict[str, Optional[str]]:
     """
-    Creates the initial conversation state for the booking assistant.
-    """
-    return {
-        "intent": None,
-        "VisitDate": None,
-        "VisitTime": None,
-        "PartySize": None,
-        "FirstName": None,
-        "Surname": None,
-        "Email": None,
-        "BookingRef": None,
-        "LastBookingRef": None,
-        "CancellationReasonId": None,
-        "SpecialRequests": None,
-        "status": "collecting",
-    }
+    Creates the initial conversation state for the booking assistant, in the JSON shape
+    exchanged with the parser.
+    """
+    return BookingState().to_dict()
 
 @dataclass
 class ConversationContext:
     """
     Maintains the conversation state and message history between the user and the assistant.
     """
-    data: Dict[str, Optional[str]] = field(default_factory=initial_state)
+    data: BookingState = field(default_factory=BookingState)
     history: list = field(default_factory=list)
+    # Identifies the conversation in a persistent store (see store.SessionStore).
+    session_id: Optional[str] = None
+    # Venue the guest is booking with (see venues.py); None for the default restaurant.
+    restaurant: Optional[str] = None
+    # Bumped on every reset so a store can tell a cleared history from a grown one.
+    epoch: int = 0
+    # Speculative availability search (prefetch.AvailabilityPrefetch), if one was started.
+    prefetch: Optional[Any] = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.data, BookingState):
+            self.data = BookingState.from_dict(self.data)
 
     def reset(self) -> None:
-        self.data = initial_state()
+        self.data = BookingState()
         self.history.clear()
+        self.epoch += 1
 
     def soft_reset(self, preserve_keys: list) -> None:
         preserved = {k: v for k, v in self.data.items() if k in preserve_keys}
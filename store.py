@@ -0,0 +1,129 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from state import ConversationContext
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id  TEXT PRIMARY KEY,
+    restaurant  TEXT,
+    data        TEXT NOT NULL,
+    epoch       INTEGER NOT NULL,
+    history_len INTEGER NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    session_id TEXT NOT NULL,
+    epoch      INTEGER NOT NULL,
+    seq        INTEGER NOT NULL,
+    role       TEXT NOT NULL,
+    content    TEXT NOT NULL,
+    PRIMARY KEY (session_id, epoch, seq)
+) WITHOUT ROWID;
+"""
+
+class SessionStore:
+    """
+    Durable SQLite store for ConversationContext data and history.
+
+    The database runs in WAL mode. Each turn is saved in one transaction: the state is
+    upserted as a single row, and only the history messages added since the last save
+    are appended. A reset (which bumps ConversationContext.epoch) drops the old epoch's
+    history in that same transaction. Loading a session is a primary-key lookup plus
+    a range scan over its current history.
+    """
+
+    def __init__(self, path: str = "sessions.db"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        if "restaurant" not in columns:
+            # Databases created before sessions carried a venue
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN restaurant TEXT")
+        self._lock = threading.Lock()
+
+    def save_turn(self, ctx: ConversationContext) -> None:
+        """
+        Persist the context's state and any new history messages in one transaction.
+        """
+        if not ctx.session_id:
+            raise ValueError("ConversationContext.session_id must be set to save it")
+
+        with self._lock:
+            cur = self._conn.cursor()
+            cur.execute("BEGIN")
+            try:
+                row = cur.execute(
+                    "SELECT epoch, history_len FROM sessions WHERE session_id = ?", (ctx.session_id,)
+                ).fetchone()
+                saved = 0
+                if row is not None and row[0] == ctx.epoch and row[1] <= len(ctx.history):
+                    saved = row[1]
+                elif row is not None:
+                    cur.execute("DELETE FROM history WHERE session_id = ?", (ctx.session_id,))
+
+                cur.executemany(
+                    "INSERT INTO history (session_id, epoch, seq, role, content) VALUES (?, ?, ?, ?, ?)",
+                    [(ctx.session_id, ctx.epoch, seq, m.get("role", ""), m.get("content", ""))
+                     for seq, m in enumerate(ctx.history[saved:], start=saved)],
+                )
+                cur.execute(
+                    "INSERT INTO sessions (session_id, restaurant, data, epoch, history_len, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(session_id) DO UPDATE SET restaurant = excluded.restaurant, data = excluded.data, "
+                    "epoch = excluded.epoch, history_len = excluded.history_len, updated_at = excluded.updated_at",
+                    (ctx.session_id, ctx.restaurant, json.dumps(ctx.data.to_dict(), separators=(",", ":")), ctx.epoch,
+                     len(ctx.history), time.time()),
+                )
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+
+    def load(self, session_id: str) -> Optional[ConversationContext]:
+        """
+        Returns the stored context for session_id, or None if it has never been saved.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, epoch, restaurant FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            history = [
+                {"role": role, "content": content}
+                for role, content in self._conn.execute(
+                    "SELECT role, content FROM history WHERE session_id = ? AND epoch = ? ORDER BY seq",
+                    (session_id, row[1]),
+                )
+            ]
+        return ConversationContext(data=json.loads(row[0]), history=history, session_id=session_id, epoch=row[1],
+                                   restaurant=row[2])
+
+    def load_or_create(self, session_id: str) -> ConversationContext:
+        return self.load(session_id) or ConversationContext(session_id=session_id)
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Removes a session and its history. Returns whether the session was stored.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+            deleted = self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount
+            self._conn.execute("COMMIT")
+        return deleted > 0
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,137 @@
+import json
+from typing import Callable, Dict, List, Optional
+
+class ReplyStreamParser:
+    """
+    Incremental parser for the state manager's JSON reply as it streams in.
+
+    Feed it chunks of raw model output. It tracks the top-level keys and:
+      - decodes the "next_message" string as its characters arrive, passing the text
+        to on_text;
+      - parses "updated_state" as soon as its closing brace arrives.
+
+    Message text is only passed on once updated_state is known and its status is not
+    "ready"; until then it is held back. If the state turns out to be ready, the message
+    is dropped, just as main.apply_nlu_reply drops it for a complete reply.
+    result() decodes the full text once the stream has ended.
+    """
+
+    def __init__(self, on_text: Callable[[str], None]):
+        self.on_text = on_text
+        self.state: Optional[Dict] = None
+        self.emitted: List[str] = []
+        self._raw: List[str] = []
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape: Optional[str] = None
+        self._surrogate = ""
+        self._token: List[str] = []
+        self._key: Optional[str] = None
+        self._expect_key = False
+        self._capture: Optional[str] = None  # "message" while inside next_message's string
+        self._state_start: Optional[int] = None
+        self._held: List[str] = []
+
+    @property
+    def suppressed(self) -> bool:
+        return self.state is not None and self.state.get("status") == "ready"
+
+    def feed(self, chunk: str) -> None:
+        self._raw.append(chunk)
+        for ch in chunk:
+            self._step(ch)
+            self._pos += 1
+
+    def text(self) -> str:
+        return "".join(self._raw)
+
+    def result(self) -> Dict:
+        """
+        Decode the complete reply. Raises json.JSONDecodeError if it is not valid JSON.
+        """
+        return json.loads(self.text())
+
+    def _emit(self, text: str) -> None:
+        if not text or self.suppressed:
+            return
+        if self.state is None:
+            self._held.append(text)
+            return
+        self.emitted.append(text)
+        self.on_text(text)
+
+    def _state_complete(self, raw: str) -> None:
+        try:
+            state = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        if not isinstance(state, dict):
+            return
+        self.state = state
+        held, self._held = "".join(self._held), []
+        self._emit(held)
+
+    def _step(self, ch: str) -> None:
+        if self._in_string:
+            self._string_char(ch)
+            return
+
+        if ch == '"':
+            self._in_string = True
+            self._token = []
+            # A string at depth 1 is either a key or (right after a colon) a value
+            if self._depth == 1 and not self._expect_key and self._key == "next_message":
+                self._capture = "message"
+            return
+        if ch in "{[":
+            self._depth += 1
+            if self._depth == 1:
+                self._expect_key = True
+            elif self._depth == 2 and self._key == "updated_state" and ch == "{":
+                self._state_start = self._pos
+            return
+        if ch in "}]":
+            if self._depth == 2 and self._state_start is not None:
+                self._state_complete(self.text()[self._state_start:self._pos + 1])
+                self._state_start = None
+            self._depth -= 1
+            return
+        if self._depth == 1:
+            if ch == ":":
+                self._expect_key = False
+            elif ch == ",":
+                self._expect_key = True
+                self._key = None
+
+    def _string_char(self, ch: str) -> None:
+        if self._escape is not None:
+            self._escape += ch
+            if self._escape[1] == "u" and len(self._escape) < 6:
+                return
+            decoded = json.loads('"' + self._escape + '"') if self._escape[1] != "u" else chr(int(self._escape[2:], 16))
+            self._escape = None
+            if 0xD800 <= ord(decoded) <= 0xDBFF:
+                self._surrogate = decoded
+                return
+            if self._surrogate:
+                decoded = (self._surrogate + decoded).encode("utf-16", "surrogatepass").decode("utf-16")
+                self._surrogate = ""
+            self._string_text(decoded)
+            return
+        if ch == "\\":
+            self._escape = ch
+            return
+        if ch == '"':
+            self._in_string = False
+            if self._depth == 1 and self._expect_key:
+                self._key = "".join(self._token)
+            self._capture = None
+            return
+        self._string_text(ch)
+
+    def _string_text(self, text: str) -> None:
+        if self._capture == "message":
+            self._emit(text)
+        elif self._depth == 1 and self._expect_key:
+            self._token.append(text)
@@ -1,6 +1,11 @@
+import os
 import pytest
+import idempotency
 from state import ConversationContext
 
+# The autogen agent (built on first use) needs a key; tests never reach the network.
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -10,6 +15,11 @@ def ctx():
     # Fresh context per test
     return ConversationContext()
 
+@pytest.fixture(autouse=True)
+def fresh_booking_dedupe(monkeypatch):
+    # Bookings confirmed in one test must not be replayed in the next
+    monkeypatch.setattr(idempotency, "_dedupe", None)
+
 @pytest.fixture
 def ok_response():
     class Resp:
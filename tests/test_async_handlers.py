@@ -0,0 +1,90 @@
+import asyncio
+import httpx
+import pytest
+
+import async_handlers
+import async_tools
+
+def test_async_client_maps_responses():
+    def handler(request):
+        if request.url.path.endswith("/Booking/ABC1234"):
+            return httpx.Response(200, json={"booking_reference": "ABC1234"})
+        return httpx.Response(404, json={"detail": "nope"})
+
+    async def run():
+        client = async_tools.AsyncBookingApiClient(base_url="http://api", restaurant="R", token="t",
+                                                   transport=httpx.MockTransport(handler))
+        try:
+            return await client.get_booking("ABC1234"), await client.get_booking("ZZZ0000")
+        finally:
+            await client.aclose()
+
+    found, missing = asyncio.run(run())
+    assert found == {"booking_reference": "ABC1234"}
+    assert "Not Found" in missing["error"] and missing["status_code"] == 404
+
+def test_async_client_maps_timeouts():
+    def handler(request):
+        raise httpx.ReadTimeout("slow", request=request)
+
+    async def run():
+        client = async_tools.AsyncBookingApiClient(base_url="http://api", restaurant="R", token="t",
+                                                   transport=httpx.MockTransport(handler))
+        try:
+            return await client.check_availability("2025-08-11", 2)
+        finally:
+            await client.aclose()
+
+    res = asyncio.run(run())
+    assert "Timeout" in res["error"] and res["status_code"] is None
+
+def test_async_check_availability_success(monkeypatch, ctx):
+    async def fake_api(date, size, channel_code="ONLINE"):
+        return {
+            "visit_date": date,
+            "party_size": size,
+            "available_slots": [{"time": "12:00:00", "available": True}, {"time": "13:00:00", "available": False}],
+        }
+    monkeypatch.setattr("async_handlers.async_tools.check_availability", fake_api)
+    ctx.data.update({"VisitDate": "2025-08-11", "PartySize": 2})
+    ack, body, _ = asyncio.run(async_handlers.handle_check_availability(ctx))
+    assert "available at: 12:00:00" in body
+    assert "fully booked: 13:00:00" in body
+
+def test_async_handler_timeout_returns_api_error(monkeypatch, ctx):
+    async def slow_get(ref):
+        await asyncio.sleep(1)
+    monkeypatch.setattr("async_handlers.async_tools.get_booking", slow_get)
+    ctx.data.update({"BookingRef": "ABC1234", "intent": "get_booking"})
+    ack, body, transform = asyncio.run(async_handlers.handle_get_booking(ctx, timeout=0.01))
+    assert ack == "API Error"
+    assert "Timeout" in body
+    transform(ctx)
+    assert ctx.data["intent"] is None
+
+def test_async_handler_can_be_cancelled(monkeypatch, ctx):
+    async def slow_cancel(ref, reason_id):
+        await asyncio.sleep(1)
+    monkeypatch.setattr("async_handlers.async_tools.cancel_booking", slow_cancel)
+    ctx.data.update({"BookingRef": "ABC1234", "CancellationReasonId": 1})
+
+    async def run():
+        task = asyncio.create_task(async_handlers.handle_cancel_booking(ctx))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await task
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run())
+
+def test_async_create_booking_validates_before_calling_api(monkeypatch, ctx):
+    async def fail_create(data):
+        raise AssertionError("should not be called")
+    monkeypatch.setattr("async_handlers.async_tools.create_booking", fail_create)
+    ctx.data.update({"VisitDate": "2025-08-11"})
+    ack, _, _ = asyncio.run(async_handlers.handle_create_booking(ctx))
+    assert ack == "Missing fields"
+
+def test_async_router_covers_every_intent():
+    import handlers
+    assert set(async_handlers.ASYNC_INTENT_ROUTER) == set(handlers.INTENT_ROUTER)
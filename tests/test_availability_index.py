@@ -0,0 +1,99 @@
+import dataclasses
+import time
+from datetime import date, timedelta
+
+import pytest
+
+import availability_index
+import config
+import tools
+import venues
+from availability_index import AvailabilityIndex, nearest_time
+from mock_api import start_mock_api
+
+def availability(*open_times, all_times=("18:00:00", "18:30:00", "19:00:00", "19:30:00")):
+    return {"available_slots": [{"time": t, "available": t in open_times} for t in all_times]}
+
+def test_queries_answer_from_the_bitsets():
+    now = [0.0]
+    index = AvailabilityIndex(max_age=60, clock=lambda: now[0])
+    index.record("2030-01-05", 6, availability())
+    index.record("2030-01-06", 6, availability("19:30:00", "18:30:00"))
+    index.record("2030-01-08", 6, availability("18:00:00"))
+
+    assert index.open_times("2030-01-06", 6) == ["18:30:00", "19:30:00"]
+    assert index.open_times("2030-01-06", 4) is None
+    assert index.earliest("2030-01-05", "2030-01-08", 6) == (("2030-01-06", "18:30:00"), [])
+    assert index.earliest("2030-01-07", "2030-01-08", 6) == (("2030-01-08", "18:00:00"), ["2030-01-07"])
+    assert index.open_slots("2030-01-05", "2030-01-07", 6) == (
+        {"2030-01-05": [], "2030-01-06": ["18:30:00", "19:30:00"]}, ["2030-01-07"])
+    assert index.lookup("2030-01-08", 6)["available_slots"][0] == {"time": "18:00:00", "available": True}
+
+    now[0] = 61
+    assert index.lookup("2030-01-06", 6) is None
+    assert index.stale(["2030-01-06"], [6], older_than=30) == [("2030-01-06", 6)]
+
+def test_own_writes_patch_the_index():
+    index = AvailabilityIndex()
+    for size in (2, 4, 6):
+        index.record("2030-01-05", size, availability())
+    index.record("2030-01-06", 2, availability("18:00:00"))
+
+    index.released("2030-01-05", "19:00:00", 4)
+    assert [index.open_times("2030-01-05", size) for size in (2, 4, 6)] == [["19:00:00"], ["19:00:00"], []]
+    index.booked("2030-01-05")
+    assert index.lookup("2030-01-05", 2) is None and index.open_times("2030-01-06", 2) == ["18:00:00"]
+
+def test_nearest_time_prefers_the_earlier_on_a_tie():
+    assert nearest_time(["18:00:00", "20:00:00"], "19:00") == "18:00:00"
+    assert nearest_time([], "19:00:00") is None
+
+@pytest.fixture
+def indexed_api(monkeypatch):
+    server, api = start_mock_api(token="t")
+    monkeypatch.setattr(config, "_config", dataclasses.replace(
+        config.get_config(), base_url=f"http://127.0.0.1:{server.server_address[1]}",
+        restaurant_name="TheHungryUnicorn", bearer_token="t", availability_index=True, availability_cache=False,
+        availability_sync_days=2, availability_sync_max_party_size=2))
+    monkeypatch.setattr(availability_index, "_indexes", {})
+    monkeypatch.setattr(tools, "_client", None)
+    monkeypatch.setattr(venues, "_registry", None)
+    yield api
+    server.shutdown()
+    server.server_close()
+
+def test_sync_fills_the_index_and_range_searches_stop_calling_the_api(indexed_api):
+    today, tomorrow = date.today().isoformat(), (date.today() + timedelta(days=1)).isoformat()
+    index = availability_index.get_index("TheHungryUnicorn")
+    sync = tools.start_availability_sync()
+    deadline = time.monotonic() + 5
+    while len(index) < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sync.stop()
+    assert indexed_api.requests == 4 and index.stale([today, tomorrow], [1, 2], older_than=60) == []
+
+    result = tools.search_availability_range(today, tomorrow, [1, 2])
+    assert indexed_api.requests == 4
+    assert tools.earliest_slot(result["slots"], party_size=2) == (today, "12:00:00", [1, 2])
+
+    # Only the dates the index doesn't cover are searched; an earliest-only search stops at its first open slot
+    later = (date.today() + timedelta(days=4)).isoformat()
+    result = tools.search_availability_range(today, later, [1, 2], earliest_only=True)
+    assert indexed_api.requests == 4 and list(result["slots"]) == [today]
+    result = tools.search_availability_range(tomorrow, (date.today() + timedelta(days=2)).isoformat(), [2])
+    assert indexed_api.requests == 5 and len(result["slots"]) == 2 and not result["errors"]
+
+    # Our own create drops the date; the cancel of a known booking patches it back
+    booking = tools.create_booking({"VisitDate": today, "VisitTime": "12:00:00", "PartySize": 2})
+    assert index.lookup(today, 2) is None and index.lookup(tomorrow, 2) is not None
+    tools.check_availability(today, 2)
+    assert indexed_api.requests == 7
+    tools.cancel_booking(booking["booking_reference"], 1)
+    assert "12:00:00" in index.open_times(today, 2)
+
+def test_unnamed_default_venue_shares_the_sync_index(indexed_api, monkeypatch):
+    monkeypatch.setattr(config, "_config", dataclasses.replace(config.get_config(), restaurant_name=None))
+    assert tools.get_client().availability_index is availability_index.get_index(venues.get_registry().default.name)
+
+def test_sync_is_off_unless_the_index_is_on():
+    assert tools.start_availability_sync() is None
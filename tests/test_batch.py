@@ -0,0 +1,77 @@
+import json
+
+import batch
+import parser
+
+CHECK = {
+    "id": "check",
+    "turns": ["Any tables for 4 on 2030-01-05?"],
+    "nlu": [{"updated_state": {"intent": "check_availability", "VisitDate": "2030-01-05", "PartySize": 4,
+                               "status": "ready"}, "next_message": "Checking."}],
+}
+
+def write_transcripts(path, *conversations):
+    path.write_text("".join(json.dumps(c) + "\n" for c in conversations) + "\n")
+    return str(path)
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_replays_in_process_against_mock_api(tmp_path):
+    transcripts = write_transcripts(tmp_path / "in.jsonl", CHECK, ["cancel ABC1234"])
+    summary = batch.run_batch(transcripts, str(tmp_path / "out.jsonl"), workers=1, nlu="offline", api="mock")
+
+    assert summary["conversations"] == 2 and summary["turns"] == 2 and summary["errors"] == 0
+    check, cancel = read_results(tmp_path / "out.jsonl")
+    assert check["conversation"] == "check" and check["status"] == "ready"
+    assert "tables for 4 available" in check["replies"][0]
+    assert cancel["conversation"] == "2" and cancel["intent"] == "cancel_booking"
+    assert cancel["seconds"] >= 0
+
+def test_failing_turn_is_recorded_and_ends_conversation(monkeypatch):
+    def boom(ctx, text):
+        raise RuntimeError("parser exploded")
+    monkeypatch.setattr(batch, "handle_turn", boom)
+    records = batch.replay_conversation({"id": "x", "turns": ["one", "two"], "nlu": None})
+    assert len(records) == 1
+    assert records[0]["error"] == "RuntimeError: parser exploded"
+
+def test_process_pool_streams_every_conversation(tmp_path):
+    conversations = [dict(CHECK, id=f"c{i}") for i in range(6)]
+    transcripts = write_transcripts(tmp_path / "in.jsonl", *conversations)
+    summary = batch.run_batch(transcripts, str(tmp_path / "out.jsonl"), workers=2, nlu="offline", api="mock")
+
+    assert summary["turns"] == 6 and summary["errors"] == 0
+    results = read_results(tmp_path / "out.jsonl")
+    assert sorted(r["conversation"] for r in results) == [f"c{i}" for i in range(6)]
+
+def test_scripted_replies_stay_paired_with_their_turns():
+    # Turn 1 alone would be answered by the extractor fast path; the script must still
+    # be consumed from turn 1, not shifted onto turn 2.
+    conversation = {
+        "id": "mixed",
+        "turns": ["book a table for 4 people", "Jo Smith"],
+        "nlu": [{"updated_state": {"intent": "create_booking", "PartySize": 4}, "next_message": "SCRIPT-1"},
+                {"updated_state": {"intent": "create_booking", "PartySize": 4, "FirstName": "Jo",
+                                   "Surname": "Smith"}, "next_message": "SCRIPT-2"}],
+    }
+    first, second = batch.replay_conversation(conversation)
+    assert first["replies"] == ["SCRIPT-1"]
+    assert second["replies"] == ["SCRIPT-2"]
+    assert batch.config.get_config().nlu_fast_path
+
+def test_in_process_replay_bypasses_an_existing_reply_memo(tmp_path, monkeypatch):
+    class StaleMemo:
+        enabled = True
+        def get(self, key):
+            return {"updated_state": {"intent": "greeting", "status": "collecting"}, "next_message": "STALE"}
+        def set(self, key, reply, latency):
+            pass
+    memo = StaleMemo()
+    monkeypatch.setattr(parser, "_reply_cache", memo)
+    transcripts = write_transcripts(tmp_path / "in.jsonl", CHECK)
+    batch.run_batch(transcripts, str(tmp_path / "out.jsonl"), workers=1, nlu="offline", api="mock")
+
+    [check] = read_results(tmp_path / "out.jsonl")
+    assert "STALE" not in check["replies"] and check["intent"] == "check_availability"
+    assert parser._reply_cache is memo
@@ -0,0 +1,131 @@
+import dataclasses
+import json
+
+import bulk
+import config
+from mock_api import start_mock_api
+
+HEADER = "op,id,VisitDate,VisitTime,PartySize,FirstName,Surname,Email,BookingRef,CancellationReasonId\n"
+
+def create_row(i, date="2030-01-05"):
+    # The mock API has four tables per slot
+    return f"create,g{i},{date},{18 + i // 4}:00,4,Guest,{i},guest{i}@example.com,,\n"
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_rows_are_validated_with_the_chat_rules():
+    assert bulk.prepare_operation(1, {"op": "create", "VisitDate": "2030-01-05"})[1].startswith("Missing fields")
+    assert bulk.prepare_operation(1, {"op": "update", "BookingRef": "ABC1234"})[1].startswith("No changes detected")
+    assert "CancellationReasonId" in bulk.prepare_operation(1, {"op": "cancel", "BookingRef": "A",
+                                                               "CancellationReasonId": "9"})[1]
+    assert "Unknown columns: Notes" == bulk.prepare_operation(1, {"op": "cancel", "Notes": "x"})[1]
+    assert "op must be" in bulk.prepare_operation(1, {"op": "delete"})[1]
+
+    operation, reason = bulk.prepare_operation(7, {"op": "update", "BookingRef": "ABC1234", "PartySize": "6"})
+    assert reason is None
+    assert (operation.id, operation.args) == ("7", ("ABC1234", {"PartySize": "6"}))
+
+def test_invalid_rows_stop_the_job_before_any_call(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(bulk.tools, "create_booking", lambda data: calls.append(data) or {"booking_reference": "X"})
+    ops = tmp_path / "ops.csv"
+    ops.write_text(HEADER + create_row(1) + "create,g2,2030-13-01,19:00,4,Guest,2,guest2@example.com,,\n")
+
+    summary = bulk.run_bulk(str(ops), str(tmp_path / "out.jsonl"), rate=0)
+    assert summary["aborted"] and summary["invalid"] == 1 and not calls
+    [record] = read_results(tmp_path / "out.jsonl")
+    assert record["id"] == "g2" and record["line"] == 3 and record["error"].startswith("Invalid row: Invalid date")
+
+    summary = bulk.run_bulk(str(ops), str(tmp_path / "out.jsonl"), rate=0, skip_invalid=True)
+    assert not summary["aborted"] and summary["ok"] == 1 and len(calls) == 1
+
+def test_jsonl_rows_that_are_not_objects_are_invalid(tmp_path):
+    assert bulk.prepare_operation(1, ["cancel", "ABC1234"]) == (None, "Row must be a JSON object")
+    ops = tmp_path / "ops.jsonl"
+    ops.write_text('"cancel"\n[1, 2]\n')
+    summary = bulk.run_bulk(str(ops), str(tmp_path / "out.jsonl"), rate=0)
+    assert summary["aborted"] and summary["invalid"] == 2
+    assert [(r["id"], r["error"]) for r in read_results(tmp_path / "out.jsonl")] == [
+        ("1", "Invalid row: Row must be a JSON object"), ("2", "Invalid row: Row must be a JSON object")]
+
+def test_runs_creates_updates_and_cancels_against_mock_api(tmp_path):
+    ops = tmp_path / "ops.csv"
+    ops.write_text(HEADER + "".join(create_row(i) for i in range(6)))
+    summary = bulk.run_bulk(str(ops), str(tmp_path / "out.jsonl"), concurrency=3, rate=0, api="mock")
+
+    assert (summary["total"], summary["ok"], summary["failed"]) == (6, 6, 0)
+    results = read_results(tmp_path / "out.jsonl")
+    assert sorted(r["id"] for r in results) == [f"g{i}" for i in range(6)]
+    assert all(r["ok"] and r["booking_reference"] for r in results)
+
+def test_closure_cancels_and_updates_are_rate_limited(tmp_path, monkeypatch):
+    server, api = start_mock_api(token="t")
+    monkeypatch.setattr(config, "_config", dataclasses.replace(
+        config.get_config(), base_url=f"http://127.0.0.1:{server.server_address[1]}",
+        restaurant_name="TheHungryUnicorn", bearer_token="t"))
+    monkeypatch.setattr(bulk.tools, "_client", None)
+    try:
+        refs = [bulk.tools.create_booking({"VisitDate": "2030-01-05", "VisitTime": "19:00:00", "PartySize": 2,
+                                           "Customer[Email]": f"g{i}@example.com"})["booking_reference"]
+                for i in range(3)]
+        ops = tmp_path / "closure.jsonl"
+        ops.write_text("".join(json.dumps({"op": "cancel", "BookingRef": ref, "CancellationReasonId": 2}) + "\n"
+                               for ref in refs[:2])
+                       + json.dumps({"op": "update", "BookingRef": refs[2], "PartySize": 3}) + "\n")
+        summary = bulk.run_bulk(str(ops), str(tmp_path / "out.jsonl"), rate=10)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert summary["ok"] == 3 and api.requests == 6
+    assert summary["seconds"] >= 0.2
+    assert [r["op"] for r in sorted(read_results(tmp_path / "out.jsonl"), key=lambda r: r["id"])] == \
+        ["cancel", "cancel", "update"]
+
+def cancel_row(i):
+    return f"cancel,c{i},,,,,,,REF{i},2\n"
+
+def test_rerun_resumes_from_the_checkpoint(tmp_path, monkeypatch):
+    outcomes = {"REF1": {"error": "Timeout", "status_code": None},
+                "REF2": {"error": "Bad Request", "status_code": 400}}
+    calls = []
+
+    def fake_cancel(ref, reason_id):
+        calls.append(ref)
+        return outcomes.get(ref, {"booking_reference": ref, "status": "cancelled"})
+    monkeypatch.setattr(bulk.tools, "cancel_booking", fake_cancel)
+
+    ops = tmp_path / "ops.csv"
+    ops.write_text(HEADER + "".join(cancel_row(i) for i in range(4)))
+    checkpoint, out = tmp_path / "ckpt.jsonl", tmp_path / "out.jsonl"
+    summary = bulk.run_bulk(str(ops), str(out), checkpoint_path=str(checkpoint), concurrency=2, rate=0)
+    assert (summary["ok"], summary["failed"], summary["skipped"]) == (2, 2, 0)
+
+    # Only the row that failed transiently is run again; results are appended
+    del outcomes["REF1"]
+    calls.clear()
+    summary = bulk.run_bulk(str(ops), str(out), checkpoint_path=str(checkpoint), rate=0)
+    assert calls == ["REF1"]
+    assert (summary["ok"], summary["skipped"]) == (1, 3)
+    assert len(read_results(out)) == 5
+
+def test_creates_that_may_have_gone_through_are_flagged_not_resent(tmp_path, monkeypatch):
+    calls = []
+
+    def timing_out_create(data):
+        calls.append(data)
+        return {"error": "Timeout: The booking service did not respond in time", "status_code": None}
+    monkeypatch.setattr(bulk.tools, "create_booking", timing_out_create)
+
+    ops = tmp_path / "ops.csv"
+    ops.write_text(HEADER + create_row(1) + create_row(2))
+    checkpoint, out = tmp_path / "ckpt.jsonl", tmp_path / "out.jsonl"
+    # g2 was sent by a run that died before its answer came back
+    checkpoint.write_text(json.dumps({"id": "g2", "done": False, "sent": True}) + "\n")
+    summary = bulk.run_bulk(str(ops), str(out), checkpoint_path=str(checkpoint), rate=0)
+    assert len(calls) == 1 and (summary["failed"], summary["uncertain"]) == (2, 2)
+    assert all(r["uncertain"] and not r["ok"] for r in read_results(out))
+
+    summary = bulk.run_bulk(str(ops), str(out), checkpoint_path=str(checkpoint), rate=0)
+    assert len(calls) == 1 and summary["skipped"] == 2
@@ -0,0 +1,50 @@
+from cache import TTLCache, WriteGenerations
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=4, ttl=10, clock=clock)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    clock.now = 10.5
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+def test_invalidate_by_predicate():
+    cache = TTLCache()
+    cache.set(("R", "2025-08-11", "2"), 1)
+    cache.set(("R", "2025-08-12", "2"), 2)
+    assert cache.invalidate(lambda k: k[1] == "2025-08-11") == 1
+    assert len(cache) == 1
+
+def test_disabled_cache_is_bypassed():
+    cache = TTLCache()
+    cache.enabled = False
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 0
+
+def test_write_generations_move_per_key_and_for_all_keys():
+    writes = WriteGenerations()
+    before = writes.get("2030-01-05")
+    writes.bump("2030-01-06")
+    assert writes.get("2030-01-05") == before
+    writes.bump("2030-01-05")
+    assert writes.get("2030-01-05") != before
+    other = writes.get("2030-01-07")
+    writes.bump()
+    assert writes.get("2030-01-07") != other
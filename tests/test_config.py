@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+from config import Config
+
+def test_from_env_reads_upper_case_names_and_types():
+    config = Config.from_env({"BASE_URL": "http://api", "API_POOL_SIZE": "4", "AVAILABILITY_CACHE": "0",
+                              "BOOKING_CACHE_TTL": "12.5", "NLU_CACHE_PATH": ""})
+    assert config.base_url == "http://api"
+    assert config.api_pool_size == 4
+    assert config.availability_cache is False
+    assert config.booking_cache is True
+    assert config.booking_cache_ttl == 12.5
+    assert config.nlu_cache_path is None
+
+def test_importing_main_does_not_load_heavy_dependencies():
+    probe = "import sys, main; print(sorted(m for m in ('autogen', 'requests', 'httpx', 'dotenv') if m in sys.modules))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", probe], cwd=root, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
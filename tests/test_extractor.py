@@ -0,0 +1,115 @@
+from datetime import date
+import pytest
+
+import extractor
+from state import initial_state
+
+TODAY = date(2025, 8, 10)  # a Sunday
+
+def run(message, **state):
+    return extractor.extract(message, {**initial_state(), **state}, today=TODAY)
+
+@pytest.mark.parametrize("message,expected", [
+    ("check availability for 4 people tomorrow", {"VisitDate": "2025-08-11", "PartySize": 4}),
+    ("any tables for two on friday", {"VisitDate": "2025-08-15", "PartySize": 2}),
+    ("is there availability next sunday for 3", {"VisitDate": "2025-08-17", "PartySize": 3}),
+    ("availability on 12th August for six guests", {"VisitDate": "2025-08-12", "PartySize": 6}),
+    ("availability 2025-09-01 party of 8", {"VisitDate": "2025-09-01", "PartySize": 8}),
+    ("availability in 3 days for 2", {"VisitDate": "2025-08-13", "PartySize": 2}),
+])
+def test_check_availability_ready(message, expected):
+    result = run(message)
+    state = result["updated_state"]
+    assert state["intent"] == "check_availability"
+    assert state["status"] == "ready"
+    for key, value in expected.items():
+        assert state[key] == value
+
+@pytest.mark.parametrize("message,expected_time", [
+    ("tomorrow at 7pm", "19:00:00"),
+    ("tomorrow at 7:30 pm", "19:30:00"),
+    ("tomorrow at 12am", "00:00:00"),
+    ("tomorrow at noon", "12:00:00"),
+    ("tomorrow at 19:45", "19:45:00"),
+])
+def test_times_are_normalized(message, expected_time):
+    state = run(message, intent="create_booking")["updated_state"]
+    assert state["VisitTime"] == expected_time
+    assert state["VisitDate"] == "2025-08-11"
+
+def test_collecting_asks_for_first_missing_field():
+    result = run("book a table for 4 tomorrow at 7pm")
+    assert result["updated_state"]["status"] == "collecting"
+    assert result["updated_state"]["intent"] == "create_booking"
+    assert result["next_message"] == extractor.QUESTIONS["FirstName"]
+
+def test_create_becomes_ready_with_name_and_email():
+    result = run("My name is John Doe, john@doe.com", intent="create_booking",
+                 VisitDate="2025-08-11", VisitTime="19:00:00", PartySize=2)
+    state = result["updated_state"]
+    assert (state["FirstName"], state["Surname"], state["Email"]) == ("John", "Doe", "john@doe.com")
+    assert state["status"] == "ready"
+
+def test_booking_reference_and_reason():
+    state = run("cancel my booking abc1234 due to the weather")["updated_state"]
+    assert state["intent"] == "cancel_booking"
+    assert state["BookingRef"] == "ABC1234"
+    assert state["CancellationReasonId"] == 3
+    assert state["status"] == "ready"
+
+def test_bare_number_only_when_party_size_is_next():
+    assert run("4", intent="check_availability", VisitDate="2025-08-11")["updated_state"]["PartySize"] == 4
+    assert run("4", intent="create_booking") is None
+
+def test_update_flow_confirms_then_completes():
+    first = run("change it to 8pm", intent="update_booking", BookingRef="ABC1234")
+    assert first["updated_state"]["status"] == "collecting"
+    assert first["next_message"] == "Would you like to change anything else?"
+    done = extractor.extract("no, that's all", first["updated_state"], today=TODAY)
+    assert done["updated_state"]["status"] == "ready"
+
+@pytest.mark.parametrize("message,intent,question", [
+    ("I want to book a table", "create_booking", "VisitDate"),
+    ("cancel my booking", "cancel_booking", "BookingRef"),
+    ("I'd like to change my booking", "update_booking", "BookingRef"),
+])
+def test_intent_only_turns_take_the_fast_path(message, intent, question):
+    result = run(message)
+    assert result["updated_state"]["intent"] == intent
+    assert result["updated_state"]["status"] == "collecting"
+    assert result["next_message"] == extractor.QUESTIONS[question]
+
+@pytest.mark.parametrize("message,state", [
+    ("hello there", {}),
+    ("book for 4 tomorrow for John", {}),
+    ("check availability and book for 2", {}),
+    ("not friday, saturday", {"intent": "check_availability"}),
+    ("tomorrow", {"intent": "greeting"}),
+    ("what's my booking", {"LastBookingRef": "ABC1234"}),
+    # A date or time that matched but isn't real mustn't be dropped silently
+    ("book a table for 2 on 2026-13-40", {}),
+    ("book a table for 2 on 31 feb", {}),
+    ("book a table for 2 tomorrow at 13pm", {}),
+])
+def test_unsure_turns_go_to_the_llm(message, state):
+    assert run(message, **state) is None
+
+def test_fast_path_counts_hits_and_misses(monkeypatch):
+    monkeypatch.setattr(extractor, "STATS", {"hits": 0, "misses": 0})
+    history = [{"role": "user", "content": "availability tomorrow for 2"}]
+    assert extractor.fast_path(history, initial_state(), today=TODAY) is not None
+    assert extractor.fast_path([{"role": "user", "content": "hmm"}], initial_state(), today=TODAY) is None
+    assert extractor.STATS == {"hits": 1, "misses": 1}
+    assert extractor.hit_rate() == 0.5
+
+def test_parser_skips_model_on_fast_path_hit(monkeypatch):
+    import parser
+
+    from nlu_backends import OfflineBackend
+
+    def fail(request):
+        raise AssertionError("model should not be called")
+    monkeypatch.setattr(parser, "_backend", OfflineBackend(fail))
+    result = parser.update_state_with_llm([{"role": "user", "content": "my ref is ABC1234"}],
+                                          {**initial_state(), "intent": "get_booking"})
+    assert result["updated_state"]["BookingRef"] == "ABC1234"
@@ -0,0 +1,48 @@
+import handlers
+
+GRID = {
+    "slots": {
+        "2025-08-11": {"19:00:00": [4, 5, 6], "19:30:00": [4]},
+        "2025-08-12": {},
+    },
+    "errors": {},
+}
+
+def test_search_availability_shows_grid(monkeypatch, ctx):
+    seen = {}
+    def fake_search(start, end, sizes, earliest_only=False):
+        seen.update(start=start, end=end, sizes=sizes, earliest_only=earliest_only)
+        return GRID
+    monkeypatch.setattr("handlers.tools.search_availability_range", fake_search)
+    ctx.data.update({"intent": "search_availability", "VisitDate": "2025-08-11", "VisitDateEnd": "2025-08-12",
+                     "PartySize": 4, "PartySizeMax": 6})
+    ack, body, _ = handlers.handle_search_availability(ctx)
+    assert seen == {"start": "2025-08-11", "end": "2025-08-12", "sizes": [4, 5, 6], "earliest_only": False}
+    assert "2025-08-11: 19:00:00 (4-6), 19:30:00 (4)" in body
+    assert "2025-08-12: fully booked" in body
+
+def test_search_availability_earliest_only(monkeypatch, ctx):
+    monkeypatch.setattr("handlers.tools.search_availability_range", lambda s, e, p, earliest_only: GRID)
+    ctx.data.update({"VisitDate": "2025-08-11", "VisitDateEnd": "2025-08-12", "PartySize": 4,
+                     "PartySizeMax": 6, "EarliestOnly": True})
+    _, body, _ = handlers.handle_search_availability(ctx)
+    assert body == "The earliest available table is on 2025-08-11 at 19:00:00 (party of 4-6)."
+
+def test_search_availability_all_failed_is_api_error(monkeypatch, ctx):
+    err = {"error": "Unauthorized: Missing or invalid token", "status_code": 401}
+    grid = {"slots": {"2025-08-11": {}}, "errors": {("2025-08-11", 2): err}}
+    monkeypatch.setattr("handlers.tools.search_availability_range", lambda s, e, p, earliest_only: grid)
+    ctx.data.update({"intent": "search_availability", "VisitDate": "2025-08-11", "VisitDateEnd": "2025-08-11",
+                     "PartySize": 2})
+    ack, body, transform = handlers.handle_search_availability(ctx)
+    assert ack == "API Error" and "Unauthorized" in body
+    transform(ctx)
+    assert ctx.data["intent"] is None
+
+def test_search_availability_validates_ranges(ctx):
+    ctx.data.update({"VisitDate": "2025-08-12", "VisitDateEnd": "2025-08-11", "PartySize": 2})
+    assert handlers.handle_search_availability(ctx)[0] == "Invalid date range"
+    ctx.data.update({"VisitDateEnd": "2025-09-30"})
+    assert handlers.handle_search_availability(ctx)[0] == "Date range too long"
+    ctx.data.update({"VisitDateEnd": "2025-08-13", "PartySize": 6, "PartySizeMax": 4})
+    assert handlers.handle_search_availability(ctx)[0] == "Invalid party size"
@@ -0,0 +1,127 @@
+import asyncio
+import dataclasses
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import async_handlers
+import async_tools
+import config
+import handlers
+import metrics
+import tools
+from idempotency import BookingDedupe, idempotency_key
+from mock_api import start_mock_api
+from state import ConversationContext
+
+BOOKING = {"VisitDate": "2030-01-05", "VisitTime": "19:00:00", "PartySize": 2,
+           "FirstName": "Ada", "Surname": "Lovelace", "Email": "ada@example.com"}
+
+def booking_ctx(session_id="s1", **changes):
+    ctx = ConversationContext(session_id=session_id)
+    ctx.data.update({**BOOKING, **changes})
+    return ctx
+
+def confirmation(ref="ABC1234"):
+    return {"booking_reference": ref, "restaurant": "R", "visit_date": "2030-01-05", "visit_time": "19:00:00",
+            "party_size": 2, "status": "confirmed"}
+
+def test_key_ignores_field_order_spacing_and_email_case():
+    payload = {"VisitDate": "2030-01-05", "Customer[Email]": "Ada@Example.com", "Customer[FirstName]": "Ada "}
+    same = {"Customer[FirstName]": " Ada", "Customer[Email]": "ada@example.com", "VisitDate": "2030-01-05"}
+    assert idempotency_key("s1", "R", payload) == idempotency_key("s1", "R", same)
+    assert idempotency_key("s1", "R", payload) != idempotency_key("s2", "R", payload)
+    assert idempotency_key("s1", "R", payload) != idempotency_key("s1", "Other", payload)
+    assert idempotency_key("s1", "R", payload) != idempotency_key("s1", "R", {**payload, "PartySize": 3})
+
+def test_repeat_submission_gets_the_original_confirmation(monkeypatch):
+    registry = metrics.Metrics(enabled=True)
+    monkeypatch.setattr(metrics, "_metrics", registry)
+    calls = []
+    monkeypatch.setattr(handlers.tools, "create_booking", lambda data: calls.append(data) or confirmation())
+
+    first = handlers.handle_create_booking(booking_ctx())
+    repeat = handlers.handle_create_booking(booking_ctx(Email=" ADA@example.com"))
+    other_session = handlers.handle_create_booking(booking_ctx(session_id="s2"))
+
+    assert len(calls) == 2
+    assert first[0] == "I've created your booking." and first[1] == repeat[1]
+    assert "already have this booking" in repeat[0]
+    assert other_session[0] == "I've created your booking."
+    assert registry.counter_value("booking_duplicates_suppressed_total", reason="replay") == 1
+
+    ctx = booking_ctx()
+    repeat[2](ctx)
+    assert ctx.data["LastBookingRef"] == "ABC1234"
+
+def test_failed_creates_are_not_remembered(monkeypatch):
+    responses = [{"error": "Timeout: The booking service did not respond in time", "status_code": None},
+                 confirmation()]
+    monkeypatch.setattr(handlers.tools, "create_booking", lambda data: responses.pop(0))
+
+    assert handlers.handle_create_booking(booking_ctx())[0] == "API Error"
+    assert handlers.handle_create_booking(booking_ctx())[0] == "I've created your booking."
+    assert not responses
+
+def test_concurrent_duplicates_collapse_into_one_create(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def slow_create(data):
+        with lock:
+            calls.append(data)
+        time.sleep(0.1)
+        return confirmation()
+    monkeypatch.setattr(handlers.tools, "create_booking", slow_create)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: handlers.handle_create_booking(booking_ctx()), range(4)))
+    assert len(calls) == 1
+    assert sum("already have this booking" in r[0] for r in results) == 3
+
+def test_rebooking_after_a_cancel_makes_a_new_booking(monkeypatch):
+    server, api = start_mock_api(token="t")
+    monkeypatch.setattr(config, "_config", dataclasses.replace(
+        config.get_config(), base_url=f"http://127.0.0.1:{server.server_address[1]}",
+        restaurant_name="TheHungryUnicorn", bearer_token="t"))
+    monkeypatch.setattr(tools, "_client", None)
+    try:
+        ctx = booking_ctx()
+        first = handlers.handle_create_booking(ctx)
+        first[2](ctx)
+        assert tools.is_success(tools.cancel_booking(ctx.data["LastBookingRef"], 1))
+        again = handlers.handle_create_booking(booking_ctx())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert first[0] == again[0] == "I've created your booking."
+    assert ctx.data["LastBookingRef"] not in again[1]
+
+def test_disabled_dedupe_runs_every_create():
+    dedupe = BookingDedupe(enabled=False)
+    calls = []
+    for _ in range(2):
+        resp, duplicate = dedupe.submit("k", lambda: calls.append(1) or confirmation())
+        assert not duplicate
+    assert len(calls) == 2
+
+def test_async_create_that_outlives_its_deadline_is_not_repeated(monkeypatch):
+    calls = []
+
+    async def slow_create(data):
+        calls.append(data)
+        await asyncio.sleep(0.1)
+        return confirmation()
+    monkeypatch.setattr(async_tools, "create_booking", slow_create)
+
+    async def run():
+        timed_out = await async_handlers.handle_create_booking(booking_ctx(), timeout=0.01)
+        await asyncio.sleep(0.15)
+        retried = await async_handlers.handle_create_booking(booking_ctx())
+        return timed_out, retried
+
+    timed_out, retried = asyncio.run(run())
+    assert timed_out[0] == "API Error" and "Timeout" in timed_out[1]
+    assert "already have this booking" in retried[0] and "ABC1234" in retried[1]
+    assert len(calls) == 1
@@ -0,0 +1,47 @@
+import main
+
+def test_handle_turn_collecting_returns_llm_message(monkeypatch, ctx):
+    def fake_llm(history, state):
+        return {"updated_state": {**state, "intent": "check_availability", "status": "collecting"},
+                "next_message": "How many people?"}
+    monkeypatch.setattr(main.parser, "update_state_with_llm", fake_llm)
+    replies = main.handle_turn(ctx, "check tomorrow")
+    assert replies == ["How many people?"]
+    assert ctx.history == [{"role": "user", "content": "check tomorrow"}]
+
+def test_handle_turn_ready_runs_handler_and_transform(monkeypatch, ctx):
+    def fake_llm(history, state):
+        return {"updated_state": {**state, "intent": "get_booking", "BookingRef": "ABC1234", "status": "ready"},
+                "next_message": "Looking that up."}
+    monkeypatch.setattr(main.parser, "update_state_with_llm", fake_llm)
+    monkeypatch.setitem(main.INTENT_ROUTER, "get_booking",
+                        lambda c: ("Fetched.", "Here are your booking details:", lambda c: c.reset()))
+    replies = main.handle_turn(ctx, "what's my booking ABC1234")
+    # the LLM confirmation is suppressed once the state is ready
+    assert replies == ["Here are your booking details:"]
+    assert ctx.data["intent"] is None
+    assert ctx.history[-1] == {"role": "assistant", "content": "Fetched."}
+
+def test_handle_turn_unknown_intent_resets(monkeypatch, ctx):
+    def fake_llm(history, state):
+        return {"updated_state": {**state, "intent": "greeting", "status": "ready"}, "next_message": ""}
+    monkeypatch.setattr(main.parser, "update_state_with_llm", fake_llm)
+    replies = main.handle_turn(ctx, "hello")
+    assert replies == [main.UNKNOWN_ACTION_MESSAGE]
+    assert ctx.data["status"] == "collecting"
+
+def test_handle_turn_streamed_message_is_not_repeated(monkeypatch, ctx):
+    def fake_llm(history, state, on_text=None):
+        on_text("How many ")
+        on_text("people?")
+        return {"updated_state": {**state, "intent": "check_availability", "status": "collecting"},
+                "next_message": "How many people?"}
+    monkeypatch.setattr(main.parser, "update_state_with_llm", fake_llm)
+    chunks = []
+    replies = main.handle_turn(ctx, "check tomorrow", on_text=chunks.append)
+    assert chunks == ["How many ", "people?"]
+    assert replies == []
+
+def test_serve_only_persists_with_an_explicit_store():
+    assert main.parse_args(["--serve"]).store is None
+    assert main.parse_args(["--serve", "--store", "s.db"]).store == "s.db"
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+import main
+import metrics
+import parser
+import tools
+from nlu_backends import OfflineBackend
+from state import initial_state
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = metrics.Metrics(enabled=True)
+    monkeypatch.setattr(metrics, "_metrics", registry)
+    return registry
+
+def test_disabled_registry_records_nothing():
+    registry = metrics.Metrics(enabled=False)
+    with registry.span("nlu", intent="x") as span:
+        span.tag(source="model")
+    registry.inc("turns_total")
+    assert span is metrics.NULL_SPAN
+    assert list(registry.snapshot()) == []
+
+def test_span_exports_prometheus_and_jsonl():
+    registry = metrics.Metrics(buckets=(0.1, 1.0))
+    registry.observe("api_request_seconds", 0.05, endpoint="get", status="200")
+    registry.observe("api_request_seconds", 0.5, endpoint="get", status="200")
+    registry.inc("retries_total", endpoint="get")
+    with pytest.raises(ValueError):
+        with registry.span("handler", intent="get_booking"):
+            raise ValueError("boom")
+
+    text = registry.to_prometheus()
+    assert "# TYPE booking_agent_api_request_seconds histogram" in text
+    assert 'booking_agent_api_request_seconds_bucket{endpoint="get",status="200",le="0.1"} 1' in text
+    assert 'booking_agent_api_request_seconds_bucket{endpoint="get",status="200",le="+Inf"} 2' in text
+    assert 'booking_agent_api_request_seconds_count{endpoint="get",status="200"} 2' in text
+    assert 'booking_agent_retries_total{endpoint="get"} 1' in text
+    assert 'booking_agent_handler_seconds_count{error="ValueError",intent="get_booking"} 1' in text
+
+    lines = [json.loads(line) for line in registry.to_jsonl(timestamp=1.0).splitlines()]
+    hist = next(l for l in lines if l["name"] == "api_request_seconds")
+    assert hist["ts"] == 1.0 and hist["count"] == 2 and hist["p50"] == 0.1 and hist["p99"] == 1.0
+
+def test_api_calls_are_tagged_with_endpoint_and_status(registry, error_response_factory):
+    class Session:
+        def request(self, method, url, **kwargs):
+            return error_response_factory(404)
+    client = tools.BookingApiClient(base_url="http://api", restaurant="R", token="t", session=Session(),
+                                    cache_bookings=False)
+    client.get_booking("NOPE")
+    assert registry.histogram("api_request_seconds", endpoint="get", status="404").count == 1
+    assert metrics.api_status(tools.handle_request_error(OSError("refused"), timed_out=True)) == "timeout"
+
+def test_turn_records_nlu_and_handler_spans(registry, monkeypatch, ctx):
+    reply = {"updated_state": {**initial_state(), "intent": "get_booking", "BookingRef": "ABC1234", "status": "ready"},
+             "next_message": "Looking."}
+    monkeypatch.setattr(parser, "_backend", OfflineBackend([reply]))
+    monkeypatch.setattr(parser, "_reply_cache", parser.NluReplyCache(maxsize=4))
+    monkeypatch.setitem(main.INTENT_ROUTER, "get_booking", lambda c: ("API Error", "Not Found", lambda c: None))
+
+    main.handle_turn(ctx, "what's booking ABC1234 again")
+    assert registry.histogram("nlu_seconds", backend="offline", intent="get_booking", source="model").count == 1
+    assert registry.histogram("handler_seconds", intent="get_booking", outcome="api_error").count == 1
@@ -0,0 +1,41 @@
+import pytest
+
+import tools
+from mock_api import TABLES_PER_SLOT, start_mock_api
+
+@pytest.fixture
+def api_client():
+    server, api = start_mock_api(token="t")
+    client = tools.BookingApiClient(base_url=f"http://127.0.0.1:{server.server_address[1]}",
+                                    restaurant="TheHungryUnicorn", token="t",
+                                    cache_availability=False, cache_bookings=False)
+    yield client, api
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+def test_booking_lifecycle_against_mock_api(api_client):
+    client, api = api_client
+    slots = client.check_availability("2030-01-05", 2)["available_slots"]
+    assert slots[0] == {"time": "12:00:00", "available": True, "max_party_size": 8, "current_bookings": 0}
+
+    created = client.create_booking({"VisitDate": "2030-01-05", "VisitTime": "19:00:00", "PartySize": 2,
+                                     "Customer[FirstName]": "Alex"})
+    ref = created["booking_reference"]
+    assert client.get_booking(ref)["customer"]["first_name"] == "Alex"
+    assert client.update_booking(ref, {"PartySize": 4})["updates"] == {"party_size": 4}
+    assert client.cancel_booking(ref, 1)["status"] == "cancelled"
+    assert api.requests == 5
+
+def test_full_slot_and_unknown_booking_are_errors(api_client):
+    client, _ = api_client
+    booking = {"VisitDate": "2030-01-05", "VisitTime": "20:00:00", "PartySize": 2}
+    for _ in range(TABLES_PER_SLOT):
+        client.create_booking(booking)
+    assert client.create_booking(booking)["status_code"] == 400
+    assert client.get_booking("NOPE123")["status_code"] == 404
+
+def test_wrong_token_is_rejected(api_client):
+    client, _ = api_client
+    client.headers["Authorization"] = "Bearer wrong"
+    assert client.check_availability("2030-01-05", 2)["status_code"] == 401
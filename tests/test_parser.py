@@ -0,0 +1,140 @@
+import dataclasses
+import json
+from datetime import date
+
+import pytest
+
+import config
+import parser
+from nlu_backends import AutogenBackend, OfflineBackend
+from nlu_cache import NluReplyCache
+from state import initial_state
+
+@pytest.fixture(autouse=True)
+def fresh_reply_cache(monkeypatch):
+    monkeypatch.setattr(parser, "_reply_cache", NluReplyCache(maxsize=16))
+
+def scripted(monkeypatch, *replies):
+    backend = OfflineBackend(replies)
+    monkeypatch.setattr(parser, "_backend", backend)
+    return backend.calls
+
+def test_system_prompt_has_no_per_turn_content():
+    assert date.today().isoformat() not in parser.SYSTEM_PROMPT
+    assert "Current state:" not in parser.SYSTEM_PROMPT
+    assert "1: Customer Request" in parser.SYSTEM_PROMPT
+    assert "5: No Show" in parser.SYSTEM_PROMPT
+    assert AutogenBackend("gpt-4o", parser.SYSTEM_PROMPT).agent.system_message == parser.SYSTEM_PROMPT
+
+def test_turn_prompt_is_compact_and_recent():
+    history = [{"role": "user", "content": f"msg {i}"} for i in range(20)]
+    prompt = parser.build_turn_prompt(history, initial_state(), today=date(2025, 8, 10))
+    assert prompt.startswith("Today's date: 2025-08-10 (Sunday)")
+    assert '"intent":null' in prompt
+    assert "msg 19" in prompt and "msg 11" not in prompt
+    assert "\n  " not in prompt
+
+def test_llm_turn_sends_suffix_and_reports_tokens(monkeypatch):
+    calls = scripted(monkeypatch, {"updated_state": {**initial_state(), "intent": "greeting"}, "next_message": "Hi!"})
+
+    result = parser.update_state_with_llm([{"role": "user", "content": "hello there"}], initial_state())
+    assert result["next_message"] == "Hi!"
+    assert len(calls[0].messages) == 1
+    assert calls[0].messages[0]["content"].startswith("Today's date:")
+
+    report = parser.prompt_token_report()
+    assert report["prompt_version"] == parser.PROMPT_VERSION
+    assert report["total_tokens"] == report["prefix_tokens"] + report["suffix_tokens"]
+    assert report["prefix_tokens"] > report["suffix_tokens"]
+
+def test_repeated_turn_is_served_from_reply_cache(monkeypatch):
+    calls = scripted(monkeypatch, {"updated_state": {**initial_state(), "intent": "greeting"}, "next_message": "Hi!"})
+
+    history = [{"role": "assistant", "content": "How can I help?"}, {"role": "user", "content": "Hello there!"}]
+    first = parser.update_state_with_llm(history, initial_state())
+    first["next_message"] = "mutated"
+    # Same question and state, different casing/punctuation, earlier history ignored
+    again = [{"role": "user", "content": "older"}, {"role": "assistant", "content": "How can I help?"},
+             {"role": "user", "content": "hello there"}]
+    second = parser.update_state_with_llm(again, initial_state())
+
+    assert len(calls) == 1
+    assert second["next_message"] == "Hi!"
+    stats = parser.reply_cache_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["latency_saved"] >= 0
+
+def test_invalid_replies_are_not_cached(monkeypatch):
+    monkeypatch.setattr(config, "_config", dataclasses.replace(config.get_config(), nlu_max_reasks=0))
+    calls = scripted(monkeypatch, {"next_message": "no state here"}, {"next_message": "no state here"})
+
+    history = [{"role": "user", "content": "hmm"}]
+    parser.update_state_with_llm(history, initial_state())
+    parser.update_state_with_llm(history, initial_state())
+    assert len(calls) == 2
+    assert parser.reply_cache_stats()["stores"] == 0
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    path = str(tmp_path / "nlu.db")
+    reply = {"updated_state": initial_state(), "next_message": "Hi!"}
+    first = NluReplyCache(maxsize=4, path=path)
+    first.set("k", reply, latency=1.5)
+    first.close()
+
+    second = NluReplyCache(maxsize=4, path=path)
+    assert second.get("k") == reply
+    assert second.get("k") == reply
+    stats = second.stats()
+    assert stats["disk_hits"] == 1 and stats["hits"] == 2
+    assert stats["latency_saved"] == 3.0
+    second.close()
+
+def test_streaming_turn_passes_message_through(monkeypatch):
+    scripted(monkeypatch, {"updated_state": {**initial_state(), "intent": "greeting"}, "next_message": "Hi there!"})
+    chunks = []
+    result = parser.update_state_with_llm([{"role": "user", "content": "hello there"}], initial_state(),
+                                          on_text=chunks.append)
+    assert "".join(chunks) == "Hi there!"
+    assert result["next_message"] == "Hi there!"
+
+def test_fenced_reply_with_string_party_size_is_repaired_locally(monkeypatch):
+    state = {**initial_state(), "intent": "check_availability", "PartySize": "4", "Email": ""}
+    del state["Mobile"]
+    raw = "Sure!\n```json\n" + json.dumps({"updated_state": state, "next_message": "Which date?"}) + "\n```"
+    calls = scripted(monkeypatch, raw)
+    before = parser.repair_stats()
+
+    result = parser.update_state_with_llm([{"role": "user", "content": "could you see if four of us fit, cheers"}], initial_state())
+    assert len(calls) == 1
+    assert result["updated_state"]["PartySize"] == 4
+    assert result["updated_state"]["Email"] is None
+    assert "Mobile" in result["updated_state"]
+    after = parser.repair_stats()
+    assert after["parse_failures"] == before["parse_failures"] + 1
+    assert after["repaired"] == before["repaired"] + 1
+
+def test_unrepairable_reply_is_reasked_once(monkeypatch):
+    good = json.dumps({"updated_state": {**initial_state(), "intent": "greeting"}, "next_message": "Hi!"})
+    calls = scripted(monkeypatch, '{"updated_state": {"intent": "dance"}, "next_message": "?"}', good)
+    before = parser.repair_stats()
+
+    result = parser.update_state_with_llm([{"role": "user", "content": "hiya"}], initial_state())
+    assert result["next_message"] == "Hi!"
+    assert len(calls) == 2
+    assert "intent must be one of" in calls[1].messages[-1]["content"]
+    after = parser.repair_stats()
+    assert after["reasks"] == before["reasks"] + 1
+    assert after["reask_fixed"] == before["reask_fixed"] + 1
+
+def test_offline_backend_falls_back_to_rules_when_script_runs_out(monkeypatch):
+    scripted(monkeypatch)
+    state = {**initial_state(), "intent": "create_booking", "VisitDate": "2025-08-11"}
+    result = parser.update_state_with_llm([{"role": "user", "content": "hmm, not sure yet"}], state)
+    assert result["updated_state"]["VisitDate"] == "2025-08-11"
+    assert result["updated_state"]["status"] == "collecting"
+    assert "time" in result["next_message"].lower()
+
+def test_backend_is_selected_from_config(monkeypatch):
+    monkeypatch.setattr(config, "_config", dataclasses.replace(config.get_config(), nlu_backend="offline"))
+    monkeypatch.setattr(parser, "_backend", None)
+    assert isinstance(parser.get_backend(), OfflineBackend)
@@ -0,0 +1,109 @@
+import dataclasses
+import threading
+import time
+
+import config
+import handlers
+import prefetch
+
+def slots(date, size, times):
+    return {
+        "visit_date": date,
+        "party_size": size,
+        "available_slots": [{"time": t, "available": ok} for t, ok in times],
+    }
+
+def test_prefetch_starts_once_both_fields_are_known(monkeypatch, ctx):
+    calls = []
+    def fake_api(date, size, channel_code="ONLINE"):
+        calls.append((date, size))
+        return slots(date, size, [("12:00:00", True)])
+    monkeypatch.setattr(prefetch.tools, "check_availability", fake_api)
+
+    ctx.data.update({"intent": "create_booking", "VisitDate": "2025-08-11"})
+    prefetch.prefetch_availability(ctx)
+    assert ctx.prefetch.future is None
+
+    ctx.data["PartySize"] = 2
+    prefetch.prefetch_availability(ctx)
+    prefetch.prefetch_availability(ctx)  # same key: no new call
+    assert prefetch.prefetched_availability(ctx, "2025-08-11", 2)["visit_date"] == "2025-08-11"
+    assert calls == [("2025-08-11", 2)]
+
+def test_changed_fields_discard_stale_result(monkeypatch, ctx):
+    release = threading.Event()
+    def slow_api(date, size, channel_code="ONLINE"):
+        release.wait(2)
+        return slots(date, size, [("12:00:00", True)])
+    monkeypatch.setattr(prefetch.tools, "check_availability", slow_api)
+
+    ctx.data.update({"intent": "check_availability", "VisitDate": "2025-08-11", "PartySize": 2})
+    prefetch.prefetch_availability(ctx)
+    ctx.data["PartySize"] = 4
+    prefetch.prefetch_availability(ctx)
+    release.set()
+    assert prefetch.prefetched_availability(ctx, "2025-08-11", 2) is None
+    assert prefetch.prefetched_availability(ctx, "2025-08-11", 4)["party_size"] == 4
+
+def test_check_handler_uses_prefetched_result(monkeypatch, ctx):
+    monkeypatch.setattr(prefetch.tools, "check_availability",
+                        lambda d, s, channel_code="ONLINE": slots(d, s, [("19:00:00", True)]))
+    ctx.data.update({"intent": "check_availability", "VisitDate": "2025-08-11", "PartySize": 2})
+    prefetch.prefetch_availability(ctx)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("should use the prefetched result")
+    monkeypatch.setattr("handlers.tools.check_availability", fail)
+    _, body, _ = handlers.handle_check_availability(ctx)
+    assert "available at: 19:00:00" in body
+
+def test_failed_prefetch_falls_back_to_live_call(monkeypatch, ctx):
+    monkeypatch.setattr(prefetch.tools, "check_availability",
+                        lambda d, s, channel_code="ONLINE": {"error": "Timeout", "status_code": None})
+    ctx.data.update({"intent": "check_availability", "VisitDate": "2025-08-11", "PartySize": 2})
+    prefetch.prefetch_availability(ctx)
+    assert prefetch.prefetched_availability(ctx, "2025-08-11", 2) is None
+
+def test_prefetched_result_is_used_once_and_expires(monkeypatch, ctx):
+    monkeypatch.setattr(prefetch.tools, "check_availability",
+                        lambda d, s, channel_code="ONLINE": slots(d, s, [("12:00:00", True)]))
+    ctx.data.update({"intent": "check_availability", "VisitDate": "2025-08-11", "PartySize": 2})
+    prefetch.prefetch_availability(ctx)
+    assert prefetch.prefetched_availability(ctx, "2025-08-11", 2) is not None
+    assert prefetch.prefetched_availability(ctx, "2025-08-11", 2) is None
+
+    monkeypatch.setattr(config, "_config", dataclasses.replace(config.get_config(), availability_cache_ttl=0.01))
+    prefetch.prefetch_availability(ctx)
+    ctx.prefetch.future.result()
+    time.sleep(0.02)
+    assert prefetch.prefetched_availability(ctx, "2025-08-11", 2) is None
+
+def booking_ctx(ctx, monkeypatch):
+    monkeypatch.setattr(prefetch.tools, "check_availability",
+                        lambda d, s, channel_code="ONLINE": slots(d, s, [("12:00:00", False), ("13:00:00", True)]))
+    ctx.data.update({
+        "intent": "create_booking", "VisitDate": "2025-08-11", "VisitTime": "12:00", "PartySize": 2,
+        "FirstName": "John", "Surname": "Doe", "Email": "john@doe.com",
+    })
+    prefetch.prefetch_availability(ctx)
+    ctx.prefetch.future.result()
+    return ctx
+
+def test_create_is_not_refused_on_a_prefetch_alone(monkeypatch, ctx):
+    booking_ctx(ctx, monkeypatch)
+    # The slot freed up after the prefetch; the API has the final say
+    monkeypatch.setattr("handlers.tools.create_booking", lambda data: {"booking_reference": "ABC1234"})
+    ack, _, _ = handlers.handle_create_booking(ctx)
+    assert ack == "I've created your booking."
+
+def test_refused_create_offers_the_prefetched_times(monkeypatch, ctx):
+    booking_ctx(ctx, monkeypatch)
+    monkeypatch.setattr("handlers.tools.create_booking",
+                        lambda data: {"error": "Bad Request", "details": "No availability for the requested time",
+                                      "status_code": 400})
+    ack, body, transform = handlers.handle_create_booking(ctx)
+    assert ack == "That time is fully booked."
+    assert "Available times: 13:00:00" in body
+    transform(ctx)
+    assert ctx.data["VisitTime"] is None and ctx.data["status"] == "collecting"
+    assert ctx.data["FirstName"] == "John"
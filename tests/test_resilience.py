@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+import async_tools
+import metrics
+import tools
+from resilience import CircuitBreaker, ResiliencePolicy, backoff_delay, is_transient
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = metrics.Metrics(enabled=True)
+    monkeypatch.setattr(metrics, "_metrics", registry)
+    return registry
+
+class ScriptedSession:
+    """
+    Returns the scripted responses in order (repeating the last); exceptions are raised.
+    """
+    def __init__(self, *responses, delay=0.0):
+        self.responses = list(responses)
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+            resp = self.responses[min(call, len(self.responses)) - 1]
+        if self.delay and call == 1:
+            time.sleep(self.delay)
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+
+    def close(self):
+        pass
+
+def make_client(session, **policy):
+    return tools.BookingApiClient(base_url="http://api", restaurant="R", token="t", session=session,
+                                  cache_availability=False, cache_bookings=False,
+                                  resilience=ResiliencePolicy(retry_backoff=0, **policy))
+
+def test_transient_failures_and_backoff():
+    assert is_transient({"error": "Timeout", "status_code": None})
+    assert is_transient({"error": "Unexpected error (status 502)", "status_code": 502})
+    assert not is_transient({"error": "Not Found", "status_code": 404})
+    assert not is_transient({"ok": True})
+    assert backoff_delay(3, base=0.1, cap=0.5, rand=lambda: 1.0) == 0.5
+    assert backoff_delay(1, base=0.1, cap=5, rand=lambda: 0.5) == pytest.approx(0.1)
+
+def test_reads_are_retried_writes_are_not(registry, ok_response, error_response_factory):
+    import requests
+    session = ScriptedSession(requests.Timeout("slow"), error_response_factory(503), ok_response)
+    client = make_client(session)
+    assert client.get_booking("ABC1234") == {"ok": True}
+    assert session.calls == 3
+    assert registry.counter_value("api_retries_total", endpoint="get") == 2
+
+    session = ScriptedSession(error_response_factory(503), ok_response)
+    assert make_client(session).create_booking({"VisitDate": "2030-01-05"})["status_code"] == 503
+    assert session.calls == 1
+
+def test_client_errors_are_not_retried(error_response_factory):
+    session = ScriptedSession(error_response_factory(404))
+    assert make_client(session).get_booking("NOPE")["status_code"] == 404
+    assert session.calls == 1
+
+def test_breaker_opens_fails_fast_and_recovers(registry, ok_response, error_response_factory):
+    now = [0.0]
+    session = ScriptedSession(error_response_factory(500), error_response_factory(500), ok_response)
+    client = make_client(session, retries=0, breaker_threshold=2, breaker_reset=10)
+    client.resilience.breakers["get"] = CircuitBreaker("get", 2, 10, clock=lambda: now[0])
+
+    client.get_booking("A")
+    client.get_booking("A")
+    rejected = client.get_booking("A")
+    assert session.calls == 2
+    assert "Circuit open" in rejected["details"] and metrics.api_status(rejected) == "circuit_open"
+    assert client.resilience.breaker_states() == {"get": "open"}
+    assert registry.gauge_value("api_circuit_state", endpoint="get") == 2
+    assert registry.counter_value("api_circuit_rejected_total", endpoint="get") == 1
+
+    now[0] = 11.0
+    assert client.get_booking("A") == {"ok": True}
+    assert client.resilience.breaker_states() == {"get": "closed"}
+    assert registry.gauge_value("api_circuit_state", endpoint="get") == 0
+
+def test_slow_read_is_hedged(registry, ok_response):
+    session = ScriptedSession(ok_response, delay=0.5)
+    client = make_client(session, hedge_delay=0.02)
+    started = time.perf_counter()
+    assert client.check_availability("2030-01-05", 2) == {"ok": True}
+    assert time.perf_counter() - started < 0.4
+    assert session.calls == 2
+    assert registry.counter_value("api_hedges_total", endpoint="availability") == 1
+    client.close()
+
+def test_async_client_retries_timeouts():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise httpx.ReadTimeout("slow", request=request)
+        return httpx.Response(200, json={"booking_reference": "ABC1234"})
+
+    async def run():
+        client = async_tools.AsyncBookingApiClient(base_url="http://api", restaurant="R", token="t",
+                                                   transport=httpx.MockTransport(handler), cache_bookings=False,
+                                                   resilience=ResiliencePolicy(retry_backoff=0))
+        try:
+            return await client.get_booking("ABC1234")
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()) == {"booking_reference": "ABC1234"}
+    assert len(calls) == 2
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import threading
+import pytest
+
+import server
+
+def echo_llm(history, state):
+    # Collect forever, echoing the latest user message so ordering can be checked
+    return {"updated_state": {**state, "status": "collecting"}, "next_message": history[-1]["content"]}
+
+def test_messages_within_a_session_stay_in_order(monkeypatch):
+    monkeypatch.setattr(server.parser, "update_state_with_llm", echo_llm)
+
+    async def run():
+        srv = server.ConversationServer(nlu_workers=4)
+        try:
+            results = await asyncio.gather(*(srv.handle_message("s1", f"m{i}") for i in range(5)))
+            return results, srv.sessions.get("s1").ctx.history
+        finally:
+            await srv.close()
+
+    results, history = asyncio.run(run())
+    assert results == [[f"m{i}"] for i in range(5)]
+    assert [h["content"] for h in history] == [f"m{i}" for i in range(5)]
+
+def test_sessions_run_concurrently(monkeypatch):
+    barrier = threading.Barrier(2, timeout=2)
+
+    def blocking_llm(history, state):
+        # Only returns once both sessions are inside the parser at the same time
+        barrier.wait()
+        return echo_llm(history, state)
+    monkeypatch.setattr(server.parser, "update_state_with_llm", blocking_llm)
+
+    async def run():
+        srv = server.ConversationServer(nlu_workers=4)
+        try:
+            return await asyncio.gather(srv.handle_message("a", "hi"), srv.handle_message("b", "hey"))
+        finally:
+            await srv.close()
+
+    assert asyncio.run(run()) == [["hi"], ["hey"]]
+
+def test_ready_state_dispatches_async_handler(monkeypatch):
+    def ready_llm(history, state):
+        return {"updated_state": {**state, "intent": "get_booking", "BookingRef": "ABC1234", "status": "ready"},
+                "next_message": "ok"}
+
+    async def fake_get(ctx):
+        return ("Fetched.", f"Booking {ctx.data['BookingRef']}", lambda c: c.reset())
+
+    monkeypatch.setattr(server.parser, "update_state_with_llm", ready_llm)
+    monkeypatch.setitem(server.ASYNC_INTENT_ROUTER, "get_booking", fake_get)
+
+    async def run():
+        srv = server.ConversationServer()
+        try:
+            replies = await srv.handle_message("s", "my booking ABC1234")
+            return replies, srv.sessions.get("s").ctx
+        finally:
+            await srv.close()
+
+    replies, ctx = asyncio.run(run())
+    assert replies == ["Booking ABC1234"]
+    assert ctx.data["intent"] is None
+
+def test_backpressure_rejects_when_server_is_full(monkeypatch):
+    monkeypatch.setattr(server.parser, "update_state_with_llm", echo_llm)
+
+    async def run():
+        srv = server.ConversationServer(max_pending=0)
+        try:
+            await srv.handle_message("s", "hi")
+        finally:
+            await srv.close()
+
+    with pytest.raises(server.ServerBusy) as exc:
+        asyncio.run(run())
+    assert exc.value.status == 503
+
+def test_idle_sessions_are_evicted():
+    async def run():
+        manager = server.SessionManager(max_sessions=2, idle_timeout=10)
+        old = manager.get_or_create("old")
+        old.last_seen -= 60
+        manager.get_or_create("fresh")
+        # full, but the idle session makes room
+        manager.get_or_create("new")
+        return sorted(manager.sessions)
+
+    assert asyncio.run(run()) == ["fresh", "new"]
+
+def test_dropping_an_unknown_session_with_a_store_is_reported(tmp_path):
+    from store import SessionStore
+    store = SessionStore(str(tmp_path / "sessions.db"))
+
+    async def run():
+        srv = server.ConversationServer(sessions=server.SessionManager(store=store))
+        status, payload = await srv._route("POST", "/sessions", b"")
+        store.save_turn(srv.sessions.get(payload["session_id"]).ctx)
+        unknown = await srv._route("DELETE", "/sessions/nope", b"")
+        known = await srv._route("DELETE", f"/sessions/{payload['session_id']}", b"")
+        await srv.close()
+        return unknown[0], known[0]
+
+    assert asyncio.run(run()) == (404, 204)
+    store.close()
+
+def test_http_roundtrip(monkeypatch):
+    monkeypatch.setattr(server.parser, "update_state_with_llm", echo_llm)
+
+    async def run():
+        srv = server.ConversationServer()
+        listener = await srv.start("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            body = json.dumps({"message": "hello"}).encode()
+            writer.write(
+                b"POST /sessions/abc/messages HTTP/1.1\r\nHost: x\r\nConnection: close\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+            raw = await reader.read()
+            writer.close()
+            return raw
+        finally:
+            await srv.close()
+
+    raw = asyncio.run(run())
+    head, _, payload = raw.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200")
+    assert json.loads(payload) == {"session_id": "abc", "replies": ["hello"]}
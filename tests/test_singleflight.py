@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+import async_tools
+import tools
+from resilience import ResiliencePolicy
+from singleflight import AsyncSingleFlight, SingleFlight
+
+class SlowSession:
+    def __init__(self, response, delay=0.1):
+        self.response = response
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return self.response
+
+def make_client(session):
+    return tools.BookingApiClient(base_url="http://api", restaurant="R", token="t", session=session,
+                                  cache_availability=False, cache_bookings=False,
+                                  resilience=ResiliencePolicy(retries=0))
+
+def test_concurrent_identical_searches_share_one_request(ok_response):
+    session = SlowSession(ok_response)
+    client = make_client(session)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: client.check_availability("2030-01-05", 4), range(8)))
+        other = pool.submit(client.check_availability, "2030-01-06", 4).result()
+
+    assert session.calls == 2
+    assert all(r == {"ok": True} for r in results) and other == {"ok": True}
+    stats = client.availability_flights.stats()
+    assert stats["calls"] == 9 and stats["coalesced"] == 7 and stats["in_flight"] == 0
+
+def test_followers_share_the_error_dict(error_response_factory):
+    session = SlowSession(error_response_factory(404))
+    client = make_client(session)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: client.get_booking("NOPE123"), range(4)))
+    assert session.calls == 1
+    assert all(r["status_code"] == 404 for r in results)
+
+def test_exceptions_reach_every_caller():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def boom():
+        started.set()
+        time.sleep(0.05)
+        raise RuntimeError("upstream exploded")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "k", boom)
+        started.wait()
+        follower = pool.submit(flight.do, "k", boom)
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError):
+                future.result()
+    assert flight.stats()["coalesced"] == 1
+
+def test_write_stops_new_callers_joining_a_stale_search():
+    flight = SingleFlight()
+    flight._calls[("R", "2030-01-05", "4", "ONLINE")] = object()
+    assert flight.forget(lambda k: k[1] == "2030-01-05") == 1
+    assert flight.stats()["in_flight"] == 0
+
+def test_async_lookups_coalesce_and_survive_caller_cancellation():
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"booking_reference": "ABC1234"})
+
+    async def run():
+        client = async_tools.AsyncBookingApiClient(base_url="http://api", restaurant="R", token="t",
+                                                   transport=httpx.MockTransport(handler), cache_bookings=False)
+        try:
+            impatient = asyncio.ensure_future(client.get_booking("ABC1234"))
+            await asyncio.sleep(0)
+            results = asyncio.gather(*(client.get_booking("ABC1234") for _ in range(4)))
+            await asyncio.sleep(0.01)
+            impatient.cancel()
+            return await results, client.booking_flights.stats()
+        finally:
+            await client.aclose()
+
+    results, stats = asyncio.run(run())
+    assert len(calls) == 1
+    assert results == [{"booking_reference": "ABC1234"}] * 4
+    assert stats["coalesced"] == 4
+
+def test_async_disabled_flight_runs_every_call():
+    flight = AsyncSingleFlight(enabled=False)
+    count = []
+
+    async def fn():
+        count.append(1)
+        await asyncio.sleep(0)
+        return len(count)
+
+    async def run():
+        return await asyncio.gather(flight.do("k", fn), flight.do("k", fn))
+
+    asyncio.run(run())
+    assert len(count) == 2
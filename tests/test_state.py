@@ -0,0 +1,47 @@
+from datetime import date, time
+
+import pytest
+
+from state import BookingState, ConversationContext, initial_state
+
+def test_values_are_normalized_on_assignment():
+    s = BookingState.from_dict({
+        "VisitDate": "2025-08-11", "VisitTime": "19:30", "PartySize": "4",
+        "CancellationReasonId": 2, "FirstName": "  Ada ", "Email": "",
+    })
+    assert s.VisitDate == date(2025, 8, 11)
+    assert s.VisitTime == time(19, 30)
+    assert s["PartySize"] == 4
+    assert s.CancellationReasonId == 2
+    assert s.FirstName == "Ada"
+    assert s.Email is None
+
+def test_unparseable_values_are_kept_as_strings():
+    s = BookingState(VisitDate="2025/08/11", VisitTime="7pm", PartySize="abc")
+    assert s.VisitDate == "2025/08/11"
+    assert s.VisitTime == "7pm"
+    assert s.PartySize == "abc"
+
+def test_json_round_trip():
+    raw = dict(initial_state(), VisitDate="2025-08-11", VisitTime="19:30:00", PartySize=4, intent="create_booking")
+    s = BookingState.from_dict(raw)
+    assert s.to_dict() == raw
+    assert BookingState.from_dict(s.to_dict()) == s
+
+def test_unknown_keys_ignored_by_from_dict_but_rejected_by_setitem():
+    s = BookingState.from_dict({"Foo": "bar", "status": "ready"})
+    assert s.status == "ready"
+    with pytest.raises(KeyError):
+        s["Foo"] = "bar"
+
+def test_no_instance_dict():
+    assert not hasattr(BookingState(), "__dict__")
+
+def test_soft_reset_preserves_typed_values():
+    ctx = ConversationContext()
+    ctx.data.update({"LastBookingRef": "ABC1234", "PartySize": "3"})
+    ctx.soft_reset(preserve_keys=["LastBookingRef"])
+    assert isinstance(ctx.data, BookingState)
+    assert ctx.data.LastBookingRef == "ABC1234"
+    assert ctx.data.PartySize is None
+    assert ctx.data.status == "collecting"
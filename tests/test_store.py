@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from state import ConversationContext
+from store import SessionStore
+
+@pytest.fixture
+def store(tmp_path):
+    s = SessionStore(str(tmp_path / "sessions.db"))
+    yield s
+    s.close()
+
+def history_rows(store, session_id):
+    return store._conn.execute(
+        "SELECT epoch, seq, content FROM history WHERE session_id = ? ORDER BY epoch, seq", (session_id,)
+    ).fetchall()
+
+def test_roundtrip_and_append_only_history(store):
+    ctx = ConversationContext(session_id="s1")
+    ctx.history.append({"role": "user", "content": "hi"})
+    ctx.data["intent"] = "check_availability"
+    store.save_turn(ctx)
+    ctx.history.append({"role": "assistant", "content": "hello"})
+    ctx.data["PartySize"] = 2
+    store.save_turn(ctx)
+
+    assert history_rows(store, "s1") == [(0, 0, "hi"), (0, 1, "hello")]
+    loaded = store.load("s1")
+    assert loaded.data == ctx.data
+    assert loaded.history == ctx.history
+    assert loaded.session_id == "s1"
+
+def test_reset_drops_old_history(store):
+    ctx = ConversationContext(session_id="s1")
+    ctx.history.extend([{"role": "user", "content": "a"}, {"role": "user", "content": "b"}])
+    store.save_turn(ctx)
+    ctx.soft_reset(preserve_keys=["LastBookingRef"])
+    ctx.history.append({"role": "assistant", "content": "c"})
+    store.save_turn(ctx)
+
+    assert history_rows(store, "s1") == [(1, 0, "c")]
+    assert store.load("s1").history == [{"role": "assistant", "content": "c"}]
+
+def test_unknown_session_and_delete(store):
+    assert store.load("nope") is None
+    assert store.load_or_create("nope").session_id == "nope"
+    ctx = ConversationContext(session_id="s1")
+    store.save_turn(ctx)
+    assert store.delete("s1") is True
+    assert store.load("s1") is None and store.count() == 0
+    assert store.delete("s1") is False
+
+def test_uses_wal_mode(store):
+    conn = sqlite3.connect(store.path)
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+def test_save_requires_session_id(store):
+    with pytest.raises(ValueError):
+        store.save_turn(ConversationContext())
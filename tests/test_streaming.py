@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from streaming import ReplyStreamParser
+
+def feed_in_chunks(reply_text, size=3):
+    out = []
+    stream = ReplyStreamParser(out.append)
+    for i in range(0, len(reply_text), size):
+        stream.feed(reply_text[i:i + size])
+    return stream, out
+
+def test_message_streams_after_collecting_state():
+    reply = {"updated_state": {"status": "collecting", "Notes": {"a": ["}", "\""]}},
+             "next_message": "How many \"guests\"?\nCafé \U0001F600"}
+    stream, out = feed_in_chunks(json.dumps(reply))
+    assert len(out) > 1
+    assert "".join(out) == reply["next_message"]
+    assert stream.result() == reply
+
+def test_message_before_state_is_held_until_state_is_known():
+    out = []
+    stream = ReplyStreamParser(out.append)
+    stream.feed('{"next_message": "Which date?", ')
+    assert out == []
+    stream.feed('"updated_state": {"status": "collecting"}}')
+    assert "".join(out) == "Which date?"
+
+def test_message_suppressed_when_ready():
+    reply = {"updated_state": {"status": "ready"}, "next_message": "Ready to proceed."}
+    stream, out = feed_in_chunks(json.dumps(reply))
+    assert out == [] and stream.suppressed
+    assert stream.result()["next_message"] == "Ready to proceed."
+
+def test_invalid_json_raises_on_result():
+    stream, _ = feed_in_chunks('{"updated_state": {"status": "collecting"}, "next_message": "Hi')
+    with pytest.raises(json.JSONDecodeError):
+        stream.result()
@@ -1,5 +1,11 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
 import tools
 import pytest
+from availability_index import AvailabilityIndex
+from resilience import ResiliencePolicy
 
 def test_handle_response_200(ok_response):
     data = tools.handle_response(ok_response)
@@ -24,41 +30,229 @@ def test_handle_response_unexpected(error_response_factory):
     assert "error" in data and "Unexpected error" in data["error"]
     assert data["status_code"] == 503
 
-def test_check_availability_calls_requests(monkeypatch, ok_response):
-    calls = {}
-    def fake_post(url, headers, data):
-        calls["url"] = url; calls["headers"] = headers; calls["data"] = data
-        return ok_response
-    monkeypatch.setattr(tools.requests, "post", fake_post)
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        self.calls.append({"method": method, "url": url, "headers": headers, "data": data, "timeout": timeout})
+        return self.response
+
+@pytest.fixture
+def fake_session(monkeypatch, ok_response):
+    session = FakeSession(ok_response)
+    client = tools.BookingApiClient(base_url="http://api", restaurant="TheHungryUnicorn", token="t", session=session)
+    monkeypatch.setattr(tools, "_client", client)
+    return session
+
+def test_check_availability_calls_session(fake_session):
     res = tools.check_availability("2025-08-11", 2)
     assert res == {"ok": True}
-    assert "/AvailabilitySearch" in calls["url"]
+    call = fake_session.calls[0]
+    assert call["method"] == "POST"
+    assert call["url"].endswith("/Restaurant/TheHungryUnicorn/AvailabilitySearch")
+    assert call["data"] == {"VisitDate": "2025-08-11", "PartySize": 2, "ChannelCode": "ONLINE"}
+    assert call["timeout"] == tools.DEFAULT_TIMEOUTS["availability"]
 
-def test_create_booking_calls_requests(monkeypatch, ok_response):
-    def fake_post(url, headers, data):
-        return ok_response
-    monkeypatch.setattr(tools.requests, "post", fake_post)
+def test_create_booking_calls_session(fake_session):
     res = tools.create_booking({"VisitDate": "2025-08-11"})
     assert res == {"ok": True}
+    assert fake_session.calls[0]["url"].endswith("/BookingWithStripeToken")
 
-def test_get_booking_calls_requests(monkeypatch, ok_response):
-    def fake_get(url, headers):
-        return ok_response
-    monkeypatch.setattr(tools.requests, "get", fake_get)
+def test_get_booking_calls_session(fake_session):
     res = tools.get_booking("ABC1234")
     assert res == {"ok": True}
-    # no exception
+    assert fake_session.calls[0]["method"] == "GET"
+    assert fake_session.calls[0]["url"].endswith("/Booking/ABC1234")
 
-def test_update_booking_calls_requests(monkeypatch, ok_response):
-    def fake_patch(url, headers, data):
-        return ok_response
-    monkeypatch.setattr(tools.requests, "patch", fake_patch)
+def test_update_booking_calls_session(fake_session):
     res = tools.update_booking("ABC1234", {"PartySize": 4})
     assert res == {"ok": True}
+    assert fake_session.calls[0]["method"] == "PATCH"
+    assert fake_session.calls[0]["data"] == {"PartySize": 4}
 
-def test_cancel_booking_calls_requests(monkeypatch, ok_response):
-    def fake_post(url, headers, data):
-        return ok_response
-    monkeypatch.setattr(tools.requests, "post", fake_post)
+def test_cancel_booking_calls_session(fake_session):
     res = tools.cancel_booking("ABC1234", 1)
     assert res == {"ok": True}
+    call = fake_session.calls[0]
+    assert call["url"].endswith("/Booking/ABC1234/Cancel")
+    assert call["data"]["micrositeName"] == "TheHungryUnicorn"
+    assert call["data"]["cancellationReasonId"] == 1
+
+def test_client_shares_one_session_across_calls(fake_session):
+    tools.check_availability("2025-08-11", 2)
+    tools.get_booking("ABC1234")
+    assert len(fake_session.calls) == 2
+    assert tools.get_client().session is fake_session
+
+def test_timeout_is_mapped_to_error_dict(monkeypatch):
+    class TimeoutSession:
+        def request(self, *args, **kwargs):
+            raise requests.Timeout("read timed out")
+    client = tools.BookingApiClient(base_url="http://api", restaurant="R", token="t", session=TimeoutSession())
+    res = client.get_booking("ABC1234")
+    assert "error" in res and "Timeout" in res["error"]
+    assert res["status_code"] is None
+
+def test_concurrent_first_calls_share_one_default_client(monkeypatch):
+    monkeypatch.setattr(tools, "_client", None)
+    built = []
+
+    class SlowClient:
+        def __init__(self):
+            built.append(self)
+            time.sleep(0.05)
+    monkeypatch.setattr(tools, "BookingApiClient", SlowClient)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        clients = list(pool.map(lambda _: tools.get_client(), range(4)))
+    assert len(built) == 1 and all(c is built[0] for c in clients)
+
+def test_timeouts_can_be_overridden_per_endpoint():
+    client = tools.BookingApiClient(base_url="http://api", restaurant="R", token="t",
+                                    timeouts={"create": (1, 5)}, session=object())
+    assert client.timeouts["create"] == (1, 5)
+    assert client.timeouts["availability"] == tools.DEFAULT_TIMEOUTS["availability"]
+
+def test_availability_is_cached_until_a_write_for_that_date(fake_session):
+    tools.check_availability("2025-08-11", 2)
+    tools.check_availability("2025-08-11", 2)
+    assert len(fake_session.calls) == 1
+    assert tools.availability_cache_stats()["hits"] == 1
+
+    tools.create_booking({"VisitDate": "2025-08-12"})
+    tools.check_availability("2025-08-11", 2)
+    assert len(fake_session.calls) == 2  # create call only; other date still cached
+
+    tools.create_booking({"VisitDate": "2025-08-11"})
+    tools.check_availability("2025-08-11", 2)
+    assert len(fake_session.calls) == 4
+
+def test_update_and_cancel_invalidate_all_dates(fake_session):
+    tools.check_availability("2025-08-11", 2)
+    tools.cancel_booking("ABC1234", 1)
+    tools.check_availability("2025-08-11", 2)
+    assert len(fake_session.calls) == 3
+
+def test_availability_errors_are_not_cached(monkeypatch, error_response_factory):
+    session = FakeSession(error_response_factory(503))
+    client = tools.BookingApiClient(base_url="http://api", restaurant="R", token="t", session=session,
+                                    resilience=ResiliencePolicy(retries=0))
+    client.check_availability("2025-08-11", 2)
+    client.check_availability("2025-08-11", 2)
+    assert len(session.calls) == 2
+
+def test_availability_cache_can_be_bypassed(ok_response):
+    session = FakeSession(ok_response)
+    client = tools.BookingApiClient(base_url="http://api", restaurant="R", token="t", session=session,
+                                    cache_availability=False)
+    client.check_availability("2025-08-11", 2)
+    client.check_availability("2025-08-11", 2)
+    assert len(session.calls) == 2
+
+def test_search_availability_range_merges_grid(monkeypatch):
+    def fake_check(visit_date, party_size, channel_code="ONLINE"):
+        if visit_date == "2025-08-12" and party_size == 5:
+            return {"error": "Unexpected error (status 503)", "status_code": 503}
+        times = ["19:00:00"] if party_size < 6 else []
+        if visit_date == "2025-08-13":
+            times = []
+        return {"available_slots": [{"time": t, "available": True} for t in times]
+                + [{"time": "20:00:00", "available": False}]}
+    monkeypatch.setattr(tools, "check_availability", fake_check)
+
+    result = tools.search_availability_range("2025-08-11", "2025-08-13", [6, 4, 5], max_concurrency=2)
+    assert result["slots"] == {
+        "2025-08-11": {"19:00:00": [4, 5]},
+        "2025-08-12": {"19:00:00": [4]},
+        "2025-08-13": {},
+    }
+    assert list(result["errors"]) == [("2025-08-12", 5)]
+    assert tools.earliest_slot(result["slots"], party_size=5) == ("2025-08-11", "19:00:00", [4, 5])
+    assert tools.earliest_slot({"2025-08-13": {}}) is None
+
+class RoutingSession:
+    """Answers each endpoint with a canned JSON body and records the calls."""
+    def __init__(self, routes):
+        self.routes = routes
+        self.calls = []
+    def request(self, method, url, headers=None, data=None, timeout=None):
+        self.calls.append((method, url))
+        payload = next(body for suffix, body in self.routes.items() if url.endswith(suffix))
+        class Resp:
+            status_code = 200
+            text = ""
+            def json(self):
+                return payload
+        return Resp()
+
+BOOKING = {
+    "booking_reference": "ABC1234", "restaurant": "R", "visit_date": "2025-08-11", "visit_time": "19:00:00",
+    "party_size": 2, "status": "confirmed", "customer": {"first_name": "John", "surname": "Doe"},
+}
+
+def booking_client():
+    session = RoutingSession({
+        "/BookingWithStripeToken": BOOKING,
+        "/Booking/ABC1234/Cancel": {"booking_reference": "ABC1234", "status": "cancelled",
+                                    "cancellation_reason": "Weather"},
+        "/Booking/ABC1234": {"booking_reference": "ABC1234", "status": "updated",
+                             "updates": {"PartySize": "4", "VisitDate": "2025-08-12"}},
+        "/AvailabilitySearch": {"available_slots": []},
+    })
+    return tools.BookingApiClient(base_url="http://api", restaurant="R", token="t", session=session), session
+
+def test_created_booking_is_served_from_cache():
+    client, session = booking_client()
+    client.create_booking({"VisitDate": "2025-08-11"})
+    assert client.get_booking("ABC1234") == BOOKING
+    assert [m for m, _ in session.calls] == ["POST"]
+
+def test_update_patches_cached_booking_and_invalidates_both_dates():
+    client, session = booking_client()
+    client.create_booking({"VisitDate": "2025-08-11"})
+    client.check_availability("2025-08-11", 2)
+    client.check_availability("2025-08-12", 2)
+    client.check_availability("2025-08-20", 2)
+    client.update_booking("ABC1234", {"PartySize": "4", "VisitDate": "2025-08-12"})
+
+    booking = client.get_booking("ABC1234")
+    assert booking["party_size"] == 4 and booking["visit_date"] == "2025-08-12"
+    assert booking["customer"]["first_name"] == "John"
+    remaining = {k[1] for k in client.availability_cache._data}
+    assert remaining == {"2025-08-20"}
+
+@pytest.mark.parametrize("index_enabled", [True, False])
+def test_search_in_flight_during_our_write_is_not_recorded(monkeypatch, index_enabled):
+    client, session = booking_client()
+    client.availability_index = AvailabilityIndex(enabled=index_enabled)
+    request = client._request
+
+    def racing_request(method, endpoint, path, data=None):
+        if path == "AvailabilitySearch" and endpoint == "availability":
+            # Our own create lands while the search is still waiting on the API
+            client.create_booking({"VisitDate": data["VisitDate"]})
+        return request(method, endpoint, path, data)
+    monkeypatch.setattr(client, "_request", racing_request)
+
+    client.check_availability("2025-08-11", 2)
+    assert not client.availability_cache._data and client.availability_index.lookup("2025-08-11", 2) is None
+    monkeypatch.setattr(client, "_request", request)
+    client.check_availability("2025-08-11", 2)
+    assert client.availability_cache._data
+    assert (client.availability_index.lookup("2025-08-11", 2) is not None) == index_enabled
+
+def test_cancel_patches_cached_status():
+    client, session = booking_client()
+    client.create_booking({"VisitDate": "2025-08-11"})
+    client.cancel_booking("ABC1234", 3)
+    booking = client.get_booking("ABC1234")
+    assert booking["status"] == "cancelled" and booking["cancellation_reason"] == "Weather"
+    assert len(session.calls) == 2
+
+def test_get_booking_reads_through_and_skips_errors(error_response_factory):
+    session = FakeSession(error_response_factory(404))
+    client = tools.BookingApiClient(base_url="http://api", restaurant="R", token="t", session=session)
+    client.get_booking("ZZZ0000")
+    client.get_booking("ZZZ0000")
+    assert len(session.calls) == 2
+    assert tools.patch_booking({"party_size": 2}, {"party_size": 3}) == {"party_size": 3}
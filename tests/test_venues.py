@@ -0,0 +1,142 @@
+import asyncio
+import dataclasses
+import json
+import sqlite3
+
+import pytest
+
+import async_tools
+import config
+import main
+import server
+import tools
+import venues
+from mock_api import start_mock_api
+from resilience import RateLimiter
+from state import ConversationContext
+from store import SessionStore
+
+@pytest.fixture
+def two_venues(monkeypatch):
+    """
+    Default venue and "TheSleepyDragon", each served by its own mock API.
+    """
+    servers = [start_mock_api(token=token) for token in ("unicorn", "dragon")]
+    (unicorn, unicorn_api), (dragon, dragon_api) = servers
+    default = venues.Venue("TheHungryUnicorn", f"http://127.0.0.1:{unicorn.server_address[1]}", "unicorn")
+    registry = venues.VenueRegistry(default, {
+        "TheSleepyDragon": venues.Venue("TheSleepyDragon", f"http://127.0.0.1:{dragon.server_address[1]}",
+                                        "dragon", pool_size=2),
+    })
+    monkeypatch.setattr(venues, "_registry", registry)
+    monkeypatch.setattr(tools, "_client", tools.BookingApiClient.for_venue(default))
+    monkeypatch.setattr(tools, "_venue_clients", {})
+    yield unicorn_api, dragon_api
+    for srv, _ in servers:
+        srv.shutdown()
+        srv.server_close()
+
+def test_registry_reads_venues_file_and_inherits_defaults(tmp_path, monkeypatch):
+    path = tmp_path / "venues.json"
+    path.write_text(json.dumps({"TheSleepyDragon": {"token": "dragon", "rate_limit": 5}}))
+    monkeypatch.setattr(config, "_config", dataclasses.replace(
+        config.get_config(), base_url="http://api", restaurant_name="TheHungryUnicorn", bearer_token="t",
+        venues_path=str(path)))
+
+    registry = venues.VenueRegistry.from_config()
+    assert registry.names() == ["TheHungryUnicorn", "TheSleepyDragon"]
+    dragon = registry.get("TheSleepyDragon")
+    assert (dragon.base_url, dragon.token, dragon.rate_limit) == ("http://api", "dragon", 5)
+    assert registry.get(None).name == "TheHungryUnicorn"
+    with pytest.raises(ValueError):
+        registry.get("Nowhere")
+
+    path.write_text(json.dumps({"TheSleepyDragon": {"colour": "red"}}))
+    with pytest.raises(ValueError):
+        venues.VenueRegistry.from_config()
+
+def test_turns_are_routed_to_the_sessions_venue(two_venues, monkeypatch):
+    unicorn_api, dragon_api = two_venues
+
+    def fake_llm(history, state):
+        return {"updated_state": {**state, "intent": "check_availability", "VisitDate": "2030-01-05",
+                                  "PartySize": 2, "status": "ready"}, "next_message": ""}
+    monkeypatch.setattr(main.parser, "update_state_with_llm", fake_llm)
+
+    replies = main.handle_turn(ConversationContext(restaurant="TheSleepyDragon"), "tables for 2 on the 5th?")
+    assert "tables for 2 available" in replies[0]
+    assert unicorn_api.requests == 0 and dragon_api.requests == 1
+
+    main.handle_turn(ConversationContext(), "tables for 2 on the 5th?")
+    assert unicorn_api.requests == 1
+
+    dragon_client = tools._venue_clients["TheSleepyDragon"]
+    assert dragon_client is not tools.get_client()
+    assert dragon_client.pool_size == 2 and dragon_client.restaurant == "TheSleepyDragon"
+
+def test_range_search_threads_keep_the_venue(two_venues):
+    unicorn_api, dragon_api = two_venues
+    with venues.use_venue("TheSleepyDragon"):
+        result = tools.search_availability_range("2030-01-05", "2030-01-06", [2, 4])
+    assert dragon_api.requests == 4 and unicorn_api.requests == 0
+    assert not result["errors"]
+
+def test_async_clients_are_per_venue(monkeypatch):
+    registry = venues.VenueRegistry(venues.Venue("A", "http://a", "t"), {"B": venues.Venue("B", "http://b", "t")})
+    monkeypatch.setattr(venues, "_registry", registry)
+    monkeypatch.setattr(async_tools, "_client", None)
+
+    async def run():
+        with venues.use_venue("B"):
+            client = async_tools.get_client()
+        assert async_tools.get_client() is async_tools.get_client() is not client
+        return client
+    client = asyncio.run(run())
+    assert client.base_url == "http://b" and client.restaurant == "B"
+
+def test_async_clients_are_per_event_loop(monkeypatch):
+    monkeypatch.setattr(async_tools, "_client", None)
+
+    async def run():
+        client = async_tools.get_client()
+        await async_tools.close_clients()
+        return client
+    first, second = asyncio.run(run()), asyncio.run(run())
+    assert first is not second and first.http.is_closed
+
+def test_rate_limiter_spaces_calls_after_the_burst():
+    now = [0.0]
+    limiter = RateLimiter(rate=2, burst=2, clock=lambda: now[0])
+    assert [limiter.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    now[0] = 5.0
+    assert limiter.reserve() == 0.0
+
+def test_store_keeps_the_venue_and_upgrades_old_databases(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE sessions (session_id TEXT PRIMARY KEY, data TEXT NOT NULL, epoch INTEGER NOT NULL, "
+                 "history_len INTEGER NOT NULL, updated_at REAL NOT NULL)")
+    conn.close()
+
+    store = SessionStore(path)
+    store.save_turn(ConversationContext(session_id="s1", restaurant="TheSleepyDragon"))
+    assert store.load("s1").restaurant == "TheSleepyDragon"
+    store.close()
+
+def test_server_sessions_can_pick_a_venue(monkeypatch):
+    registry = venues.VenueRegistry(venues.Venue("A", "http://a", "t"), {"B": venues.Venue("B", "http://b", "t")})
+    monkeypatch.setattr(venues, "_registry", registry)
+
+    async def run():
+        srv = server.ConversationServer()
+        created = await srv._route("POST", "/sessions", b'{"restaurant": "B"}')
+        unknown = await srv._route("POST", "/sessions", b'{"restaurant": "C"}')
+        default = await srv._route("POST", "/sessions", b"")
+        await srv.close()
+        return srv, created, unknown, default
+
+    srv, (status, payload), unknown, default = asyncio.run(run())
+    assert status == 201 and payload["restaurant"] == "B"
+    assert srv.sessions.get(payload["session_id"]).ctx.restaurant == "B"
+    assert unknown[0] == 400 and "Unknown restaurant" in unknown[1]["error"]
+    assert default[0] == 201 and default[1]["restaurant"] == "A"
@@ -1,16 +1,25 @@
-import os
-import requests
-from dotenv import load_dotenv
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from datetime import date, timedelta
 
-load_dotenv()
+import metrics
+from availability_index import AvailabilitySync, get_index
+from cache import TTLCache, WriteGenerations
+from config import get_config
+from idempotency import get_dedupe
+from resilience import RateLimiter, ResiliencePolicy, circuit_open_error, is_transient
+from singleflight import SingleFlight
+from venues import current_venue, get_registry, use_venue
 
-BASE_URL = os.getenv("BASE_URL")
-RESTAURANT_NAME = os.getenv("RESTAURANT_NAME")
-TOKEN = os.getenv("BEARER_TOKEN")
-
-HEADERS = {
-    "Authorization": f"Bearer {TOKEN}",
-    "Content-Type": "application/x-www-form-urlencoded"
+# (connect, read) timeouts in seconds for each endpoint. Availability and lookups
+# are cheap reads; creating a booking may involve a payment provider on the API side.
+DEFAULT_TIMEOUTS = {
+    "availability": (3.05, 10),
+    "create": (3.05, 30),
+    "get": (3.05, 10),
+    "update": (3.05, 15),
+    "cancel": (3.05, 15),
 }
 
 def handle_response(resp):
@@ -42,9 +51,468 @@ def handle_response(resp):
     else:
         return {"error": f"Unexpected error (status {resp.status_code})", "details": data, "status_code": resp.status_code}
 
+def availability_cache_key(restaurant, visit_date, party_size, channel_code):
+    """
+    Key for one AvailabilitySearch result in an availability cache.
+    """
+    return (restaurant, str(visit_date).strip(), str(party_size).strip(), channel_code)
+
+# Booking PATCH fields (request names) -> booking response fields
+BOOKING_FIELDS = {
+    "VisitDate": "visit_date",
+    "VisitTime": "visit_time",
+    "PartySize": "party_size",
+    "SpecialRequests": "special_requests",
+}
+
+def patch_booking(booking, updates):
+    """
+    Returns a copy of a cached booking response with an update's fields applied.
+    Accepts either request-style (VisitDate) or response-style (visit_date) keys.
+    """
+    patched = dict(booking)
+    for key, value in updates.items():
+        field = BOOKING_FIELDS.get(key, key)
+        if field == "party_size" and str(value).strip().isdigit():
+            value = int(value)
+        patched[field] = value
+    return patched
+
+def is_success(resp):
+    """
+    True when resp is a parsed API response rather than an error dict.
+    """
+    return isinstance(resp, dict) and "error" not in resp
+
+def handle_request_error(exc, timed_out=None):
+    """
+    Converts a transport-level failure (timeout, refused connection, etc.) into the
+    same error dict shape that handle_response() produces.
+
+    Args:
+        exc (Exception): The exception raised by the HTTP call.
+        timed_out (bool): Whether the failure was a timeout. Detected from
+                          requests.Timeout when not given.
+
+    Returns:
+        dict: A dictionary with an 'error' key and a None status code.
+    """
+    if timed_out is None:
+        import requests
+        timed_out = isinstance(exc, requests.Timeout)
+    if timed_out:
+        return {"error": "Timeout: The booking service did not respond in time", "details": str(exc), "status_code": None}
+    return {"error": "Connection Error: Could not reach the booking service", "details": str(exc), "status_code": None}
+
+# Our own writes per (restaurant, date), shared by a restaurant's sync and async clients
+_write_generations = {}
+_write_generations_lock = threading.Lock()
+
+def _generations_for(restaurant):
+    with _write_generations_lock:
+        return _write_generations.setdefault(restaurant or "", WriteGenerations())
+
+class BookingCacheMixin:
+    """
+    Availability and booking caches shared by the sync and async API clients.
+
+    Availability searches are kept in a short-lived LRU that our own writes invalidate,
+    and (with AVAILABILITY_INDEX on) in the restaurant's availability index, which our
+    own writes patch. Bookings are kept by reference: create responses populate the
+    cache, update and cancel responses patch it, and get_booking reads through it.
+    """
+
+    def _init_caches(self, cache_availability=None, cache_bookings=None):
+        config = get_config()
+        self.availability_cache = TTLCache(maxsize=config.availability_cache_size, ttl=config.availability_cache_ttl)
+        self.availability_cache.enabled = config.availability_cache if cache_availability is None else cache_availability
+        self.booking_cache = TTLCache(maxsize=config.booking_cache_size, ttl=config.booking_cache_ttl)
+        self.booking_cache.enabled = config.booking_cache if cache_bookings is None else cache_bookings
+        self.availability_index = get_index(self.restaurant)
+        self.availability_writes = _generations_for(self.restaurant)
+
+    def invalidate_availability(self, visit_date=None):
+        """
+        Drop cached availability for one date, or for every date when visit_date is None.
+        """
+        visit_date = None if visit_date is None else str(visit_date).strip()
+        # Bumped first, so a search answered from before this write won't be cached after it
+        self.availability_writes.bump(visit_date)
+        stale = lambda k: k[0] == self.restaurant and (visit_date is None or k[1] == visit_date)
+        # Searches already in flight may predate the write; don't let new callers join them
+        self.availability_flights.forget(stale)
+        return self.availability_cache.invalidate(stale)
+
+    def _booking_key(self, ref):
+        return (self.restaurant, str(ref).strip())
+
+    def _cached_booking(self, ref):
+        return self.booking_cache.get(self._booking_key(ref))
+
+    def indexed_availability(self, visit_date, party_size, channel_code="ONLINE"):
+        """
+        The availability index's answer in AvailabilitySearch form, or None if it has no fresh one.
+        """
+        if channel_code != "ONLINE":
+            return None
+        return self.availability_index.lookup(visit_date, party_size)
+
+    def _availability_generation(self, key):
+        return self.availability_writes.get(key[1])
+
+    def _after_availability(self, key, resp, generation):
+        """
+        Record a search's answer, unless one of our own writes to its date happened while
+        it was in flight (generation is _availability_generation(key) from before the call).
+        """
+        if not is_success(resp):
+            return
+        self.availability_cache.set(key, resp)
+        if generation != self._availability_generation(key):
+            # The write's invalidation may have run before the set above; undo it ourselves
+            self.availability_cache.invalidate(lambda k: k == key)
+            return
+        if key[3] == "ONLINE":
+            self.availability_index.record(key[1], key[2], resp,
+                                           lambda: generation == self._availability_generation(key))
+
+    def _after_get(self, ref, resp):
+        if is_success(resp):
+            self.booking_cache.set(self._booking_key(ref), resp)
+
+    def _after_create(self, data, resp):
+        if not is_success(resp):
+            return
+        visit_date = resp.get("visit_date") or data.get("VisitDate")
+        self.invalidate_availability(visit_date)
+        self.availability_index.booked(visit_date)
+        if resp.get("booking_reference"):
+            self.booking_cache.set(self._booking_key(resp["booking_reference"]), resp)
+
+    def _after_update(self, ref, updates, resp):
+        if not is_success(resp):
+            return
+        # A repeat of the original create must now make a new booking
+        get_dedupe().forget(ref)
+        key = self._booking_key(ref)
+        self.booking_flights.forget(lambda k: k == key)
+        cached = self.booking_cache.get(key)
+        if cached is None:
+            # Without the booking's previous date, every date may have changed.
+            self.invalidate_availability()
+            self.availability_index.invalidate()
+            return
+        patched = patch_booking(cached, resp.get("updates") or updates)
+        self.booking_cache.set(key, patched)
+        self.invalidate_availability(cached.get("visit_date"))
+        self.invalidate_availability(patched.get("visit_date"))
+        self._release_slot(cached)
+        self.availability_index.booked(patched.get("visit_date"))
+
+    def _after_cancel(self, ref, resp):
+        if not is_success(resp):
+            return
+        get_dedupe().forget(ref)
+        key = self._booking_key(ref)
+        self.booking_flights.forget(lambda k: k == key)
+        cached = self.booking_cache.get(key)
+        if cached is None:
+            self.invalidate_availability()
+            self.availability_index.invalidate()
+            return
+        patched = dict(cached, status=resp.get("status") or "cancelled")
+        if resp.get("cancellation_reason"):
+            patched["cancellation_reason"] = resp["cancellation_reason"]
+        self.booking_cache.set(key, patched)
+        self.invalidate_availability(cached.get("visit_date"))
+        self._release_slot(cached)
+
+    def _release_slot(self, booking):
+        try:
+            self.availability_index.released(booking["visit_date"], booking["visit_time"], int(booking["party_size"]))
+        except (KeyError, TypeError, ValueError):
+            self.availability_index.invalidate(booking.get("visit_date"))
+
+class BookingApiClient(BookingCacheMixin):
+    """
+    Client for the restaurant booking API built around a single pooled, keep-alive session.
+
+    Reusing the session means every call to the same host shares TCP/TLS connections
+    instead of opening a new one per request.
+    """
+
+    def __init__(self, base_url=None, restaurant=None, token=None, pool_size=None, timeouts=None, session=None,
+                 cache_availability=None, cache_bookings=None, resilience=None, rate_limit=None):
+        """
+        Args:
+            base_url (str): Root URL of the booking API (defaults to BASE_URL).
+            restaurant (str): Microsite name used in every URL (defaults to RESTAURANT_NAME).
+            token (str): Bearer token (defaults to BEARER_TOKEN).
+            pool_size (int): Maximum number of kept-alive connections to the API host.
+            timeouts (dict): Per-endpoint (connect, read) overrides for DEFAULT_TIMEOUTS.
+            session (requests.Session): Optional pre-built session, mainly for tests.
+            cache_availability (bool): Whether to cache availability searches
+                                       (defaults to AVAILABILITY_CACHE).
+            cache_bookings (bool): Whether to cache bookings by reference
+                                   (defaults to BOOKING_CACHE).
+            resilience (ResiliencePolicy): Retry, hedging and circuit-breaker settings
+                                           (defaults to the API_RETRIES/API_HEDGE_DELAY/API_BREAKER_* config).
+            rate_limit (float): Maximum requests per second to the API, 0 for no limit
+                                (defaults to API_RATE_LIMIT).
+
+        Unset arguments come from config.get_config().
+        """
+        config = get_config()
+        self.base_url = base_url if base_url is not None else config.base_url
+        self.restaurant = restaurant if restaurant is not None else config.restaurant_name
+        self.headers = {
+            "Authorization": f"Bearer {token if token is not None else config.bearer_token}",
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.pool_size = pool_size or config.api_pool_size
+        self.session = session or self._build_session(self.pool_size)
+        self.resilience = resilience or ResiliencePolicy.from_config()
+        rate_limit = config.api_rate_limit if rate_limit is None else rate_limit
+        self.rate_limiter = RateLimiter(rate_limit) if rate_limit else None
+        self._hedge_pool = None
+        self._hedge_pool_lock = threading.Lock()
+        # Identical concurrent reads share one upstream request
+        self.availability_flights = SingleFlight("availability", enabled=config.api_coalesce)
+        self.booking_flights = SingleFlight("get", enabled=config.api_coalesce)
+        self._init_caches(cache_availability, cache_bookings)
+
+    @staticmethod
+    def _build_session(pool_size):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _url(self, path):
+        return f"{self.base_url}/api/ConsumerApi/v1/Restaurant/{self.restaurant}/{path}"
+
+    def _request(self, method, endpoint, path, data=None):
+        """
+        One logical API call. Fails fast while the endpoint's circuit breaker is open;
+        idempotent reads are hedged and retried with jittered backoff on transient failures.
+        """
+        policy = self.resilience
+        breaker = policy.breaker(endpoint)
+        attempts = policy.attempts(endpoint)
+        for attempt in range(attempts):
+            if not breaker.allow():
+                metrics.inc("api_circuit_rejected_total", endpoint=endpoint)
+                return circuit_open_error(endpoint)
+            if policy.hedged(endpoint):
+                result = self._send_hedged(method, endpoint, path, data)
+            else:
+                result = self._send(method, endpoint, path, data)
+            transient = is_transient(result)
+            breaker.record(not transient)
+            if not transient or attempt == attempts - 1:
+                return result
+            metrics.inc("api_retries_total", endpoint=endpoint)
+            time.sleep(policy.delay(attempt))
+
+    def _send_hedged(self, method, endpoint, path, data):
+        # Send a duplicate if the first attempt is slower than hedge_delay; first good answer wins
+        pool = self._hedge_pool
+        if pool is None:
+            with self._hedge_pool_lock:
+                pool = self._hedge_pool
+                if pool is None:
+                    pool = self._hedge_pool = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="hedge")
+        first = pool.submit(self._send, method, endpoint, path, data)
+        try:
+            return first.result(timeout=self.resilience.hedge_delay)
+        except FutureTimeout:
+            pass
+        metrics.inc("api_hedges_total", endpoint=endpoint)
+        pending = {first, pool.submit(self._send, method, endpoint, path, data)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if not is_transient(result):
+                    return result
+        return result
+
+    def _send(self, method, endpoint, path, data=None):
+        import requests
+
+        if self.rate_limiter is not None:
+            delay = self.rate_limiter.reserve()
+            if delay:
+                metrics.inc("api_throttled_total", endpoint=endpoint)
+                time.sleep(delay)
+        with metrics.span("api_request", endpoint=endpoint) as span:
+            try:
+                resp = self.session.request(
+                    method, self._url(path), headers=self.headers, data=data, timeout=self.timeouts[endpoint]
+                )
+            except requests.RequestException as exc:
+                result = handle_request_error(exc)
+            else:
+                result = handle_response(resp)
+            span.tag(status=metrics.api_status(result))
+            return result
+
+    def check_availability(self, visit_date, party_size, channel_code="ONLINE"):
+        key = availability_cache_key(self.restaurant, visit_date, party_size, channel_code)
+        cached = self.availability_cache.get(key)
+        if cached is not None:
+            return cached
+        indexed = self.indexed_availability(visit_date, party_size, channel_code)
+        if indexed is not None:
+            return indexed
+        return self.refresh_availability(visit_date, party_size, channel_code)
+
+    def refresh_availability(self, visit_date, party_size, channel_code="ONLINE"):
+        """
+        Live AvailabilitySearch, skipping the cache and index (and updating both with the answer).
+        """
+        key = availability_cache_key(self.restaurant, visit_date, party_size, channel_code)
+
+        def search():
+            generation = self._availability_generation(key)
+            data = {"VisitDate": visit_date, "PartySize": party_size, "ChannelCode": channel_code}
+            resp = self._request("POST", "availability", "AvailabilitySearch", data)
+            self._after_availability(key, resp, generation)
+            return resp
+        return self.availability_flights.do(key, search)
+
+    def create_booking(self, data):
+        resp = self._request("POST", "create", "BookingWithStripeToken", data)
+        self._after_create(data, resp)
+        return resp
+
+    def get_booking(self, ref):
+        cached = self._cached_booking(ref)
+        if cached is not None:
+            return cached
+
+        def lookup():
+            resp = self._request("GET", "get", f"Booking/{ref}")
+            self._after_get(ref, resp)
+            return resp
+        return self.booking_flights.do(self._booking_key(ref), lookup)
+
+    def update_booking(self, ref, updates):
+        resp = self._request("PATCH", "update", f"Booking/{ref}", updates)
+        self._after_update(ref, updates, resp)
+        return resp
+
+    def cancel_booking(self, ref, reason_id):
+        data = {
+            "micrositeName": self.restaurant,
+            "bookingReference": ref,
+            "cancellationReasonId": reason_id
+        }
+        resp = self._request("POST", "cancel", f"Booking/{ref}/Cancel", data)
+        self._after_cancel(ref, resp)
+        return resp
+
+    def close(self):
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False)
+        self.session.close()
+
+    @classmethod
+    def for_venue(cls, venue):
+        """
+        Builds a client for a venues.Venue, with its own connection pool and rate limit.
+        """
+        return cls(base_url=venue.base_url, restaurant=venue.name, token=venue.token, pool_size=venue.pool_size,
+                   rate_limit=venue.rate_limit)
+
+_client = None
+_venue_clients = {}
+# Guards the lazy creation of _client and of each _venue_clients entry
+_clients_lock = threading.Lock()
+
+def get_client():
+    """
+    Returns the shared BookingApiClient for the current venue (see venues.use_venue),
+    creating it on first use. The default venue uses the process-wide client.
+    """
+    global _client
+    venue = current_venue()
+    if venue is not None and not get_registry().is_default(venue):
+        client = _venue_clients.get(venue)
+        if client is None:
+            with _clients_lock:
+                client = _venue_clients.get(venue)
+                if client is None:
+                    client = _venue_clients[venue] = BookingApiClient.for_venue(get_registry().get(venue))
+        return client
+    client = _client
+    if client is None:
+        with _clients_lock:
+            client = _client
+            if client is None:
+                client = _client = BookingApiClient()
+    return client
+
+def set_client(client):
+    """
+    Replaces the shared BookingApiClient (e.g. with a differently configured one) and
+    returns the previous client.
+    """
+    global _client
+    previous, _client = _client, client
+    return previous
+
+def availability_cache_stats():
+    """
+    Returns hit/miss counts and size of the shared client's availability cache.
+    """
+    return get_client().availability_cache.stats()
+
+def booking_cache_stats():
+    """
+    Returns hit/miss counts and size of the shared client's booking cache.
+    """
+    return get_client().booking_cache.stats()
+
+def coalescing_stats():
+    """
+    Returns calls and coalesced-call counts of the shared client's availability and booking lookups.
+    """
+    client = get_client()
+    return {"availability": client.availability_flights.stats(), "get": client.booking_flights.stats()}
+
+def circuit_states():
+    """
+    Returns the shared client's circuit breaker state per endpoint (closed, half_open or open).
+    """
+    return get_client().resilience.breaker_states()
+
+def start_availability_sync():
+    """
+    Starts the background refresh of every venue's availability index (see
+    availability_index.AvailabilitySync) and returns it, or None when AVAILABILITY_INDEX is off.
+    """
+    if not get_config().availability_index:
+        return None
+
+    def search(venue, visit_date, party_size):
+        with use_venue(venue):
+            return get_client().refresh_availability(visit_date, party_size)
+
+    registry = get_registry()
+    return AvailabilitySync.from_config(search, registry.names,
+                                        lambda venue: get_index(registry.get(venue).name)).start()
+
 def check_availability(visit_date, party_size, channel_code="ONLINE"):
     """
     Checks the availability of the restaurant for a specific date and party size.
+    Repeat checks within AVAILABILITY_CACHE_TTL seconds are served from cache, and
+    with AVAILABILITY_INDEX on, fresh entries in the availability index are used too.
 
     Args:
         visit_date (str): The date of the visit (YYYY-MM-DD).
@@ -55,9 +523,7 @@ def check_availability(visit_date, party_size, channel_code="ONLINE"):
         dict: The API response containing availability information.
     """
 
-    url = f"{BASE_URL}/api/ConsumerApi/v1/Restaurant/{RESTAURANT_NAME}/AvailabilitySearch"
-    data = {"VisitDate": visit_date, "PartySize": party_size, "ChannelCode": channel_code}
-    return handle_response(requests.post(url, headers=HEADERS, data=data))
+    return get_client().check_availability(visit_date, party_size, channel_code)
 
 def create_booking(data):
     """
@@ -70,12 +536,12 @@ def create_booking(data):
         dict: API response containing booking confirmation details or an error.
     """
 
-    url = f"{BASE_URL}/api/ConsumerApi/v1/Restaurant/{RESTAURANT_NAME}/BookingWithStripeToken"
-    return handle_response(requests.post(url, headers=HEADERS, data=data))
+    return get_client().create_booking(data)
 
 def get_booking(ref):
     """
-    Retrieves booking details by booking reference.
+    Retrieves booking details by booking reference. Bookings this process has recently
+    created, fetched, updated or cancelled are served from the booking cache.
 
     Args:
         ref (str): The booking reference identifier.
@@ -84,8 +550,7 @@ def get_booking(ref):
         dict: API response containing booking details or an error.
     """
 
-    url = f"{BASE_URL}/api/ConsumerApi/v1/Restaurant/{RESTAURANT_NAME}/Booking/{ref}"
-    return handle_response(requests.get(url, headers=HEADERS))
+    return get_client().get_booking(ref)
 
 def update_booking(ref, updates):
     """
@@ -99,8 +564,7 @@ def update_booking(ref, updates):
         dict: API response confirming the updates or an error.
     """
 
-    url = f"{BASE_URL}/api/ConsumerApi/v1/Restaurant/{RESTAURANT_NAME}/Booking/{ref}"
-    return handle_response(requests.patch(url, headers=HEADERS, data=updates))
+    return get_client().update_booking(ref, updates)
 
 def cancel_booking(ref, reason_id):
     """
@@ -114,10 +578,106 @@ def cancel_booking(ref, reason_id):
         dict: API response confirming the cancellation or an error.
     """
 
-    url = f"{BASE_URL}/api/ConsumerApi/v1/Restaurant/{RESTAURANT_NAME}/Booking/{ref}/Cancel"
-    data = {
-        "micrositeName": RESTAURANT_NAME,
-        "bookingReference": ref,
-        "cancellationReasonId": reason_id
-    }
-    return handle_response(requests.post(url, headers=HEADERS, data=data))
+    return get_client().cancel_booking(ref, reason_id)
+
+def search_availability_range(start_date, end_date, party_sizes, channel_code="ONLINE", max_concurrency=None,
+                              earliest_only=False):
+    """
+    Checks availability for every date in a range and every party size in a set,
+    running the AvailabilitySearch calls concurrently.
+
+    Args:
+        start_date (str): First date to check (YYYY-MM-DD).
+        end_date (str): Last date to check, inclusive (YYYY-MM-DD).
+        party_sizes (iterable of int): Party sizes to check on each date.
+        channel_code (str): The channel code for the booking (default is "ONLINE").
+        max_concurrency (int): Cap on calls in flight at once (defaults to RANGE_SEARCH_CONCURRENCY).
+        earliest_only (bool): Only the earliest open slot is wanted, so the range may stop at
+                              the first date the availability index knows has one.
+
+    Returns:
+        dict: {"slots": {date: {time: [party sizes available]}}, "errors": {(date, party_size): error dict}}.
+              Every date searched appears in "slots", with an empty dict when nothing is free.
+    """
+    dates, jobs, known = plan_range_search(get_client(), start_date, end_date, party_sizes, channel_code, earliest_only)
+    venue = current_venue()
+
+    def search(job):
+        # Pool threads don't inherit the caller's venue
+        with use_venue(venue):
+            return check_availability(job[0], job[1], channel_code)
+
+    responses = []
+    if jobs:
+        workers = max(1, min(max_concurrency or get_config().range_search_concurrency, len(jobs)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="range-search") as pool:
+            responses = list(pool.map(search, jobs))
+    return merge_availability_grid(dates, jobs, responses, known)
+
+def range_search_jobs(start_date, end_date, party_sizes):
+    """
+    Expands a date range and a set of party sizes into (dates, [(date, party size), ...]).
+    """
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    dates = [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+    sizes = sorted(set(int(p) for p in party_sizes))
+    return dates, [(d, p) for d in dates for p in sizes]
+
+def plan_range_search(client, start_date, end_date, party_sizes, channel_code="ONLINE", earliest_only=False):
+    """
+    Splits a range search into what the client's availability index already knows and
+    the (date, party size) jobs still to send. With earliest_only, the dates after the
+    earliest open slot the index knows of are dropped: nothing there can come first.
+
+    Returns:
+        tuple: (dates, [(date, party size) jobs to send], {(date, party size): [open times]}).
+    """
+    dates, jobs = range_search_jobs(start_date, end_date, party_sizes)
+    index = client.availability_index
+    if channel_code != "ONLINE" or not index.enabled or not jobs:
+        return dates, jobs, {}
+    sizes = sorted({p for _, p in jobs})
+    if earliest_only:
+        firsts = [index.earliest(start_date, end_date, p)[0] for p in sizes]
+        cutoff = min((first[0] for first in firsts if first), default=None)
+        if cutoff is not None:
+            dates = [d for d in dates if d <= cutoff]
+    known, todo = {}, []
+    for p in sizes:
+        found, missing = index.open_slots(dates[0], dates[-1], p)
+        known.update(((d, p), times) for d, times in found.items())
+        todo.extend((d, p) for d in missing)
+    return dates, todo, known
+
+def merge_availability_grid(dates, jobs, responses, known=None):
+    """
+    Merges one AvailabilitySearch response per (date, party size) job, plus the open
+    times already known for other (date, party size) pairs, into the
+    search_availability_range() result shape.
+    """
+    slots = {d: {} for d in dates}
+    errors = {}
+    open_times = dict(known or {})
+    for (d, p), resp in zip(jobs, responses):
+        if not is_success(resp):
+            errors[(d, p)] = resp
+            continue
+        open_times[(d, p)] = [slot["time"] for slot in resp.get("available_slots", []) if slot.get("available")]
+    for (d, p) in sorted(open_times, key=lambda job: job[1]):
+        for t in open_times[(d, p)]:
+            slots[d].setdefault(t, []).append(p)
+
+    for d in dates:
+        slots[d] = dict(sorted(slots[d].items()))
+    return {"slots": slots, "errors": errors}
+
+def earliest_slot(slots, party_size=None):
+    """
+    Returns (date, time, party sizes) for the earliest open slot in a search_availability_range()
+    grid, optionally only counting slots open for a given party size. None if nothing is open.
+    """
+    for d in sorted(slots):
+        for t, sizes in sorted(slots[d].items()):
+            if party_size is None or party_size in sizes:
+                return d, t, sizes
+    return None
@@ -0,0 +1,114 @@
+"""
+Registry of the restaurants (venues) one process can serve.
+
+The default venue comes from BASE_URL / RESTAURANT_NAME / BEARER_TOKEN. More venues are
+read from the JSON file at VENUES_PATH, mapping each microsite name to its settings:
+
+    {"TheHungryUnicorn": {}, "TheSleepyDragon": {"base_url": "https://...", "token": "...",
+                                                 "pool_size": 4, "rate_limit": 5}}
+
+Settings a venue leaves out are taken from the default venue. A conversation's venue
+(ConversationContext.restaurant) is made current with use_venue() for the length of a
+turn; tools.get_client() and async_tools.get_client() then return that venue's client,
+so each venue has its own connection pool, caches, breakers and rate limit.
+"""
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Dict, Iterator, List, Optional
+
+from config import get_config
+
+@dataclass(frozen=True)
+class Venue:
+    """
+    One restaurant's API settings. rate_limit is requests per second (0 for no limit).
+    """
+    name: str
+    base_url: Optional[str] = None
+    token: Optional[str] = None
+    pool_size: Optional[int] = None
+    rate_limit: float = 0.0
+
+class VenueRegistry:
+    """
+    Venues by name, with one of them the default.
+    """
+
+    def __init__(self, default: Venue, venues: Optional[Dict[str, Venue]] = None):
+        self.default = default
+        self.venues = {default.name: default, **(venues or {})}
+
+    @classmethod
+    def from_config(cls) -> "VenueRegistry":
+        config = get_config()
+        default = Venue(name=config.restaurant_name or "", base_url=config.base_url, token=config.bearer_token,
+                        pool_size=config.api_pool_size, rate_limit=config.api_rate_limit)
+        venues = {}
+        if config.venues_path:
+            with open(config.venues_path, encoding="utf-8") as f:
+                for name, settings in json.load(f).items():
+                    unknown = set(settings) - {"base_url", "token", "pool_size", "rate_limit"}
+                    if unknown:
+                        raise ValueError(f"Unknown settings for venue {name!r}: {', '.join(sorted(unknown))}")
+                    venues[name] = replace(default, name=name, **settings)
+        return cls(default, venues)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.venues
+
+    def names(self) -> List[str]:
+        return list(self.venues)
+
+    def get(self, name: Optional[str]) -> Venue:
+        """
+        Returns the named venue (the default for None). Raises ValueError for unknown names.
+        """
+        if name is None:
+            return self.default
+        if name not in self.venues:
+            raise ValueError(f"Unknown restaurant {name!r}; choose one of {', '.join(self.venues)}")
+        return self.venues[name]
+
+    def is_default(self, name: Optional[str]) -> bool:
+        return name is None or name == self.default.name
+
+_registry: Optional[VenueRegistry] = None
+
+def get_registry() -> VenueRegistry:
+    """
+    Returns the process-wide VenueRegistry, building it from config on first use.
+    """
+    global _registry
+    if _registry is None:
+        _registry = VenueRegistry.from_config()
+    return _registry
+
+def set_registry(registry: Optional[VenueRegistry]) -> Optional[VenueRegistry]:
+    """
+    Replaces the process-wide VenueRegistry (None rebuilds it on next use) and returns the previous one.
+    """
+    global _registry
+    previous, _registry = _registry, registry
+    return previous
+
+_current: ContextVar[Optional[str]] = ContextVar("venue", default=None)
+
+def current_venue() -> Optional[str]:
+    """
+    Name of the venue the current turn is for, or None for the default venue.
+    """
+    return _current.get()
+
+@contextmanager
+def use_venue(name: Optional[str]) -> Iterator[None]:
+    """
+    Routes API calls made in this block (same thread or asyncio task) to the named venue.
+    Worker threads don't inherit it: submit contextvars.copy_context().run, or re-enter it.
+    """
+    token = _current.set(name)
+    try:
+        yield
+    finally:
+        _current.reset(token)